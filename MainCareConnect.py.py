@@ -1,286 +1,861 @@
-import sys
-from PyQt5.QtWidgets import QProgressBar, QWidget, QApplication, QMainWindow, QCheckBox, QTableWidget, QTableWidgetItem, QPushButton, QLineEdit, QLabel, QVBoxLayout, QHBoxLayout, QGridLayout
-from PyQt5.QtGui import QIcon
-from PyQt5.QtChart import QChart, QChartView, QBarSeries, QBarSet, QBarCategoryAxis
-from PyQt5.QtCore import Qt, QTimer
-from PyQt5.QtGui import QPainter, QBrush, QColor
-import csv
-
-
-class HospitalManagementAnalytics(QMainWindow):
-    STAFF_COL = 1
-    DOCTORS_COL = 2
-    BEDS_COL = 3
-    CT_SCANNERS_COL = 4
-    MRI_MACHINES_COL = 5
-
-    def __init__(self):
-        super().__init__()
-
-        # Set window properties
-        self.setWindowTitle("Hospital Management Analytics")
-        self.setGeometry(100, 100, 800, 600)
-        self.setWindowIcon(QIcon("icon.png"))
-        self.timer = QTimer(self)
-        self.timer.timeout.connect(self.check_resources)
-        self.timer.start(3000)
-        self.table = QTableWidget()
-        self.table.setColumnCount(6)
-        self.table.setHorizontalHeaderLabels(
-            ["Hospital Name", "Number of Staff", "Number of Doctors", "Number of Beds", "Number of CT Scanners", "Number of MRI Machines"])
-        self.table.setMinimumWidth(800)
-        self.table.setAlternatingRowColors(True)
-        self.table.setSortingEnabled(True)
-        self.table.setStyleSheet("QTableWidget {background-color: #F0F8FF;}")
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-
-    # Load data from CSV file
-        with open("demo_data.csv", "r") as file:
-            reader = csv.reader(file)
-            next(reader)  # Skip the first row (header)
-            for row_index, row in enumerate(reader):
-                self.table.insertRow(row_index)
-                for col_index, col in enumerate(row):
-                    self.table.setItem(row_index, col_index,
-                                       QTableWidgetItem(col))
-
-    # Create buffer storage input and label
-        self.buffer_label = QLabel("Buffer Storage:")
-        self.buffer_input = QLineEdit()
-
-    # Create transfer resources button
-        self.transfer_button = QPushButton("Transfer Resources")
-        self.transfer_button.clicked.connect(self.transfer_resources)
-    # Add search bar and button
-        self.search_bar = QLineEdit()
-        self.search_bar.textChanged.connect(self.handle_search)
-        self.search_button = QPushButton("Search")
-        self.search_button.clicked.connect(self.handle_search)
-
-        self.chart_view = QChartView()
-        self.chart_view.setRenderHint(QPainter.Antialiasing)
-        self.chart_view.setRenderHint(QPainter.NonCosmeticDefaultPen)
-        self.chart_view.setRenderHint(QPainter.Qt4CompatiblePainting)
-        self.chart_view.setRenderHint(QPainter.TextAntialiasing)
-        self.chart_view.setBackgroundBrush(QBrush(QColor(240, 248, 255)))
-        self.chart_view.chart().setTheme(QChart.ChartThemeLight)
-        self.checkbox_layout = QVBoxLayout()
-
-    # Create a horizontal layout for buffer and button
-        h_layout = QHBoxLayout()
-        h_layout.addWidget(self.buffer_label)
-        h_layout.addWidget(self.buffer_input)
-        h_layout.addWidget(self.transfer_button)
-        h_layout.addStretch()
-
-    # Create a grid layout for table and checkbox layout
-        grid_layout = QGridLayout()
-        grid_layout.addWidget(self.table, 0, 0)
-        grid_layout.addWidget(self.search_bar, 1, 0)
-        grid_layout.addWidget(self.search_button, 1, 1)
-        grid_layout.addLayout(h_layout, 2, 0)
-        grid_layout.addWidget(self.chart_view, 3, 0, 1, 2)
-
-    # Create a central widget to hold the layouts
-        central_widget = QWidget()
-        central_widget.setLayout(grid_layout)
-        self.setCentralWidget(central_widget)
-
-    def handle_search(self):
-        search_text = self.search_bar.text().strip()
-        for i in range(self.table.rowCount()):
-            hospital_name = self.table.item(i, 0).text()
-            if search_text.lower() in hospital_name.lower():
-                self.table.showRow(i)
-            else:
-                self.table.hideRow(i)
-        self.init_chart()
-
-    def transfer_resources(self):
-        pass
-
-    def check_resources(self):
-        pass
-
-    def update_chart(self):
-        pass
-
-    def check_resources(self):
-        # Define threshold level
-        threshold = 10
-
-        # Check resources for each row in the table
-        for row in range(self.table.rowCount()):
-            staff = int(self.table.item(row, self.STAFF_COL).text())
-            if staff < threshold:
-                # Transfer resources from other hospitals to this hospital
-                for other_row in range(self.table.rowCount()):
-                    if other_row != row:
-                        # Get resources from other hospital
-                        staff_to_transfer = int(self.table.item(
-                            other_row, self.STAFF_COL).text()) - threshold
-                        # Update resources in other hospital
-                        self.table.item(other_row, self.STAFF_COL).setText(
-                            str(staff_to_transfer))
-                        # Update resources in current hospital
-                        self.table.item(row, self.STAFF_COL).setText(
-                            str(staff + staff_to_transfer))
-                        break
-        self.init_chart()
-
-    def init_chart(self):
-        # Create chart
-        self.chart = QChart()
-        self.chart.setTitle("Resource Percentage in Hospitals")
-
-        # Create bar series
-        self.bar_series = QBarSeries()
-
-        # Add data to bar series
-        for row in range(self.table.rowCount()):
-
-            if self.table.isRowHidden(row):
-                continue
-            # Create bar set for each hospital
-            bar_set = QBarSet(self.table.item(row, 0).text())
-
-            # Calculate resource percentage
-            try:
-                staff = int(self.table.item(row, self.STAFF_COL).text())
-            except ValueError:
-                continue
-
-            total_resources = staff + int(self.table.item(row, 2).text()) + int(self.table.item(
-                row, 3).text()) + int(self.table.item(row, 4).text()) + int(self.table.item(row, 5).text())
-            staff_percent = (staff / total_resources) * 100
-
-            # Add data to bar set
-            bar_set.append(staff_percent)
-
-            # Add bar set to series
-            self.bar_series.append(bar_set)
-
-        # Set bar series to chart
-        self.chart.addSeries(self.bar_series)
-
-        # Create category axis
-        self.category_axis = QBarCategoryAxis()
-        self.category_axis.append("Hospitals")
-
-        # Set category axis to chart
-        self.chart.createDefaultAxes()
-        self.chart.setAxisX(self.category_axis, self.bar_series)
-
-        # Set chart to chart view
-        self.chart_view.setChart(self.chart)
-
-        self.table.itemSelectionChanged.connect(self.update_chart)
-        # self.table.currentChanged.connect(self.update_chart)
-
-    def update_chart(self):
-        # Create a new bar series
-        bar_series = QBarSeries()
-        # Add data to bar series based on selected checkboxes
-        self.init_chart()
-
-    def setData(self, data):
-        series = QBarSeries()
-        set = QBarSet("Staff")
-        set.append(data)
-        series.append(set)
-        self.chart().addSeries(series)
-        self.chart().createDefaultAxes()
-        self.chart().axisX().setRange(0, data + 5)
-        self.chart().axisY().setRange(0, data + 5)
-
-    def transfer_resources(self):
-        # Enable multiple row selection
-        self.table.setSelectionMode(QTableWidget.MultiSelection)
-        selected_indexes = self.table.selectedIndexes()
-        # Check if two rows are selected
-        if len(selected_indexes) != 2:
-            print("Please select source and destination hospital")
-            return
-        source_row = selected_indexes[0].row()
-        destination_row = selected_indexes[1].row()
-
-        # Get buffer storage value
-        buffer_input = self.buffer_input.text()
-        if buffer_input == "":
-            # Display error message or prompt to user
-            self.buffer_input.setStyleSheet("border: 1px solid red;")
-            self.buffer_input.setPlaceholderText(
-                "Please enter a valid buffer storage value")
-            return
-
-        buffer = int(buffer_input)
-        self.buffer_input.setStyleSheet("")
-        self.buffer_input.setPlaceholderText("")
-
-        # Get resource columns
-        staff_col = 1
-        doctors_col = 2
-        beds_col = 3
-        ct_scanners_col = 4
-        mri_machines_col = 5
-
-        # Transfer resources
-        staff = int(self.table.item(source_row, staff_col).text()) - buffer
-        self.table.item(source_row, staff_col).setText(str(staff))
-        self.table.item(destination_row, staff_col).setText(
-            str(int(self.table.item(destination_row, staff_col).text()) + buffer))
-
-        doctors = int(self.table.item(source_row, doctors_col).text()) - buffer
-        self.table.item(source_row, doctors_col).setText(str(doctors))
-        self.table.item(destination_row, doctors_col).setText(
-            str(int(self.table.item(destination_row, doctors_col).text()) + buffer))
-        beds = int(self.table.item(source_row, beds_col).text()) - buffer
-        self.table.item(source_row, beds_col).setText(str(beds))
-        self.table.item(destination_row, beds_col).setText(
-            str(int(self.table.item(destination_row, beds_col).text()) + buffer))
-
-        ct_scanners = int(self.table.item(
-            source_row, ct_scanners_col).text()) - buffer
-        self.table.item(source_row, ct_scanners_col).setText(str(ct_scanners))
-        self.table.item(destination_row, ct_scanners_col).setText(
-            str(int(self.table.item(destination_row, ct_scanners_col).text()) + buffer))
-
-        mri_machines = int(self.table.item(
-            source_row, mri_machines_col).text()) - buffer
-        self.table.item(source_row, mri_machines_col).setText(
-            str(mri_machines))
-        self.table.item(destination_row, mri_machines_col).setText(
-            str(int(self.table.item(destination_row, mri_machines_col).text()) + buffer))
-        # Create resource labels and progress bars
-        self.staff_label = QLabel("Staff:")
-        self.staff_bar = QProgressBar()
-        self.doctors_label = QLabel("Doctors:")
-        self.doctors_bar = QProgressBar()
-        self.beds_label = QLabel("Beds:")
-        self.beds_bar = QProgressBar()
-        self.ct_scanners_label = QLabel("CT Scanners:")
-        self.ct_scanners_bar = QProgressBar()
-        self.mri_machines_label = QLabel("MRI Machines:")
-        self.mri_machines_bar = QProgressBar()
-
-        # Add resource labels and progress bars to layout
-        resources_layout = QVBoxLayout()
-        resources_layout.addWidget(self.staff_label)
-        resources_layout.addWidget(self.staff_bar)
-        resources_layout.addWidget(self.doctors_label)
-        resources_layout.addWidget(self.doctors_bar)
-        resources_layout.addWidget(self.beds_label)
-        resources_layout.addWidget(self.beds_bar)
-        resources_layout.addWidget(self.ct_scanners_label)
-        resources_layout.addWidget(self.ct_scanners_bar)
-        resources_layout.addWidget(self.mri_machines_label)
-        resources_layout.addWidget(self.mri_machines_bar)
-        self.setLayout(resources_layout)
-        self.init_chart()
-
-
-if __name__ == "__main__":
-    app = QApplication(sys.argv)
-    analytics = HospitalManagementAnalytics()
-    analytics.show()
-    sys.exit(app.exec_())
+import argparse
+import sys
+import time
+
+# Batch commands, run without the dashboard: "MainCareConnect.py.py report
+# hospitals.csv ..." summarizes a network without loading Qt at all (see
+# report.py), "... export-charts districts/ ..." renders the chart of every
+# district to image files (see chart_export.py)
+COMMANDS = {"report": "report", "export-charts": "chart_export"}
+if __name__ == "__main__" and sys.argv[1:2] and sys.argv[1] in COMMANDS:
+    import importlib
+    sys.exit(importlib.import_module(COMMANDS[sys.argv[1]]).main(sys.argv[2:]))
+
+from PyQt5.QtWidgets import QProgressBar, QWidget, QApplication, QMainWindow, QCheckBox, QAbstractItemView, QTableView, QPushButton, QLineEdit, QLabel, QComboBox, QVBoxLayout, QHBoxLayout, QGridLayout
+from PyQt5.QtGui import QIcon
+from PyQt5.QtChart import QChart, QChartView, QBarSeries, QBarSet
+from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtGui import QPainter, QBrush, QColor, QKeySequence
+import numpy as np
+
+import hospital_data
+from hospital_data import HospitalData
+from hospital_model import HospitalTableModel, HospitalProxyModel
+from csv_loader import CsvLoader
+import live_feed
+from search_index import HospitalSearchIndex
+from sqlite_store import SqliteHospitalStore
+import rebalance
+import analytics
+import forecast
+import journal
+import scenarios
+import shards
+from scenario_dialog import ScenarioRunner, ScenarioDialog
+import hospital_chart
+from hospital_chart import StaffChart, HistoryChart, ChartUpdater
+from history import ResourceHistory
+from workers import BackgroundWorkers
+import profiling
+from profiling_panel import ProfilingPanel
+
+# Keystrokes arriving within this many ms are folded into one search
+SEARCH_DEBOUNCE_MS = 150
+
+# Shortages are re-checked when resources change; this full sweep only
+# catches edits made behind the dashboard's back
+FALLBACK_CHECK_MS = 300000
+
+# How often resource trends are re-fitted to flag coming shortages
+FORECAST_MS = 60000
+
+# Journaled changes are made durable together, at most this long after
+# the first of them
+GROUP_COMMIT_MS = 200
+# The journal is folded into the base data this often, and as soon as it
+# grows past COMPACT_BYTES
+COMPACT_MS = 3600000
+COMPACT_BYTES = 16 * 1024 * 1024
+
+
+def forecast_job(history, resources, policy, coordinates, plan_ahead):
+    # Run on a worker: the forecast and, when planning ahead, the plan for
+    # the projected counts (see analytics.plan_snapshot)
+    outlook = forecast.forecast(history, resources, policy)
+    plan = None
+    if plan_ahead and outlook.at_risk.any():
+        plan = analytics.plan_snapshot(resources, outlook.ahead_thresholds(),
+                                       coordinates=coordinates)
+    return outlook, plan
+
+
+def compact_job(path, start, names, resources, coordinates, regions, region_names):
+    # Run on a worker: write the counts, which include the first start
+    # records of the journal, into the base files
+    return journal.compact_base(path, names, resources, coordinates, regions, region_names,
+                                start), start
+
+
+class HospitalManagementAnalytics(QMainWindow):
+    STAFF_COL = hospital_data.STAFF_COL
+    DOCTORS_COL = hospital_data.DOCTORS_COL
+    BEDS_COL = hospital_data.BEDS_COL
+    CT_SCANNERS_COL = hospital_data.CT_SCANNERS_COL
+    MRI_MACHINES_COL = hospital_data.MRI_MACHINES_COL
+
+    def __init__(self, csv_path="demo_data.csv", sqlite_path=None, policy=None):
+        super().__init__()
+
+        # Set window properties
+        self.setWindowTitle("Hospital Management Analytics")
+        self.setGeometry(100, 100, 800, 600)
+        self.setWindowIcon(QIcon("icon.png"))
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.full_check)
+        self.timer.start(FALLBACK_CHECK_MS)
+        # Changed rows are marked dirty and checked once control returns
+        # to the event loop, however many changes came in meanwhile. The
+        # policy sets the threshold of every resource per hospital class.
+        # A copy of its own, it keeps the class of every loaded hospital
+        self.policy = (policy or rebalance.DEFAULT_POLICY).copy()
+        self.shortages = analytics.ShortageTracker(self.policy)
+        self.shortage_timer = QTimer(self)
+        self.shortage_timer.setSingleShot(True)
+        self.shortage_timer.setInterval(0)
+        self.shortage_timer.timeout.connect(self.check_resources)
+        # Rebalancing plans, forecasts, searches and chart bars are computed
+        # on snapshots in a thread pool and handed back to this thread
+        self.workers = BackgroundWorkers(self)
+        self.workers.failed.connect(self.worker_failed)
+
+    # The columnar store is the source of truth; the table is only a view
+    # over self.data through the model and the sorting proxy
+        self.data = HospitalData()
+        self.search_index = HospitalSearchIndex(self.data)
+        # Names are indexed a batch at a time between events
+        self.index_timer = QTimer(self)
+        self.index_timer.setInterval(0)
+        self.index_timer.timeout.connect(self.index_names)
+        self.model = HospitalTableModel(self.data, self)
+        self.model.shortages = self.shortages
+        # Every change of a hospital's counts is logged for the history chart
+        # and the shortage forecast
+        self.history = ResourceHistory()
+        self.forecast = None
+        self.forecast_timer = QTimer(self)
+        self.forecast_timer.timeout.connect(self.run_forecast)
+        self.forecast_timer.start(FORECAST_MS)
+        self.proxy = HospitalProxyModel(self)
+        self.proxy.setSourceModel(self.model)
+
+        self.table = QTableView()
+        self.table.setModel(self.proxy)
+        self.table.setMinimumWidth(800)
+        self.table.setAlternatingRowColors(True)
+        self.table.setSortingEnabled(True)
+        self.table.setStyleSheet("QTableView {background-color: #F0F8FF;}")
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        # Shown once hospitals come from regional shards
+        self.table.setColumnHidden(hospital_data.REGION_COL, True)
+        self.region_filter = QComboBox()
+        self.region_filter.addItem("All regions", None)
+        self.region_filter.currentIndexChanged.connect(self.apply_filter)
+        self.region_filter.hide()
+        self.search_mask = None
+
+    # Create buffer storage input and label
+        self.buffer_label = QLabel("Buffer Storage:")
+        self.buffer_input = QLineEdit()
+
+    # Create transfer resources button
+        self.transfer_button = QPushButton("Transfer Resources")
+        self.transfer_button.clicked.connect(self.transfer_resources)
+    # Add search bar and button
+        self.search_bar = QLineEdit()
+        self.search_timer = QTimer(self)
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(SEARCH_DEBOUNCE_MS)
+        self.search_timer.timeout.connect(self.handle_search)
+        self.search_bar.textChanged.connect(self.search_timer.start)
+        self.search_button = QPushButton("Search")
+        self.search_button.clicked.connect(self.handle_search)
+
+        self.chart_view = QChartView()
+        self.chart_view.setRenderHint(QPainter.Antialiasing)
+        self.chart_view.setRenderHint(QPainter.NonCosmeticDefaultPen)
+        self.chart_view.setRenderHint(QPainter.Qt4CompatiblePainting)
+        self.chart_view.setRenderHint(QPainter.TextAntialiasing)
+        self.chart_view.setBackgroundBrush(QBrush(QColor(240, 248, 255)))
+        self.chart_mode = QComboBox()
+        for mode, text in hospital_chart.CHART_MODES:
+            self.chart_mode.addItem(text, mode)
+        self.history_span = QComboBox()
+        for hours, text in hospital_chart.HISTORY_SPANS:
+            self.history_span.addItem(text, hours)
+        self.history_span.setCurrentIndex(2)
+        self.history_span.hide()
+        self.shown_chart_mode = None
+        self.history_chart = HistoryChart()
+        self.history_chart.setTheme(QChart.ChartThemeLight)
+        self.init_chart()
+        self.chart_view.chart().setTheme(QChart.ChartThemeLight)
+        self.chart_updater = ChartUpdater(self.update_chart, self)
+        self.chart_mode.currentIndexChanged.connect(self.chart_updater.request)
+        self.history_span.currentIndexChanged.connect(self.chart_updater.request)
+        self.table.selectionModel().currentRowChanged.connect(self.current_row_changed)
+        self.table.horizontalHeader().sortIndicatorChanged.connect(
+            self.chart_updater.request)
+        self.checkbox_layout = QVBoxLayout()
+        self.plan_ahead = QCheckBox("Rebalance ahead of forecast shortages")
+        self.plan_ahead.toggled.connect(self.run_forecast)
+        self.what_if_button = QPushButton("What-if...")
+        self.what_if_button.clicked.connect(self.run_scenarios)
+        self.scenario_runner = None
+
+    # Create a horizontal layout for buffer and button
+        h_layout = QHBoxLayout()
+        h_layout.addWidget(self.buffer_label)
+        h_layout.addWidget(self.buffer_input)
+        h_layout.addWidget(self.transfer_button)
+        h_layout.addWidget(self.plan_ahead)
+        h_layout.addWidget(self.what_if_button)
+        h_layout.addWidget(self.region_filter)
+        h_layout.addStretch()
+        h_layout.addWidget(QLabel("Chart:"))
+        h_layout.addWidget(self.chart_mode)
+        h_layout.addWidget(self.history_span)
+
+    # Create a grid layout for table and checkbox layout
+        grid_layout = QGridLayout()
+        grid_layout.addWidget(self.table, 0, 0)
+        grid_layout.addWidget(self.search_bar, 1, 0)
+        grid_layout.addWidget(self.search_button, 1, 1)
+        grid_layout.addLayout(h_layout, 2, 0)
+        grid_layout.addWidget(self.chart_view, 3, 0, 1, 2)
+
+    # Create a central widget to hold the layouts
+        central_widget = QWidget()
+        central_widget.setLayout(grid_layout)
+        self.setCentralWidget(central_widget)
+
+    # Every change of the counts is journaled next to the CSV and replayed
+    # onto it at the next start; the SQLite store has transactions instead
+        self.csv_path = csv_path
+        self.journal = None
+        if not sqlite_path:
+            self.journal = journal.TransferJournal(journal.journal_path(csv_path))
+            # A compaction cut short last time is completed before loading
+            try:
+                journal.finish_compaction(csv_path)
+            except (OSError, ValueError) as error:
+                self.statusBar().showMessage("Transfers are not journaled: {}".format(error))
+                self.journal = None
+        self.commit_timer = QTimer(self)
+        self.commit_timer.setSingleShot(True)
+        self.commit_timer.setInterval(GROUP_COMMIT_MS)
+        self.commit_timer.timeout.connect(self.commit_journal)
+        self.compact_timer = QTimer(self)
+        self.compact_timer.timeout.connect(self.compact_journal)
+        self.compact_timer.start(COMPACT_MS)
+        edit_menu = self.menuBar().addMenu("Edit")
+        edit_menu.addAction("Undo transfer", self.undo_transfer, QKeySequence.Undo)
+        edit_menu.addAction("Redo transfer", self.redo_transfer, QKeySequence.Redo)
+        edit_menu.setEnabled(self.journal is not None)
+
+    # Slot latencies, shown and recorded while the panel is open
+        self.profiling_panel = ProfilingPanel(parent=self)
+        self.addDockWidget(Qt.BottomDockWidgetArea, self.profiling_panel)
+        self.profiling_panel.hide()
+        profiling_action = self.profiling_panel.toggleViewAction()
+        profiling_action.setShortcut("F12")
+        self.menuBar().addMenu("View").addAction(profiling_action)
+
+    # Load data from CSV file in the background, rows appear batch by batch
+        self.load_progress = QProgressBar()
+        self.load_progress.setMaximumWidth(200)
+        self.statusBar().addPermanentWidget(self.load_progress)
+        self.statusBar().showMessage("Loading " + csv_path)
+        # With an SQLite backend, search and shortage scans become indexed
+        # queries and transfers transactions once the data is loaded
+        self.sqlite_path = sqlite_path
+        self.store = None
+        self.loader = CsvLoader(csv_path, sqlite_path=sqlite_path, parent=self)
+        self.loader.batch_loaded.connect(self.add_hospitals)
+        self.loader.progress.connect(self.load_progress.setValue)
+        self.loader.failed.connect(self.load_failed)
+        self.loader.finished.connect(self.load_finished)
+        self.load_started = time.perf_counter()
+        self.loader.start()
+
+        # Optional live updates, see start_feed
+        self.feed = None
+        self.feed_updates = 0
+        self.feed_unknown = 0
+        self.rows_by_name = {}
+        self.named_rows = 0
+
+    @profiling.timed()
+    def add_hospitals(self, names, resources, coordinates=None, region=None):
+        self.model.append(names, resources, coordinates, region)
+        self.policy.freeze(self.data.resources)
+        if region is not None:
+            self.add_regions()
+        self.history.track(self.data.resources)
+        self.index_timer.start()
+        # New rows are picked up by the next shortage check
+        self.shortage_timer.start()
+        if self.search_bar.text().strip():
+            self.handle_search()
+
+    def add_regions(self):
+        # Offer regions not seen before for filtering and the region chart
+        known = self.region_filter.count() - 1
+        if known == 0:
+            self.table.setColumnHidden(hospital_data.REGION_COL, False)
+            self.region_filter.show()
+            self.chart_mode.addItem(hospital_chart.REGION_MODE_TEXT, hospital_chart.REGION_MODE)
+        for region in range(known, len(self.data.region_names)):
+            self.region_filter.addItem(self.data.region_names[region], region)
+        # Rows of other regions must not show through an active filter
+        if self.region_filter.currentData() is not None:
+            self.apply_filter()
+
+    def index_names(self):
+        # The index is not touched while a search runs on it, show_search
+        # resumes indexing
+        if self.workers.busy("search"):
+            self.index_timer.stop()
+            return
+        self.search_index.index_more()
+        if not self.search_index.pending():
+            self.index_timer.stop()
+
+    def load_finished(self):
+        if profiling.PROFILER.enabled:
+            profiling.PROFILER.add("csv_load", self.load_started, time.perf_counter())
+        self.load_progress.hide()
+        self.statusBar().showMessage(
+            "Loaded {} hospitals".format(len(self.data)), 5000)
+        if self.sqlite_path and self.store is None:
+            self.store = SqliteHospitalStore(self.sqlite_path)
+        if self.journal is not None:
+            self.open_journal()
+        self.chart_updater.request()
+
+    def load_failed(self, message):
+        self.statusBar().showMessage("Could not load data: " + message)
+        # Never replay the journal onto part of the data
+        self.journal = None
+
+    def open_journal(self):
+        # Replay the journal onto the loaded counts and start appending
+        try:
+            rows = self.journal.open(journal.fingerprint(journal.base_files(self.csv_path)),
+                                     self.data.resources)
+        except OSError as error:
+            self.statusBar().showMessage("Transfers are not journaled: {}".format(error))
+            self.journal = None
+            return
+        if len(rows):
+            self.history.record(rows, self.data.resources)
+            self.refresh_table(rows)
+        # Rebalancing waited for the replay, check everything now
+        self.shortages.mark_all()
+        self.shortage_timer.start()
+
+    def journal_pending(self):
+        # Counts must not change before the journal was replayed onto them
+        return self.journal is not None and not self.journal.is_open()
+
+    def can_transfer(self):
+        if self.journal_pending():
+            self.statusBar().showMessage("Transfers are possible once loading is done", 5000)
+            return False
+        return True
+
+    def journal_change(self, kind, rows, deltas):
+        # Journal a change of the counts; it is made durable with the next
+        # group commit
+        if self.journal is None:
+            return
+        self.journal.append(kind, rows, deltas)
+        self.schedule_commit()
+
+    def schedule_commit(self):
+        if not self.commit_timer.isActive():
+            self.commit_timer.start()
+
+    @profiling.timed()
+    def commit_journal(self):
+        self.journal.commit()
+        if self.journal.records * journal.RECORD.itemsize > COMPACT_BYTES:
+            self.compact_journal()
+
+    def compact_journal(self):
+        # Fold the journal into the base files in the pool; the records
+        # written meanwhile stay in the journal (see journal_compacted)
+        if self.journal is None or not self.journal.is_open() or not self.journal.records:
+            return
+        self.workers.submit("compact", self.compact_snapshot, compact_job, self.journal_compacted)
+
+    def compact_snapshot(self):
+        names = self.data.names
+        return (self.csv_path, self.journal.records,
+                list(names) if isinstance(names, list) else names, self.data.resources.copy(),
+                self.data.coordinates.copy(), self.data.regions.copy(),
+                list(self.data.region_names))
+
+    def journal_compacted(self, result):
+        self.journal.rebase(*result)
+
+    @profiling.timed()
+    def undo_transfer(self):
+        self.walk_journal("undo")
+
+    @profiling.timed()
+    def redo_transfer(self):
+        self.walk_journal("redo")
+
+    def walk_journal(self, step):
+        # Undo or redo the latest manual transfer
+        if self.journal is None or not self.can_transfer():
+            return
+        try:
+            rows = getattr(self.journal, step)(self.data.resources)
+        except analytics.TransferError as error:
+            self.statusBar().showMessage("Cannot {}: {}".format(step, error), 5000)
+            return
+        if rows is None:
+            self.statusBar().showMessage("Nothing to " + step, 5000)
+            return
+        self.schedule_commit()
+        self.resources_changed(rows)
+
+    def closeEvent(self, event):
+        self.loader.requestInterruption()
+        self.loader.wait()
+        self.workers.wait()
+        if self.journal is not None:
+            self.journal.close()
+        if self.feed is not None:
+            self.feed.stop()
+        if self.scenario_runner is not None:
+            self.scenario_runner.wait()
+        if self.store is not None:
+            self.store.close()
+        super().closeEvent(event)
+
+    def refresh_table(self, data_rows=None):
+        # The view reads straight from the store, just repaint
+        self.model.refresh(data_rows)
+
+    def resources_changed(self, rows):
+        # Log and repaint the changed rows and schedule a shortage check
+        self.history.record(rows, self.data.resources)
+        self.shortages.mark(rows)
+        self.shortage_timer.start()
+        self.refresh_table(rows)
+        self.chart_updater.request()
+
+    def start_feed(self, port=live_feed.DEFAULT_PORT, tail_path=None):
+        # Apply resource deltas from a local socket or a tailed file as
+        # they arrive. Listening starts once loading is done so no delta
+        # can name a hospital that is not there yet.
+        self.feed = live_feed.LiveFeed(port, tail_path, parent=self)
+        self.feed.deltas_received.connect(self.apply_deltas)
+        self.feed.failed.connect(
+            lambda message: self.statusBar().showMessage("Live feed stopped: " + message))
+        if self.loader.isRunning():
+            self.loader.finished.connect(self.feed.start)
+        else:
+            self.feed.start()
+
+    @profiling.timed()
+    def apply_deltas(self, names, deltas):
+        # One micro-batch from the feed; deltas for unknown names are dropped
+        rows = self.rows_for_names(names)
+        known = rows >= 0
+        self.feed_updates += int(known.sum())
+        self.feed_unknown += len(rows) - int(known.sum())
+        if not known.any():
+            return
+        rows, deltas = rows[known], deltas[known]
+        self.journal_change(journal.FEED, rows, deltas)
+        rows = analytics.apply_deltas(self.data.resources, rows, deltas)
+        if self.store is not None:
+            self.store.write_rows(rows, self.data.resources)
+        self.resources_changed(rows)
+
+    def rows_for_names(self, names):
+        # Store rows of names, -1 for unknown ones; the first of duplicate
+        # names wins. The lookup is extended as hospitals are added.
+        lookup = self.rows_by_name
+        for row in range(self.named_rows, len(self.data)):
+            lookup.setdefault(self.data.names[row], row)
+        self.named_rows = len(self.data)
+        return np.fromiter((lookup.get(name, -1) for name in names), dtype=np.intp,
+                           count=len(names))
+
+    @profiling.timed()
+    def handle_search(self):
+        self.search_timer.stop()
+        text = self.search_bar.text()
+        if self.store is not None:
+            # SQLite connections stay on the thread that opened them
+            self.show_search(self.store_search_mask(text))
+            return
+        # The names and row count are taken here: batches loaded while the
+        # search runs are matched by the next one. Results for text that
+        # has been edited since are dropped.
+        self.workers.submit("search", lambda: (text, self.data.names, len(self.data)),
+                            self.search_index.mask, self.show_search, key=text)
+
+    @profiling.timed()
+    def show_search(self, mask):
+        if self.search_index.pending():
+            self.index_timer.start()
+        self.search_mask = mask
+        self.apply_filter()
+
+    def apply_filter(self):
+        # Show the rows matching the search that are in the chosen region
+        mask = self.search_mask
+        region = self.region_filter.currentData()
+        if region is not None:
+            in_region = self.data.regions == region
+            if mask is not None:
+                # Rows added after the search are kept, as by the proxy
+                in_region[:len(mask)] &= mask[:len(in_region)]
+            mask = in_region
+        # Only touch the view and chart when some row changed visibility
+        if self.proxy.set_filter_mask(mask):
+            self.chart_updater.request()
+
+    def store_search_mask(self, text):
+        if not text.strip():
+            return None
+        mask = np.zeros(len(self.data), dtype=bool)
+        mask[self.store.search(text)] = True
+        return mask
+
+    @profiling.timed()
+    def check_resources(self):
+        # Move resources from hospitals above their threshold to the ones
+        # below it, without taking any donor under its own threshold. Only
+        # rows changed since the last check are re-evaluated; the plan is
+        # made on a copy in the pool (see rebalance_done).
+        self.shortage_timer.stop()
+        checked = self.shortages.update(self.data.resources)
+        if len(checked):
+            self.refresh_table(checked)  # Shortage highlighting
+        if not self.shortages.any() or self.journal_pending():
+            return
+        self.workers.submit("rebalance", self.rebalance_snapshot, analytics.plan_snapshot,
+                            self.rebalance_done)
+
+    def rebalance_snapshot(self):
+        return self.data.resources.copy(), self.policy, None, self.located_copy()
+
+    @profiling.timed()
+    def rebalance_done(self, result):
+        if not analytics.apply_if_unchanged(self.data.resources, *result):
+            # Hospitals of the plan changed meanwhile; they were marked
+            # dirty then, so planning again picks up their new counts
+            self.shortage_timer.start()
+            return
+        self.plan_applied(result[0])
+
+    def worker_failed(self, kind, message):
+        self.statusBar().showMessage("Background {} failed: {}".format(kind, message), 5000)
+        if kind == "search" and self.search_index.pending():
+            self.index_timer.start()
+
+    def plan_applied(self, plan, kind=journal.REBALANCE):
+        # Bookkeeping after a rebalancing plan was applied to self.data
+        if len(plan) == 0:
+            return
+        rows, deltas = plan.deltas()
+        self.journal_change(kind, rows, deltas)
+        if self.store is not None:
+            self.store.write_rows(rows, self.data.resources)
+        self.history.record(rows, self.data.resources)
+        self.shortages.mark(rows)
+        self.shortages.update(self.data.resources)
+        self.refresh_table(rows)
+        self.chart_updater.request()
+
+    def run_forecast(self):
+        # Flag hospitals whose trend crosses a threshold within the
+        # horizon and, if asked to, rebalance for the projected counts now.
+        # Trends are fitted on a copy of the history in the pool.
+        self.workers.submit("forecast", lambda: (
+            self.history.copy(), self.data.resources.copy(), self.policy,
+            self.located_copy(), self.plan_ahead.isChecked()), forecast_job, self.forecast_done)
+
+    @profiling.timed()
+    def forecast_done(self, result):
+        previous = self.forecast
+        self.forecast, plan = result
+        self.model.at_risk = self.forecast.at_risk
+        flagged = self.forecast.rows()
+        if previous is not None:
+            flagged = np.union1d(flagged, previous.rows())
+        flagged = flagged[flagged < len(self.data)]
+        if len(flagged):
+            self.refresh_table(flagged)
+        if plan is not None and not self.journal_pending() and analytics.apply_if_unchanged(
+                self.data.resources, *plan):
+            self.plan_applied(plan[0])
+
+    def located(self):
+        # Hospital coordinates when the network has any, so rebalancing
+        # draws on nearby donors; None plans network-wide
+        return self.data.coordinates if self.data.has_coordinates() else None
+
+    def located_copy(self):
+        coordinates = self.located()
+        return None if coordinates is None else coordinates.copy()
+
+    def run_scenarios(self):
+        # Simulate the standard what-if sweep on a copy of the network in
+        # worker processes and list the best plans when they are in
+        if self.scenario_runner is not None and self.scenario_runner.isRunning():
+            return
+        candidates = scenarios.generate(self.policy, self.located())
+        dialog = ScenarioDialog(candidates, self.apply_scenario, self)
+        self.scenario_runner = ScenarioRunner(self.data.resources, candidates, self.policy,
+                                              self.located(), self)
+        self.scenario_runner.results_ready.connect(dialog.show_results)
+        self.scenario_runner.failed.connect(dialog.show_error)
+        self.scenario_runner.start()
+        dialog.show()
+
+    def apply_scenario(self, scenario):
+        # Re-plan the scenario on the network as it is now and apply it
+        if not self.can_transfer():
+            return
+        if scenario.transfers is not None and not self.apply_transfers(
+                [(source, destination, amounts) for source, destination, amounts
+                 in zip(*scenario.transfers)]):
+            return
+        plan = scenario.plan(self.data.resources, self.located())
+        plan.apply(self.data.resources)
+        self.plan_applied(plan, journal.MANUAL)
+        self.statusBar().showMessage("Applied {}: {} units in {} moves".format(
+            scenario.name, plan.total_moved(), len(plan)), 5000)
+
+    @profiling.timed()
+    def full_check(self):
+        # Re-evaluate every hospital, not just the ones marked dirty
+        if self.store is not None:
+            # Answered from the column indexes; rows short last time are
+            # included so recoveries are noticed too
+            self.shortages.mark(self.store.shortage_rows(self.policy.upper_bounds()))
+            self.shortages.mark(self.shortages.short_rows())
+        else:
+            self.shortages.mark_all()
+        self.check_resources()
+
+    @profiling.timed()
+    def init_chart(self):
+        # Create the chart once, update_chart patches it from then on
+        self.chart = StaffChart()
+        self.chart_view.setChart(self.chart)
+        self.shown_chart_mode = None
+        self.update_chart()
+
+    def current_row_changed(self):
+        if self.chart_view.chart() is self.history_chart:
+            self.chart_updater.request()
+
+    @profiling.timed()
+    def update_chart(self):
+        # Calculate resource percentage for all visible hospitals at once
+        rows = self.proxy.source_rows()
+        mode = self.chart_mode.currentData()
+        # A single hospital, picked or left by a search, gets its history
+        if mode == hospital_chart.HISTORY_MODE or (
+                mode == hospital_chart.AUTO_MODE and len(rows) == 1):
+            current = self.table.currentIndex()
+            if mode == hospital_chart.AUTO_MODE:
+                self.show_history(rows[0])
+            elif current.isValid():
+                self.show_history(self.proxy.source_row(current.row()))
+            else:
+                self.show_history(None)
+            return
+        self.history_span.hide()
+        if self.chart_view.chart() is not self.chart:
+            self.chart_view.setChart(self.chart)
+        mode = hospital_chart.resolve_mode(mode, len(rows))
+        if mode == hospital_chart.TOP_MODE and self.store is not None and len(rows) == len(self.data):
+            # With every hospital shown, the store's staff percentage index
+            # has the best of them without a pass over all rows
+            self.workers.submit("chart", self.stored_top, hospital_chart.stored_top_bars,
+                                self.show_bars, key=(mode, self.proxy.layout_version))
+            return
+        # Bars are computed from a copy of the shown rows in the pool; bars
+        # for a mode or row set no longer shown are dropped
+        self.workers.submit("chart", lambda: (mode, rows, self.data.resources[rows],
+                                              self.data.regions[rows],
+                                              list(self.data.region_names)),
+                            hospital_chart.bar_values, self.show_bars,
+                            key=(mode, self.proxy.layout_version))
+
+    def stored_top(self):
+        # The store's best hospitals plus the totals of everyone else
+        rows, percent = self.store.top_staff_percent(hospital_chart.TOP_N)
+        resources = self.data.resources
+        return (rows, percent, resources.sum(axis=0) - resources[rows].sum(axis=0),
+                len(resources) - len(rows))
+
+    @profiling.timed()
+    def show_bars(self, result):
+        mode, keys, values = result
+        if self.chart_view.chart() is not self.chart:
+            return  # Switched to the history chart meanwhile
+        if mode != self.shown_chart_mode:
+            self.chart.set_mode(*hospital_chart.MODE_TITLES.get(mode, hospital_chart.DEFAULT_TITLES))
+            self.shown_chart_mode = mode
+
+        # Only changed bars are touched; aggregated modes keep the bar count
+        # bounded however many hospitals are shown
+        if mode in (hospital_chart.HISTOGRAM_MODE, hospital_chart.REGION_MODE):
+            self.chart.set_bars(keys, values, str)
+        elif mode == hospital_chart.TOP_MODE:
+            self.chart.set_bars(keys, values, self.bar_label)
+        else:
+            self.chart.set_bars(keys, values, self.data.names.__getitem__)
+
+    def show_history(self, row):
+        # Step lines of the five counts of row over the chosen span
+        self.history_span.show()
+        if self.chart_view.chart() is not self.history_chart:
+            self.chart_view.setChart(self.history_chart)
+        if row is None:
+            self.history_chart.set_series("Select a hospital to see its history", [], [])
+            return
+        times, counts = self.history.hours(row, self.data.resources,
+                                           self.history_span.currentData())
+        self.history_chart.set_series(self.data.names[row], times, counts)
+
+    def bar_label(self, row):
+        return "Others" if row is None else self.data.names[row]
+
+    def setData(self, data):
+        series = QBarSeries()
+        set = QBarSet("Staff")
+        set.append(data)
+        series.append(set)
+        self.chart().addSeries(series)
+        self.chart().createDefaultAxes()
+        self.chart().axisX().setRange(0, data + 5)
+        self.chart().axisY().setRange(0, data + 5)
+
+    @profiling.timed()
+    def apply_transfers(self, legs):
+        # Apply [(source row, destination row, [five amounts]), ...] as one
+        # atomic batch with a single table and chart refresh
+        if not self.can_transfer():
+            return False
+        try:
+            sources, destinations, amounts = analytics.transfer_arrays(legs)
+            if self.store is not None:
+                self.store.apply_transfers(sources, destinations, amounts)
+            rows = analytics.apply_transfers(self.data.resources, sources, destinations, amounts)
+        except analytics.TransferError as error:
+            self.statusBar().showMessage("Transfers rejected: {}".format(error), 5000)
+            return False
+        self.journal_change(journal.MANUAL,
+                            *analytics.transfer_deltas(sources, destinations, amounts))
+        self.resources_changed(rows)
+        return True
+
+    @profiling.timed()
+    def transfer_resources(self):
+        if not self.can_transfer():
+            return
+        # Enable multiple row selection
+        self.table.setSelectionMode(QAbstractItemView.MultiSelection)
+        selected_indexes = self.table.selectedIndexes()
+        # Check if two rows are selected; with locations a single one is
+        # the destination and the nearest able donor is the source
+        if len(selected_indexes) == 1 and self.located() is not None:
+            source_row = None
+            destination_row = self.proxy.source_row(selected_indexes[0].row())
+        elif len(selected_indexes) != 2:
+            print("Please select source and destination hospital")
+            return
+        else:
+            source_row = self.proxy.source_row(selected_indexes[0].row())
+            destination_row = self.proxy.source_row(selected_indexes[1].row())
+
+        # Get buffer storage value, a whole number of at least 0
+        buffer_input = self.buffer_input.text().strip()
+        try:
+            buffer = int(buffer_input)
+        except ValueError:
+            buffer = -1
+        if buffer < 0:
+            # Display error message or prompt to user
+            self.buffer_input.setStyleSheet("border: 1px solid red;")
+            self.buffer_input.setPlaceholderText(
+                "Please enter a valid buffer storage value")
+            if buffer_input:
+                self.statusBar().showMessage(
+                    "The buffer must be a whole number of at least 0", 5000)
+            return
+
+        self.buffer_input.setStyleSheet("")
+        self.buffer_input.setPlaceholderText("")
+        if source_row is None:
+            source_row = analytics.nearest_donor(self.data.resources, self.data.coordinates,
+                                                 destination_row, buffer, self.policy)
+            if source_row is None:
+                self.statusBar().showMessage("No hospital nearby can spare {} of everything".format(
+                    buffer), 5000)
+                return
+            self.statusBar().showMessage("Transferring from " + self.data.names[source_row], 5000)
+
+        # Transfer the buffer of every resource in one step, validated
+        # like any batch: nothing moves if the source cannot spare it
+        if not self.apply_transfers(
+                [(source_row, destination_row, [buffer] * len(hospital_data.RESOURCE_COLS))]):
+            return
+        # Create resource labels and progress bars
+        self.staff_label = QLabel("Staff:")
+        self.staff_bar = QProgressBar()
+        self.doctors_label = QLabel("Doctors:")
+        self.doctors_bar = QProgressBar()
+        self.beds_label = QLabel("Beds:")
+        self.beds_bar = QProgressBar()
+        self.ct_scanners_label = QLabel("CT Scanners:")
+        self.ct_scanners_bar = QProgressBar()
+        self.mri_machines_label = QLabel("MRI Machines:")
+        self.mri_machines_bar = QProgressBar()
+
+        # Add resource labels and progress bars to layout
+        resources_layout = QVBoxLayout()
+        resources_layout.addWidget(self.staff_label)
+        resources_layout.addWidget(self.staff_bar)
+        resources_layout.addWidget(self.doctors_label)
+        resources_layout.addWidget(self.doctors_bar)
+        resources_layout.addWidget(self.beds_label)
+        resources_layout.addWidget(self.beds_bar)
+        resources_layout.addWidget(self.ct_scanners_label)
+        resources_layout.addWidget(self.ct_scanners_bar)
+        resources_layout.addWidget(self.mri_machines_label)
+        resources_layout.addWidget(self.mri_machines_bar)
+        self.setLayout(resources_layout)
+        self.chart_updater.request()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Hospital Management Analytics",
+                                     epilog="Batch commands: %(prog)s report --help, %(prog)s export-charts --help")
+    parser.add_argument("csv", nargs="?", default="demo_data.csv",
+                        help="hospital CSV to load, or a directory or glob of per-region CSV shards (default: demo_data.csv)")
+    parser.add_argument("--sqlite", metavar="DB",
+                        help="keep hospitals in this SQLite database, importing the CSV when it changes")
+    parser.add_argument("--thresholds", metavar="POLICY",
+                        help="JSON threshold policy per resource and hospital class")
+    parser.add_argument("--feed-port", type=int, metavar="PORT",
+                        help="apply live resource deltas sent to this local TCP port")
+    parser.add_argument("--feed-file", metavar="PATH",
+                        help="apply live resource deltas appended to this file")
+    parser.add_argument("--profile", metavar="TRACE",
+                        help="time slots and background jobs for the whole session and write a Chrome trace here on exit")
+    args, qt_args = parser.parse_known_args()
+    if args.sqlite and shards.shard_paths(args.csv) is not None:
+        parser.error("--sqlite takes a single CSV, not shards")
+    policy = rebalance.ThresholdPolicy.from_json(args.thresholds) if args.thresholds else None
+    app = QApplication(sys.argv[:1] + qt_args)
+    window = HospitalManagementAnalytics(args.csv, args.sqlite, policy)
+    if args.profile:
+        window.profiling_panel.keep_recording = True
+        profiling.PROFILER.enabled = True
+        app.aboutToQuit.connect(lambda: profiling.PROFILER.export(args.profile))
+    if args.feed_port is not None or args.feed_file:
+        window.start_feed(args.feed_port, args.feed_file)
+    window.show()
+    sys.exit(app.exec_())
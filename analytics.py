@@ -0,0 +1,248 @@
+# Headless analytics over the hospital resource arrays. Only NumPy is
+# needed, so everything here runs on servers and in batch jobs without
+# Qt; the dashboard window calls into these same functions.
+
+import numpy as np
+
+import geo
+import hospital_data
+import rebalance
+
+# Resource array columns are the table columns shifted past the name
+STAFF = hospital_data.STAFF_COL - 1
+
+
+def staff_percent(resources):
+    # Staff as a share of all five resource counts, per hospital (0-100).
+    # Hospitals with no resources at all get 0 rather than a division error.
+    resources = np.asarray(resources)
+    total = resources.sum(axis=1)
+    return np.divide(resources[:, STAFF] * 100.0, total,
+                     out=np.zeros(len(resources)), where=total > 0)
+
+
+def region_staff_percent(resources, regions, count):
+    # Pooled staff percentage of each of count regions: staff over all five
+    # resources of the region's hospitals. Rows without a region (-1) are
+    # left out.
+    resources = np.asarray(resources)
+    regions = np.asarray(regions)
+    known = regions >= 0
+    totals = np.stack([np.bincount(regions[known], weights=resources[known, col], minlength=count)
+                       for col in range(resources.shape[1])], axis=1)
+    return staff_percent(totals)
+
+
+def percent_histogram(percent, bins=10):
+    # Bucket staff percentages into equal-width bins over 0-100.
+    # Returns (labels, share of hospitals in each bin as a percentage).
+    counts = percent_bins(percent, bins)
+    shares = counts * 100.0 / max(len(percent), 1)
+    return histogram_labels(bins), shares
+
+
+def percent_bins(percent, bins=10):
+    # Number of hospitals in each of the percent_histogram bins
+    percent = np.asarray(percent, dtype=float)
+    width = 100.0 / bins
+    index = np.clip((percent // width).astype(np.intp), 0, bins - 1)
+    return np.bincount(index, minlength=bins)
+
+
+def histogram_labels(bins=10):
+    width = 100.0 / bins
+    return ["{:g}-{:g}%".format(i * width, (i + 1) * width) for i in range(bins)]
+
+
+def top_n(resources, count):
+    # The count hospitals with the highest staff percentage, best first,
+    # plus the pooled staff percentage of everyone else.
+    # Returns (positions, their percentages, others percentage, others count).
+    resources = np.asarray(resources)
+    percent = staff_percent(resources)
+    count = min(count, len(percent))
+    if count == 0:
+        return np.zeros(0, dtype=np.intp), percent[:0], 0.0, len(percent)
+    top = np.argpartition(-percent, count - 1)[:count]
+    top = top[np.argsort(-percent[top], kind="stable")]
+    rest = np.ones(len(percent), dtype=bool)
+    rest[top] = False
+    others = staff_percent(resources[rest].sum(axis=0, keepdims=True))
+    others = float(others[0]) if rest.any() else 0.0
+    return top, percent[top], others, int(rest.sum())
+
+
+def shortages(resources, thresholds=None, rows=None):
+    # (n, 5) boolean matrix, True where a hospital is below the threshold
+    # for that resource. thresholds is a rebalance.ThresholdPolicy or maps
+    # a table column to a scalar or a per-hospital array; columns missing
+    # from a dict are never short. With rows, only those hospitals are
+    # evaluated (one matrix row each). All five columns are compared in
+    # one vectorized pass.
+    resources = np.asarray(resources)
+    limits = rebalance.threshold_matrix(resources, thresholds, rows)
+    if rows is not None:
+        resources = resources[rows]
+    return resources < limits
+
+
+class ShortageTracker:
+    # Keeps the shortage matrix of a growing resource array current by
+    # re-evaluating only the rows marked dirty since the last update, so
+    # an unchanged network costs nothing to re-check
+
+    def __init__(self, thresholds=None):
+        self.thresholds = thresholds
+        self.short = np.zeros((0, len(hospital_data.RESOURCE_COLS)), dtype=bool)
+        self._dirty = []
+
+    def mark(self, rows):
+        self._dirty.append(np.asarray(rows, dtype=np.intp).ravel())
+
+    def mark_all(self):
+        self._dirty = [None]
+
+    def short_rows(self):
+        return np.flatnonzero(self.short.any(axis=1))
+
+    def any(self):
+        return bool(self.short.any())
+
+    def update(self, resources):
+        # Re-check dirty rows (and rows added since the last update).
+        # Returns the rows that were evaluated.
+        count = len(resources)
+        known = len(self.short)
+        if count != known:
+            grown = np.zeros((count, self.short.shape[1]), dtype=bool)
+            grown[:min(count, known)] = self.short[:count]
+            self.short = grown
+            if count > known:
+                self.mark(np.arange(known, count))
+        if any(rows is None for rows in self._dirty):
+            rows = np.arange(count, dtype=np.intp)
+        elif self._dirty:
+            rows = np.unique(np.concatenate(self._dirty))
+            rows = rows[rows < count]
+        else:
+            rows = np.zeros(0, dtype=np.intp)
+        self._dirty = []
+        if len(rows):
+            self.short[rows] = shortages(resources, self.thresholds, rows)
+        return rows
+
+
+def plan_snapshot(resources, thresholds=None, floors=None, coordinates=None):
+    # Plan the rebalancing of a copy of the live array, e.g. on a worker
+    # thread: returns the plan and the counts of the rows it involves as
+    # planned, for apply_if_unchanged
+    plan = rebalance.plan_rebalance(resources, thresholds, floors, coordinates)
+    return plan, np.asarray(resources)[plan.rows()]
+
+
+def apply_if_unchanged(resources, plan, before):
+    # Apply a plan_snapshot plan to the live resources unless one of its
+    # hospitals changed since the snapshot, in which case the plan may no
+    # longer hold (a donor could be taken under its floor). Returns whether
+    # it was applied.
+    if len(plan) == 0:
+        return True
+    if not np.array_equal(resources[plan.rows()], before):
+        return False
+    plan.apply(resources)
+    return True
+
+
+def nearest_donor(resources, coordinates, row, buffer, thresholds=None):
+    # The located hospital nearest to row that can give buffer of every
+    # resource and stay at or above its thresholds, or None
+    resources = np.asarray(resources)
+    able = ((resources - buffer) >= rebalance.threshold_matrix(resources, thresholds)).all(axis=1)
+    where = geo.located(coordinates)
+    able &= where
+    able[row] = False
+    if not where[row] or not able.any():
+        return None
+    rows = np.flatnonzero(where)
+    points = geo.project(coordinates)
+    found, _ = geo.GridIndex(points[rows]).nearest(points[row], 1, able[rows])
+    return int(rows[found[0]]) if len(found) else None
+
+
+def apply_deltas(resources, rows, deltas):
+    # Add a (k, 5) array of resource changes to the given rows in place;
+    # a row may appear more than once. Returns the touched rows.
+    rows = np.asarray(rows, dtype=np.intp)
+    np.add.at(resources, rows, np.asarray(deltas, dtype=resources.dtype))
+    return np.unique(rows)
+
+
+class TransferError(ValueError):
+    # A batch transfer that was rejected; nothing was applied
+    pass
+
+
+def transfer_arrays(legs):
+    # Split [(source, destination, [staff, doctors, beds, ct, mri]), ...]
+    # into source and destination row arrays plus a (k, 5) amount array.
+    # Legs of the wrong shape or with amounts that are not whole numbers
+    # raise TransferError.
+    legs = list(legs)
+    try:
+        sources = np.array([leg[0] for leg in legs], dtype=np.intp)
+        destinations = np.array([leg[1] for leg in legs], dtype=np.intp)
+        amounts = np.array([leg[2] for leg in legs], dtype=hospital_data.RESOURCE_DTYPE)
+        return sources, destinations, amounts.reshape(len(legs), len(hospital_data.RESOURCE_COLS))
+    except (TypeError, ValueError, OverflowError, IndexError) as error:
+        raise TransferError("malformed transfer legs: {}".format(error)) from None
+
+
+def transfer_deltas(sources, destinations, amounts):
+    # Net change per hospital of a batch of transfer legs: (rows, (k, 5))
+    rows, slots = np.unique(np.concatenate([sources, destinations]), return_inverse=True)
+    delta = np.zeros((len(rows), amounts.shape[1]), dtype=hospital_data.RESOURCE_DTYPE)
+    np.add.at(delta, slots[:len(sources)], -amounts)
+    np.add.at(delta, slots[len(sources):], amounts)
+    return rows, delta
+
+
+def apply_transfers(resources, sources, destinations, amounts):
+    # Apply many multi-resource transfers at once. amounts is (k, 5), leg i
+    # moves amounts[i] from sources[i] to destinations[i]. Every leg is
+    # validated first and the net change is applied in one pass, so either
+    # all legs land or, on TransferError, none do. Returns touched rows.
+    sources = np.asarray(sources, dtype=np.intp)
+    destinations = np.asarray(destinations, dtype=np.intp)
+    amounts = np.asarray(amounts, dtype=hospital_data.RESOURCE_DTYPE).reshape(
+        len(sources), len(hospital_data.RESOURCE_COLS))
+    if len(destinations) != len(sources):
+        raise TransferError("sources and destinations must have the same length")
+    count = len(resources)
+    bad = ((sources < 0) | (sources >= count) | (destinations < 0) | (destinations >= count)
+           | (sources == destinations) | (amounts < 0).any(axis=1))
+    if bad.any():
+        raise TransferError("invalid transfer legs: {}".format(np.flatnonzero(bad).tolist()))
+
+    rows, delta = transfer_deltas(sources, destinations, amounts)
+    result = resources[rows] + delta
+    # Only resources the batch draws down have to stay non-negative
+    negative = ((result < 0) & (delta < 0)).any(axis=1)
+    if negative.any():
+        raise TransferError("transfers would leave hospitals with negative resources: {}".format(
+            rows[negative].tolist()))
+    resources[rows] = result
+    return rows
+
+
+def summarize(data, thresholds=None):
+    # Network-wide figures for batch jobs, keyed as in report.py's summary
+    resources = data.resources
+    short = shortages(resources, thresholds)
+    totals = resources.sum(axis=0)
+    return {
+        "hospitals": len(data),
+        "staff_percent": round(float(staff_percent(totals[None])[0]), 2),
+        "totals": dict(zip(hospital_data.RESOURCE_KEYS, totals.tolist())),
+        "short_hospitals": int(short.any(axis=1).sum()),
+        "short": dict(zip(hospital_data.RESOURCE_KEYS, short.sum(axis=0).tolist())),
+    }
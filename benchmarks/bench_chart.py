@@ -0,0 +1,80 @@
+# Chart refresh latency: rebuilding a QChart per refresh (as init_chart
+# used to) against patching the persistent StaffChart in place.
+#
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_chart.py --rows 100 1000 10000
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+import common  # puts the repository root on sys.path
+from PyQt5.QtChart import QChart, QChartView, QBarSeries, QBarSet, QBarCategoryAxis
+from PyQt5.QtWidgets import QApplication
+
+from hospital_chart import StaffChart
+
+
+def rebuild(view, names, values):
+    chart = QChart()
+    series = QBarSeries()
+    for name, value in zip(names, values):
+        bar_set = QBarSet(name)
+        bar_set.append(value)
+        series.append(bar_set)
+    chart.addSeries(series)
+    axis = QBarCategoryAxis()
+    axis.append("Hospitals")
+    chart.createDefaultAxes()
+    chart.setAxisX(axis, series)
+    view.setChart(chart)
+
+
+def timed(app, view, action):
+    start = time.perf_counter()
+    action()
+    view.repaint()
+    app.processEvents()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--changed", type=float, default=0.01,
+                        help="share of bars whose value changes per refresh")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    rng = np.random.default_rng(0)
+    for rows in args.rows:
+        names = ["Hospital {}".format(i) for i in range(rows)]
+        keys = np.arange(rows)
+        values = rng.uniform(0, 100, rows)
+        view = QChartView()
+        view.resize(800, 400)
+        view.show()
+
+        rebuild_time = timed(app, view, lambda: rebuild(view, names, values))
+
+        chart = StaffChart()
+        view.setChart(chart)
+        timed(app, view, lambda: chart.set_bars(keys, values, names.__getitem__))
+        changed = rng.choice(rows, max(1, int(rows * args.changed)), replace=False)
+        values = values.copy()
+        values[changed] = rng.uniform(0, 100, len(changed))
+        patch_time = timed(app, view, lambda: chart.set_bars(keys, values, names.__getitem__))
+        visible = keys[::2]
+        filter_time = timed(app, view,
+                            lambda: chart.set_bars(visible, values[visible], names.__getitem__))
+        view.close()
+        print("{:>7} hospitals  rebuild {:8.4f}s  patch values {:8.4f}s  hide half {:8.4f}s".format(
+            rows, rebuild_time, patch_time, filter_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,38 @@
+# Exporting the chart of every district to PNG across a process pool,
+# first from scratch and then again with unchanged data (all cached).
+#
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_export.py --districts 700
+
+import argparse
+import os
+import tempfile
+import time
+
+from common import write_csv
+import chart_export
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--districts", type=int, default=700)
+    parser.add_argument("--rows", type=int, default=100, help="hospitals per district")
+    parser.add_argument("--processes", type=int)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        shards = os.path.join(tmp, "districts")
+        os.mkdir(shards)
+        for district in range(args.districts):
+            write_csv(os.path.join(shards, "district_{:04d}.csv".format(district)), args.rows,
+                      seed=district)
+        output = os.path.join(tmp, "charts")
+        for run in ("cold", "cached"):
+            start = time.perf_counter()
+            rendered, cached = chart_export.export(shards, output, processes=args.processes)
+            elapsed = time.perf_counter() - start
+            print("{:<6}  {:>4} rendered  {:>4} cached  {:8.2f}s".format(
+                run, rendered, cached, elapsed))
+
+
+if __name__ == "__main__":
+    main()
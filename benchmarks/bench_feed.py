@@ -0,0 +1,73 @@
+# Throughput of the live feed: feed_producer sends random deltas over a
+# local socket as fast as it can and we time how long the window takes to
+# apply them all, table and chart refreshes included. Runs offscreen:
+#
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_feed.py --rows 10000 --updates 200000
+
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from common import load_app_module, write_csv
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+import feed_producer
+import live_feed
+
+TIMEOUT_S = 120
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--updates", type=int, default=200000)
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv[:1])
+    module = load_app_module()
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, "demo_data_{}.csv".format(rows))
+            write_csv(path, rows)
+            window = module.HospitalManagementAnalytics(path)
+            window.timer.stop()
+            window.show()
+            window.start_feed(port=0)
+            while window.feed.port == 0:
+                app.processEvents()
+            while window.chart_updater.pending() or window.shortage_timer.isActive():
+                app.processEvents()
+            before = window.data.resources.sum(axis=0)
+
+            lines = feed_producer.delta_lines(window.data.names, args.updates,
+                                              np.random.default_rng(0))
+            sender = threading.Thread(target=asyncio.run,
+                                      args=(feed_producer.send(lines, port=window.feed.port),))
+            start = time.perf_counter()
+            sender.start()
+            while window.feed_updates < args.updates and time.perf_counter() - start < TIMEOUT_S:
+                app.processEvents()
+            while window.chart_updater.pending():
+                app.processEvents()
+            elapsed = time.perf_counter() - start
+            sender.join()
+
+            # The shortage pass moves resources around but never in or out,
+            # so the totals must have changed by exactly the deltas sent
+            _, deltas = live_feed.parse_deltas([line.decode("utf-8") for line in lines])
+            applied = window.data.resources.sum(axis=0) - before
+            check = "ok" if np.array_equal(applied, deltas.sum(axis=0)) else "MISMATCH"
+            print("{:>9} hospitals  {} updates in {:.2f}s  {:>9.0f} updates/s  {}".format(
+                rows, window.feed_updates, elapsed, window.feed_updates / elapsed, check))
+            window.close()
+
+
+if __name__ == "__main__":
+    main()
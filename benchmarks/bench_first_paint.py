@@ -0,0 +1,74 @@
+# Time-to-first-paint of the hospital window: the old synchronous
+# QTableWidget loader against the background CsvLoader.
+#
+#   QT_QPA_PLATFORM=offscreen python benchmarks/bench_first_paint.py --rows 100000
+
+import argparse
+import csv
+import os
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from common import load_app_module, write_csv
+from PyQt5.QtWidgets import QApplication, QTableWidget, QTableWidgetItem
+
+import hospital_data
+
+
+def legacy_first_paint(app, path):
+    # The loader as it was: insertRow plus one QTableWidgetItem per cell,
+    # all before the window can show
+    start = time.perf_counter()
+    table = QTableWidget()
+    table.setColumnCount(len(hospital_data.HEADERS))
+    with open(path, "r") as file:
+        reader = csv.reader(file)
+        next(reader)
+        for row_index, row in enumerate(reader):
+            table.insertRow(row_index)
+            for col_index, col in enumerate(row):
+                table.setItem(row_index, col_index, QTableWidgetItem(col))
+    table.show()
+    app.processEvents()
+    elapsed = time.perf_counter() - start
+    table.close()
+    return elapsed, elapsed
+
+
+def streaming_first_paint(app, module, path):
+    start = time.perf_counter()
+    window = module.HospitalManagementAnalytics(path)
+    window.timer.stop()
+    window.show()
+    app.processEvents()
+    first_paint = time.perf_counter() - start
+    while window.loader.isRunning() or len(window.data) == 0:
+        app.processEvents()
+    app.processEvents()
+    full_load = time.perf_counter() - start
+    window.close()
+    return first_paint, full_load
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000, 100000])
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    module = load_app_module()
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, "demo_data_{}.csv".format(rows))
+            write_csv(path, rows)
+            legacy = legacy_first_paint(app, path)
+            streaming = streaming_first_paint(app, module, path)
+            print("{:>9} rows  legacy first paint {:8.3f}s  streaming first paint {:8.3f}s"
+                  "  (loaded and charted {:.3f}s)".format(rows, legacy[0], streaming[0], streaming[1]))
+
+
+if __name__ == "__main__":
+    main()
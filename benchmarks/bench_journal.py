@@ -0,0 +1,62 @@
+# Journaling bursts of transfers with one fsync per group commit against
+# one per transfer, and replaying the journal at startup. Needs NumPy only,
+# no Qt.
+#
+#   python benchmarks/bench_journal.py --rows 100000 --transfers 100000
+
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+
+from common import write_csv
+import hospital_data
+import journal
+
+# Transfers made durable by one group commit
+BURST = 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--transfers", type=int, default=100000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "hospitals.csv")
+        write_csv(path, args.rows)
+        data = hospital_data.HospitalData.from_csv(path)
+        base = journal.fingerprint([path])
+        rng = np.random.default_rng(0)
+        legs = rng.integers(0, args.rows, size=(args.transfers, 2))
+        moved = np.array([[-1], [1]]).repeat(len(hospital_data.RESOURCE_COLS), axis=1)
+
+        for burst in (1, BURST):
+            if os.path.exists(journal.journal_path(path)):
+                os.remove(journal.journal_path(path))
+            transfers = args.transfers if burst > 1 else min(args.transfers, 2000)
+            log = journal.TransferJournal(journal.journal_path(path))
+            log.open(base, data.resources.copy())
+            start = time.perf_counter()
+            for transfer in range(transfers):
+                log.append(journal.MANUAL, legs[transfer], moved)
+                if (transfer + 1) % burst == 0:
+                    log.commit()
+            log.close()
+            elapsed = time.perf_counter() - start
+            print("commit every {:>4}  {:8.0f} transfers/s".format(burst, transfers / elapsed))
+
+        resources = data.resources.copy()
+        start = time.perf_counter()
+        log = journal.TransferJournal(journal.journal_path(path))
+        log.open(base, resources)
+        elapsed = time.perf_counter() - start
+        log.close()
+        print("replay {} records onto {} rows  {:8.3f}s".format(log.records, args.rows, elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+# Time rebalance.plan_rebalance, the engine behind the shortage check, on
+# synthetic networks. Needs NumPy only, no Qt. With --nearby the
+# hospitals get random locations across India and donors are picked by
+# distance, which also reports the mean transfer distance.
+#
+#   python benchmarks/bench_rebalance.py --rows 10000 100000 1000000
+#   python benchmarks/bench_rebalance.py --rows 10000 100000 --nearby
+
+import argparse
+import time
+
+import numpy as np
+
+import common  # puts the repository root on sys.path
+import geo
+import rebalance
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--nearby", action="store_true", help="plan with coordinates")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    for rows in args.rows:
+        resources = rng.integers(0, 60, size=(rows, 5))
+        coordinates = None
+        if args.nearby:
+            coordinates = np.column_stack([rng.uniform(8, 37, rows), rng.uniform(68, 97, rows)])
+        best = float("inf")
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            plan = rebalance.plan_rebalance(resources, coordinates=coordinates)
+            best = min(best, time.perf_counter() - start)
+        distance = ""
+        if args.nearby:
+            points = geo.project(coordinates)
+            distance = "  mean {:.1f} km".format(
+                np.hypot(*(points[plan.source] - points[plan.destination]).T).mean())
+        print("{:>9} hospitals  {:8.4f}s  {} moves, {} units{}".format(
+            rows, best, len(plan), plan.total_moved(), distance))
+
+
+if __name__ == "__main__":
+    main()
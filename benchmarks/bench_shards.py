@@ -0,0 +1,35 @@
+# Parsing a network split into regional CSV shards with one process
+# against a process per core. Needs NumPy only, no Qt.
+#
+#   python benchmarks/bench_shards.py --shards 8 --rows 1000000
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+from common import write_csv
+import shards
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--shards", type=int, default=8)
+    parser.add_argument("--rows", type=int, default=1000000, help="rows over all shards")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for shard in range(args.shards):
+            write_csv(os.path.join(tmp, "region_{}.csv".format(shard)),
+                      args.rows // args.shards, seed=shard)
+        for processes in sorted({1, multiprocessing.cpu_count()}):
+            start = time.perf_counter()
+            data = shards.load(tmp, processes, use_snapshot=False)
+            elapsed = time.perf_counter() - start
+            print("{:>3} processes  {} shards  {} rows  {:8.3f}s".format(
+                processes, len(data.region_names), len(data), elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,44 @@
+# Cold-start cost of parsing a hospital CSV against memory-mapping its
+# binary snapshot. Needs NumPy only, no Qt.
+#
+#   python benchmarks/bench_snapshot.py --rows 100000 1000000
+
+import argparse
+import os
+import tempfile
+import time
+
+from common import write_csv
+import hospital_data
+import snapshot
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100000, 1000000])
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, "demo_data_{}.csv".format(rows))
+            write_csv(path, rows)
+
+            start = time.perf_counter()
+            data = hospital_data.HospitalData.from_csv(path)
+            parse_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            snapshot.save(path, data)
+            save_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            mapped = snapshot.load(path)
+            load_time = time.perf_counter() - start
+            assert len(mapped) == rows and mapped.names[-1] == data.names[-1]
+
+            print("{:>9} rows  parse CSV {:8.3f}s  write snapshot {:8.3f}s"
+                  "  map snapshot {:8.4f}s".format(rows, parse_time, save_time, load_time))
+
+
+if __name__ == "__main__":
+    main()
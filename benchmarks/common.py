@@ -0,0 +1,36 @@
+# Shared helpers for the benchmark scripts
+
+import importlib.util
+import os
+import sys
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+import hospital_data
+
+
+def load_app_module():
+    # The main script has a ".py.py" name, so import it by path
+    spec = importlib.util.spec_from_file_location(
+        "MainCareConnect", os.path.join(ROOT, "MainCareConnect.py.py"))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def write_csv(path, rows, seed=0):
+    # Synthetic demo_data.csv with the app's header and plausible counts
+    rng = np.random.default_rng(seed)
+    counts = np.column_stack([rng.integers(0, 60, rows), rng.integers(1, 20, rows),
+                              rng.integers(10, 500, rows), rng.integers(0, 5, rows),
+                              rng.integers(0, 3, rows)])
+    with open(path, "w", newline="") as file:
+        file.write(",".join(hospital_data.HEADERS) + "\n")
+        for start in range(0, rows, 100000):
+            block = counts[start:start + 100000]
+            file.writelines("Hospital {},{},{},{},{},{}\n".format(start + i, *row)
+                            for i, row in enumerate(block.tolist()))
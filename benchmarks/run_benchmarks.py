@@ -0,0 +1,167 @@
+# Reproducible timings for the dashboard hot paths, emitted as JSON so
+# runs can be compared across versions. Runs offscreen:
+#
+#   QT_QPA_PLATFORM=offscreen python benchmarks/run_benchmarks.py \
+#       --rows 100 1000 10000 100000 1000000 --output results.json
+#
+# For every size a synthetic demo_data.csv is generated (fixed seed) and
+# the window is driven through: CSV load, handle_search per keystroke,
+# check_resources per change, run_forecast, init_chart, update_chart, transfer_resources
+# and a 1000-leg apply_transfers batch. Timings include the background
+# jobs an action starts; longest_gui_stall_s is the longest the event loop
+# was blocked in a single iteration from search to chart update (16 ms is one 60 fps frame).
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from common import ROOT, load_app_module, write_csv
+import numpy as np
+from PyQt5.QtCore import QItemSelectionModel
+from PyQt5.QtWidgets import QApplication
+
+SEARCH_QUERY = "hospital 12"
+TICKS = 5
+TRANSFERS = 20
+BATCH_LEGS = 1000
+
+
+STALLS = []
+
+
+def settle(app, window):
+    # Run the event loop until queued loads, background jobs and chart
+    # updates are done
+    while (window.loader.isRunning() or window.workers.busy()
+           or window.chart_updater.pending()):
+        start = time.perf_counter()
+        app.processEvents()
+        STALLS.append(time.perf_counter() - start)
+    app.processEvents()
+
+
+def timed(app, window, action):
+    # Includes the chart update the action schedules
+    start = time.perf_counter()
+    action()
+    settle(app, window)
+    return time.perf_counter() - start
+
+
+def stats(samples):
+    return {"mean_s": statistics.mean(samples), "max_s": max(samples), "samples": len(samples)}
+
+
+def bench_size(app, module, path, rows, rng):
+    result = {"rows": rows}
+
+    start = time.perf_counter()
+    window = module.HospitalManagementAnalytics(path)
+    window.timer.stop()
+    window.forecast_timer.stop()
+    window.show()
+    settle(app, window)
+    result["csv_load_s"] = time.perf_counter() - start
+    del STALLS[:]
+
+    def search(text):
+        window.search_bar.setText(text)
+        window.handle_search()
+
+    keystrokes = [timed(app, window, lambda: search(SEARCH_QUERY[:i]))
+                  for i in range(1, len(SEARCH_QUERY) + 1)]
+    result["handle_search_per_keystroke"] = stats(keystrokes)
+    search("")
+    settle(app, window)
+
+    ticks = []
+    staff = window.data.column(window.STAFF_COL)
+    for _ in range(TICKS):
+        # Knock 1% of hospitals under the threshold so every tick has work;
+        # edits behind the window's back have to be marked dirty by hand
+        knocked = rng.choice(rows, max(1, rows // 100), replace=False)
+        staff[knocked] = 0
+        window.shortages.mark(knocked)
+        ticks.append(timed(app, window, window.check_resources))
+    result["check_resources_per_change"] = stats(ticks)
+    settle(app, window)
+    result["run_forecast_s"] = timed(app, window, window.run_forecast)
+
+    result["init_chart_s"] = timed(app, window, window.init_chart)
+    staff[rng.choice(rows, max(1, rows // 100), replace=False)] += 1
+    result["update_chart_s"] = timed(app, window, window.update_chart)
+
+    result["longest_gui_stall_s"] = max(STALLS, default=0.0)
+
+    transfers = []
+    window.buffer_input.setText("1")
+    selection = window.table.selectionModel()
+    for _ in range(TRANSFERS):
+        source, destination = rng.choice(rows, 2, replace=False)
+        selection.clearSelection()
+        for row in (source, destination):
+            selection.select(window.proxy.index(int(row), window.STAFF_COL),
+                             QItemSelectionModel.Select)
+        transfers.append(timed(app, window, window.transfer_resources))
+    result["transfer_resources"] = stats(transfers)
+    settle(app, window)
+
+    sources = rng.integers(0, rows, BATCH_LEGS)
+    legs = [(int(s), int((s + 1) % rows), [0, 0, 0, 0, 0]) for s in sources]
+    result["apply_transfers_1000_legs_s"] = timed(app, window, lambda: window.apply_transfers(legs))
+
+    window.close()
+    return result
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "HEAD"], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, nargs="+", default=[100, 1000, 10000, 100000])
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON results here instead of stdout")
+    args = parser.parse_args()
+
+    app = QApplication(sys.argv)
+    module = load_app_module()
+    report = {
+        "revision": git_revision(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "seed": args.seed,
+        "results": [],
+    }
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            path = os.path.join(tmp, "demo_data_{}.csv".format(rows))
+            write_csv(path, rows, args.seed)
+            rng = np.random.default_rng(args.seed)
+            report["results"].append(bench_size(app, module, path, rows, rng))
+            print("{} rows done".format(rows), file=sys.stderr)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,229 @@
+# Bulk export of the dashboard's staff chart, one image per district (per
+# regional shard; a single CSV is one district), for the dashboards that
+# are mailed out. The network is loaded once with its journaled transfers
+# and the bars of every district are worked out here; charts are then
+# rendered offscreen in a process pool. Every image is keyed by a hash of
+# its bars, so districts whose data did not change since the last export
+# are served from the files already there.
+#
+#   python MainCareConnect.py.py export-charts districts/ --output charts/ --format png svg
+
+import argparse
+import functools
+import hashlib
+import json
+import multiprocessing
+import os
+import re
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtChart import QChart
+from PyQt5.QtCore import QRectF, QSize, Qt
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtSvg import QSvgGenerator
+from PyQt5.QtWidgets import QApplication, QGraphicsScene
+
+import hospital_chart
+import hospital_data
+import journal
+import shards
+
+# Bumped when the rendering changes, so cached images are redrawn
+RENDER_VERSION = 1
+FORMATS = ("png", "svg")
+DEFAULT_SIZE = (800, 600)
+# Qt's PNG quality: 80 compresses a little less than the default, which
+# nearly halves the time spent saving for slightly larger files
+PNG_QUALITY = 80
+# Past this many bars the category labels are stood on end, or Qt elides
+# them to "..."
+UPRIGHT_LABELS = 10
+# Hash of every image written, by file name, kept in the output directory
+CACHE_FILE = "chart-cache.json"
+
+# The worker's application, created once per process
+_app = None
+
+
+def load_network(path, processes=None):
+    # Every hospital of path with its district as region and the journaled
+    # transfers applied, as the dashboard would show them
+    journal.finish_compaction(path)
+    data = hospital_data.HospitalData()
+    for region, names, resources, coordinates in shards.iter_shards(
+            journal.base_files(path), processes):
+        data.append(names, resources, coordinates, region)
+    changes = journal.net_changes(path)
+    if changes is not None:
+        rows, deltas = changes
+        known = rows < len(data)
+        data.resources[rows[known]] += deltas[known]
+    return data
+
+
+def district_charts(data, mode=hospital_chart.AUTO_MODE):
+    # (district, label, title, categories, values) of the chart of every
+    # district, as the dashboard draws it with only that district shown
+    charts = []
+    for region, district in enumerate(data.region_names):
+        rows = np.flatnonzero(data.regions == region)
+        shown, keys, values = hospital_chart.bar_values(
+            hospital_chart.resolve_mode(mode, len(rows)), rows, data.resources[rows])
+        if shown in (hospital_chart.HISTOGRAM_MODE, hospital_chart.REGION_MODE):
+            labels = [str(key) for key in keys]
+        else:
+            labels = ["Others" if key is None else data.names[key] for key in keys]
+        label, title = hospital_chart.MODE_TITLES.get(shown, hospital_chart.DEFAULT_TITLES)
+        charts.append((district, label, "{}: {}".format(district, title),
+                       labels,
+                       np.round(np.asarray(values, dtype=float), 6).tolist()))
+    return charts
+
+
+def file_stem(district):
+    return re.sub(r"[^\w.-]+", "_", district) or "district"
+
+
+def chart_hash(chart, size):
+    _, label, title, categories, values = chart
+    key = json.dumps([RENDER_VERSION, size, label, title, categories, values])
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()
+
+
+def _start_worker():
+    global _app
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    _app = QApplication.instance() or QApplication([])
+
+
+def render(chart, paths, size=DEFAULT_SIZE):
+    # Draw one chart into every path, PNG or SVG by extension. Needs a
+    # QApplication (see _start_worker).
+    _, label, title, categories, values = chart
+    width, height = size
+    staff_chart = hospital_chart.StaffChart()
+    staff_chart.setTheme(QChart.ChartThemeLight)
+    staff_chart.set_mode(label, title)
+    staff_chart.set_bars(categories, values, str)
+    staff_chart.legend().setAlignment(Qt.AlignBottom)
+    if len(categories) > UPRIGHT_LABELS:
+        staff_chart.category_axis.setLabelsAngle(-90)
+    scene = QGraphicsScene()
+    scene.addItem(staff_chart)
+    staff_chart.setGeometry(0, 0, width, height)
+    area = QRectF(0, 0, width, height)
+    for path in paths:
+        temporary = path + ".tmp" + os.path.splitext(path)[1]
+        if path.endswith(".svg"):
+            target = QSvgGenerator()
+            target.setFileName(temporary)
+            target.setSize(QSize(width, height))
+            target.setViewBox(area)
+            target.setTitle(title)
+        else:
+            # Opaque, the chart is drawn on white anyway
+            target = QImage(width, height, QImage.Format_RGB32)
+            target.fill(Qt.white)
+        painter = QPainter(target)
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setRenderHint(QPainter.TextAntialiasing)
+        scene.render(painter, area, area)
+        painter.end()
+        if isinstance(target, QImage) and not target.save(temporary, "PNG", PNG_QUALITY):
+            raise OSError("could not write " + path)
+        os.replace(temporary, path)
+    scene.removeItem(staff_chart)
+    return paths
+
+
+def export(path, output, formats=("png",), mode=hospital_chart.AUTO_MODE, size=DEFAULT_SIZE,
+           processes=None, context=None):
+    # Write the chart of every district of path into the output directory.
+    # Returns (images rendered, images served from the cache).
+    os.makedirs(output, exist_ok=True)
+    cache_path = os.path.join(output, CACHE_FILE)
+    try:
+        with open(cache_path) as file:
+            cache = json.load(file)
+    except (OSError, ValueError):
+        cache = {}
+
+    jobs = []
+    hashes = {}
+    cached = 0
+    for chart in district_charts(load_network(path, processes), mode):
+        digest = chart_hash(chart, list(size))
+        paths = []
+        for extension in formats:
+            name = file_stem(chart[0]) + "." + extension
+            hashes[name] = digest
+            if cache.get(name) == digest and os.path.exists(os.path.join(output, name)):
+                cached += 1
+            else:
+                paths.append(os.path.join(output, name))
+        if paths:
+            jobs.append((chart, paths))
+
+    rendered = 0
+    if jobs:
+        processes = min(processes or multiprocessing.cpu_count(), len(jobs))
+        chunk = max(1, len(jobs) // (processes * 4))
+        draw = functools.partial(_render_job, size=size)
+        with (context or multiprocessing.get_context("spawn")).Pool(
+                processes, initializer=_start_worker) as pool:
+            for paths in pool.imap_unordered(draw, jobs, chunk):
+                rendered += len(paths)
+    # Images of other exports into the same directory stay cached, images
+    # that were deleted are forgotten
+    cache.update(hashes)
+    cache = {name: digest for name, digest in cache.items()
+             if os.path.exists(os.path.join(output, name))}
+    with open(cache_path + ".tmp", "w") as file:
+        json.dump(cache, file, indent=0, sort_keys=True)
+    os.replace(cache_path + ".tmp", cache_path)
+    return rendered, cached
+
+
+def _render_job(job, size):
+    chart, paths = job
+    return render(chart, paths, size)
+
+
+def _size(text):
+    match = re.fullmatch(r"(\d+)x(\d+)", text)
+    if not match:
+        raise argparse.ArgumentTypeError("expected WIDTHxHEIGHT, e.g. 800x600")
+    return int(match.group(1)), int(match.group(2))
+
+
+def main(argv=None):
+    modes = [mode for mode, _ in hospital_chart.CHART_MODES if mode != hospital_chart.HISTORY_MODE]
+    parser = argparse.ArgumentParser(
+        prog="MainCareConnect.py.py export-charts",
+        description="Render the staff chart of every district to image files")
+    parser.add_argument("csv", help="directory or glob of per-district CSV shards, or a single CSV")
+    parser.add_argument("--output", default="charts", metavar="DIR",
+                        help="directory for the images (default: %(default)s)")
+    parser.add_argument("--format", nargs="+", choices=FORMATS, default=["png"], dest="formats")
+    parser.add_argument("--mode", choices=modes, default=hospital_chart.AUTO_MODE,
+                        help="chart mode, as in the dashboard (default: %(default)s)")
+    parser.add_argument("--size", type=_size, default=DEFAULT_SIZE, metavar="WxH",
+                        help="image size in pixels (default: 800x600)")
+    parser.add_argument("--processes", type=int, help="render processes (default: one per core)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    try:
+        rendered, cached = export(args.csv, args.output, args.formats, args.mode, args.size,
+                                  args.processes)
+    except ValueError as error:
+        parser.error(str(error))
+    print("{} images rendered, {} unchanged, in {:.1f}s".format(
+        rendered, cached, time.perf_counter() - start))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
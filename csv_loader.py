@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import sqlite3
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import hospital_data
+import shards
+import snapshot
+from sqlite_store import SqliteHospitalStore
+
+
+class CsvLoader(QThread):
+    # Loads a hospital CSV on a worker thread and hands the rows to the GUI
+    # thread, so the window shows immediately and fills in as the file is
+    # read. An up-to-date binary snapshot is memory-mapped in one batch
+    # instead; otherwise the CSV is parsed in chunks and a fresh snapshot
+    # is written for the next start. With an SQLite database the CSV is
+    # imported into it when changed and the rows are loaded from there.
+    # A directory or glob of regional shards is loaded in a process pool,
+    # one batch (names, resources, coordinates, region) per shard.
+    batch_loaded = pyqtSignal(object, object, object, object)
+    progress = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, path, chunk_rows=hospital_data.CHUNK_ROWS, use_snapshot=True,
+                 sqlite_path=None, parent=None):
+        super().__init__(parent)
+        self.path = path
+        self.chunk_rows = chunk_rows
+        self.use_snapshot = use_snapshot
+        self.sqlite_path = sqlite_path
+
+    def run(self):
+        paths = shards.shard_paths(self.path)
+        if paths is not None:
+            self.load_shards(paths)
+            return
+        if self.sqlite_path:
+            self.load_sqlite()
+            return
+        if self.use_snapshot:
+            data = snapshot.load(self.path)
+            if data is not None:
+                self.batch_loaded.emit(data.names, data.resources, data.coordinates, None)
+                self.progress.emit(100)
+                return
+
+        parsed = hospital_data.HospitalData()
+        try:
+            for names, counts, located, done, total in hospital_data.iter_csv_records(
+                    self.path, self.chunk_rows):
+                if self.isInterruptionRequested():
+                    return
+                # The emitted batch is adopted by the window, which edits
+                # it; the snapshot is written from a private copy
+                parsed.append(list(names), counts.copy(), located)
+                self.batch_loaded.emit(names, counts, located, None)
+                self.progress.emit(int(100 * done / total) if total else 100)
+        except (OSError, UnicodeDecodeError) as error:
+            self.failed.emit(str(error))
+            return
+        self.progress.emit(100)
+
+        if self.use_snapshot:
+            try:
+                snapshot.save(self.path, parsed)
+            except OSError:
+                pass  # Read-only location, parse again next time
+
+    def load_sqlite(self):
+        # SQLite connections belong to the thread that opened them
+        try:
+            store = SqliteHospitalStore(self.sqlite_path)
+            try:
+                if os.path.exists(self.path) and store.needs_import(self.path):
+                    store.import_csv(self.path)
+                data = store.load()
+            finally:
+                store.close()
+        except (OSError, UnicodeDecodeError, sqlite3.Error) as error:
+            self.failed.emit(str(error))
+            return
+        self.batch_loaded.emit(data.names, data.resources, data.coordinates, None)
+        self.progress.emit(100)
+
+    def load_shards(self, paths):
+        if not paths:
+            self.failed.emit("no CSV shards in " + self.path)
+            return
+        # Workers are spawned, forking a process with Qt threads is unsafe
+        try:
+            for done, (region, names, resources, coordinates) in enumerate(shards.iter_shards(
+                    paths, use_snapshot=self.use_snapshot,
+                    context=multiprocessing.get_context("spawn")), 1):
+                if self.isInterruptionRequested():
+                    return
+                self.batch_loaded.emit(names, resources, coordinates, region)
+                self.progress.emit(int(100 * done / len(paths)))
+        except (OSError, UnicodeDecodeError, ValueError) as error:
+            self.failed.emit(str(error))
@@ -0,0 +1,93 @@
+# Stand-in for the admissions systems: sends random resource deltas for
+# the hospitals of a CSV to a dashboard started with --feed-port, or
+# appends them to the file given to --feed-file.
+#
+#   python feed_producer.py demo_data.csv --port 8765 --rate 1000 --seconds 30
+#   python feed_producer.py demo_data.csv --file feed.csv --count 100000
+
+import argparse
+import asyncio
+import csv
+import io
+import time
+
+import numpy as np
+
+import hospital_data
+import live_feed
+
+# Lines written per send, and the pacing tick when a rate is given
+BLOCK_LINES = 5000
+TICK_S = 0.01
+
+
+def delta_lines(names, count, rng):
+    # count CSV lines of small random deltas for random hospitals
+    rows = rng.integers(0, len(names), count)
+    deltas = rng.integers(-2, 3, (count, len(hospital_data.RESOURCE_COLS)))
+    text = io.StringIO()
+    writer = csv.writer(text, lineterminator="\n")
+    writer.writerows([names[row], *values] for row, values in zip(rows.tolist(), deltas.tolist()))
+    return text.getvalue().encode("utf-8").splitlines(keepends=True)
+
+
+def paced_blocks(lines, rate):
+    # Yield (block, seconds to wait before it); rate 0 sends at full speed
+    per_tick = max(1, int(rate * TICK_S)) if rate else BLOCK_LINES
+    start = time.perf_counter()
+    for index in range(0, len(lines), per_tick):
+        delay = index / rate - (time.perf_counter() - start) if rate else 0
+        yield b"".join(lines[index:index + per_tick]), max(0.0, delay)
+
+
+async def send(lines, host="127.0.0.1", port=live_feed.DEFAULT_PORT, rate=0):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for block, delay in paced_blocks(lines, rate):
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(block)
+            await writer.drain()
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def append(lines, path, rate=0):
+    with open(path, "ab") as file:
+        for block, delay in paced_blocks(lines, rate):
+            if delay:
+                time.sleep(delay)
+            file.write(block)
+            file.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Send random resource deltas")
+    parser.add_argument("csv", help="hospital CSV whose names to use")
+    parser.add_argument("--port", type=int, default=live_feed.DEFAULT_PORT)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--file", help="append to this file instead of connecting")
+    parser.add_argument("--rate", type=float, default=1000,
+                        help="updates per second, 0 for as fast as possible")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--count", type=int, help="updates to send (overrides --seconds)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    names = hospital_data.HospitalData.from_csv(args.csv).names
+    count = args.count or int(args.rate * args.seconds) or BLOCK_LINES
+    lines = delta_lines(names, count, np.random.default_rng(args.seed))
+
+    start = time.perf_counter()
+    if args.file:
+        append(lines, args.file, args.rate)
+    else:
+        asyncio.run(send(lines, args.host, args.port, args.rate))
+    elapsed = time.perf_counter() - start
+    print("sent {} updates in {:.2f}s ({:.0f}/s)".format(
+        count, elapsed, count / elapsed if elapsed else float("inf")))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+# Shortage forecasting from the resource history. The counts of every
+# hospital are sampled at regular times over a trailing window and a
+# least-squares trend is fitted to all hospitals and resources at once;
+# hospitals whose trend takes a resource under its threshold within the
+# horizon are flagged before they actually run short. Needs NumPy only.
+
+import time
+
+import numpy as np
+
+import hospital_data
+import rebalance
+
+HOUR_S = 3600
+
+# Trailing window the trend is fitted over, sampled every WINDOW_S / SAMPLES
+WINDOW_S = 6 * HOUR_S
+SAMPLES = 12
+# How far ahead trends are projected
+HORIZON_S = 2 * HOUR_S
+
+
+class Forecast:
+    # Per hospital and resource, (n, 5) arrays: mean over the window, trend
+    # in units per hour, projected counts at the horizon, thresholds, and
+    # at_risk where a hospital not short now is projected to be
+
+    def __init__(self, resources, mean, trend, horizon_s, limits):
+        self.mean = mean
+        self.trend = trend
+        self.projected = resources + trend * (horizon_s / HOUR_S)
+        self.limits = limits
+        self.at_risk = (self.projected < limits) & ~(resources < limits)
+        self._expected_drop = np.clip(resources - self.projected, 0, None)
+
+    def rows(self):
+        # Hospitals with any resource at risk
+        return np.flatnonzero(self.at_risk.any(axis=1))
+
+    def ahead_thresholds(self):
+        # Thresholds raised by each hospital's expected drop, in the form
+        # rebalance.plan_rebalance takes. Planning with them tops at-risk
+        # hospitals up before they run short and keeps declining donors
+        # from giving away what they will need.
+        limits = self.limits + np.ceil(self._expected_drop).astype(self.limits.dtype)
+        never = np.iinfo(self.limits.dtype).min
+        return {col: limits[:, col - hospital_data.STAFF_COL]
+                for col in hospital_data.RESOURCE_COLS
+                if not (self.limits[:, col - hospital_data.STAFF_COL] == never).all()}
+
+
+def forecast(history, resources, thresholds=None, window_s=WINDOW_S, samples=SAMPLES,
+             horizon_s=HORIZON_S, now=None):
+    # Forecast every hospital of resources from a history.ResourceHistory.
+    # thresholds is anything rebalance.threshold_matrix takes. The trend is
+    # accumulated sample by sample (sums of t, t^2, y and t*y), so memory
+    # stays at a few (n, 5) arrays whatever the number of samples.
+    now = time.time() if now is None else now
+    resources = np.asarray(resources)
+    start = now - window_s
+    known = history.first_known()
+    if known is not None:
+        start = max(start, known)
+    times = np.linspace(now, start, samples + 1) if now > start else np.array([now])
+
+    # Times relative to now keep t * y small
+    count = 0
+    sum_t = sum_tt = 0.0
+    sum_y = np.zeros(resources.shape)
+    sum_ty = np.zeros(resources.shape)
+    for when, counts in history.samples(resources, times):
+        t = (when - now) / HOUR_S
+        count += 1
+        sum_t += t
+        sum_tt += t * t
+        sum_y += counts
+        sum_ty += t * counts
+    mean = sum_y / count
+    spread = sum_tt - sum_t * sum_t / count
+    if spread > 0:
+        trend = (sum_ty - sum_t * mean) / spread
+    else:
+        trend = np.zeros(resources.shape)
+    return Forecast(resources, mean, trend, horizon_s,
+                    rebalance.threshold_matrix(resources, thresholds))
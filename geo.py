@@ -0,0 +1,115 @@
+# Spatial lookups over hospital coordinates. Latitude/longitude pairs are
+# projected to kilometres (equirectangular around the network's mean
+# latitude, accurate to a few percent across a country) and bucketed into
+# a uniform grid sorted by cell, so the hospitals of a cell are one slice
+# and a nearest-neighbour query only visits the rings of cells around the
+# query point. Needs NumPy only.
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0
+
+# Hospitals per grid cell on average
+CELL_POINTS = 4
+# Upper bound on cells per indexed point, for very uneven networks
+MAX_CELLS_PER_POINT = 4
+
+
+def located(coordinates):
+    # Boolean mask of rows with both coordinates known
+    return np.isfinite(coordinates).all(axis=1)
+
+
+def project(coordinates, reference_latitude=None):
+    # (n, 2) latitude/longitude in degrees to (n, 2) x/y in kilometres
+    coordinates = np.asarray(coordinates, dtype=float)
+    if reference_latitude is None:
+        known = coordinates[located(coordinates), 0]
+        reference_latitude = float(known.mean()) if len(known) else 0.0
+    radians = np.radians(coordinates)
+    x = radians[:, 1] * np.cos(np.radians(reference_latitude)) * EARTH_RADIUS_KM
+    y = radians[:, 0] * EARTH_RADIUS_KM
+    return np.column_stack([x, y])
+
+
+class GridIndex:
+    # Nearest-neighbour index over (n, 2) projected points. rows maps the
+    # indexed points back to caller rows (e.g. store rows).
+
+    def __init__(self, points, rows=None):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.points = points
+        self.rows = np.arange(len(points)) if rows is None else np.asarray(rows, dtype=np.intp)
+        count = len(points)
+        if count == 0:
+            self.origin = np.zeros(2)
+            self.cell = 1.0
+            self.shape = (1, 1)
+        else:
+            low = points.min(axis=0)
+            extent = np.maximum(points.max(axis=0) - low, 1e-9)
+            self.cell = max(float(np.sqrt(extent[0] * extent[1] * CELL_POINTS / count)),
+                            float(extent.max()) / (MAX_CELLS_PER_POINT * count), 1e-9)
+            self.origin = low
+            self.shape = tuple(int(n) for n in np.floor(extent / self.cell) + 1)
+        cells = self._cell_of(points)
+        keys = cells[:, 0] * self.shape[1] + cells[:, 1]
+        self.order = np.argsort(keys, kind="stable")
+        self.starts = np.searchsorted(keys[self.order],
+                                      np.arange(self.shape[0] * self.shape[1] + 1))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _cell_of(self, points):
+        cells = np.floor((np.asarray(points) - self.origin) / self.cell).astype(np.intp)
+        return np.clip(cells, 0, np.array(self.shape) - 1)
+
+    def _ring(self, cx, cy, radius):
+        # Indexed positions in the cells at Chebyshev distance radius
+        width, height = self.shape
+        blocks = []
+        for x in range(cx - radius, cx + radius + 1):
+            if not 0 <= x < width:
+                continue
+            if x in (cx - radius, cx + radius):
+                ys = range(max(cy - radius, 0), min(cy + radius, height - 1) + 1)
+            else:
+                ys = [y for y in (cy - radius, cy + radius) if 0 <= y < height]
+            for y in ys:
+                key = x * height + y
+                start, stop = self.starts[key], self.starts[key + 1]
+                if stop > start:
+                    blocks.append(self.order[start:stop])
+        return np.concatenate(blocks) if blocks else np.zeros(0, dtype=np.intp)
+
+    def nearest(self, point, k, alive=None):
+        # Up to k indexed positions nearest to point, nearest first, with
+        # their distances. alive is an optional boolean mask over the
+        # indexed points; dead points are skipped.
+        point = np.asarray(point, dtype=float)
+        if len(self) == 0 or k <= 0:
+            return np.zeros(0, dtype=np.intp), np.zeros(0)
+        cx, cy = self._cell_of(point[None, :])[0]
+        found = []
+        count = 0
+        for radius in range(max(self.shape)):
+            ring = self._ring(cx, cy, radius)
+            if alive is not None and len(ring):
+                ring = ring[alive[ring]]
+            if len(ring):
+                found.append(ring)
+                count += len(ring)
+            if count >= k:
+                candidates = np.concatenate(found)
+                distances = np.hypot(*(self.points[candidates] - point).T)
+                best = np.argsort(distances, kind="stable")[:k]
+                # Points outside the rings searched are at least this far
+                if distances[best[-1]] <= radius * self.cell:
+                    return candidates[best], distances[best]
+        if not found:
+            return np.zeros(0, dtype=np.intp), np.zeros(0)
+        candidates = np.concatenate(found)
+        distances = np.hypot(*(self.points[candidates] - point).T)
+        best = np.argsort(distances, kind="stable")[:k]
+        return candidates[best], distances[best]
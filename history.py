@@ -0,0 +1,151 @@
+# Resource history of the hospital network in bounded memory. Every
+# change is one event (time, row, the five counts before the change) in
+# fixed-size ring arrays, so memory depends on the capacity, not on how
+# long the dashboard has been running; the oldest events are overwritten
+# first. A hospital's counts at any time since the oldest retained event
+# follow from its next event's "before" counts, or its current counts when
+# there is none. Needs NumPy only.
+
+import copy
+import time
+
+import numpy as np
+
+import hospital_data
+
+# Events kept, 52 bytes each
+DEFAULT_CAPACITY = 1 << 18
+
+HOUR_S = 3600
+
+
+class ResourceHistory:
+
+    def __init__(self, capacity=DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self.times = np.zeros(capacity, dtype=np.float64)
+        self.rows = np.zeros(capacity, dtype=np.int32)
+        self.before = np.zeros((capacity, len(hospital_data.RESOURCE_COLS)),
+                               dtype=hospital_data.RESOURCE_DTYPE)
+        self.recorded = 0  # Events ever recorded; the ring holds the last capacity
+        self.started = None  # When hospitals were first tracked
+        # Counts as of the last record, to tell what changed and from what
+        self._known = np.zeros((0, len(hospital_data.RESOURCE_COLS)),
+                               dtype=hospital_data.RESOURCE_DTYPE)
+        self._known_count = 0
+
+    def __len__(self):
+        return min(self.recorded, self.capacity)
+
+    def copy(self):
+        # Independent copy, for reading on another thread while this one
+        # keeps recording
+        other = copy.copy(self)
+        other.times = self.times.copy()
+        other.rows = self.rows.copy()
+        other.before = self.before.copy()
+        other._known = self._known.copy()
+        return other
+
+    def track(self, resources):
+        # Start following hospitals added to resources since the last call
+        count = len(resources)
+        if count <= self._known_count:
+            return
+        if self.started is None:
+            self.started = time.time()
+        if count > len(self._known):
+            known = np.zeros((max(count, 2 * len(self._known)), self._known.shape[1]),
+                             dtype=self._known.dtype)
+            known[:self._known_count] = self._known[:self._known_count]
+            self._known = known
+        self._known[self._known_count:count] = resources[self._known_count:count]
+        self._known_count = count
+
+    def record(self, rows, resources, now=None):
+        # Log the rows whose counts in resources differ from the last record
+        self.track(resources)
+        rows = np.unique(np.asarray(rows, dtype=np.intp))
+        current = np.asarray(resources)[rows]
+        before = self._known[rows]
+        changed = (current != before).any(axis=1)
+        rows, current, before = rows[changed], current[changed], before[changed]
+        if len(rows) == 0:
+            return 0
+        self._known[rows] = current
+        if len(rows) > self.capacity:
+            rows, before = rows[-self.capacity:], before[-self.capacity:]
+        now = time.time() if now is None else now
+        if self.recorded:
+            # Keep the ring sorted even if the clock steps back
+            now = max(now, self.times[(self.recorded - 1) % self.capacity])
+        slots = (self.recorded + np.arange(len(rows))) % self.capacity
+        self.times[slots] = now
+        self.rows[slots] = rows
+        self.before[slots] = before
+        self.recorded += len(rows)
+        return len(rows)
+
+    def oldest(self):
+        # Time of the oldest retained event, None when there is none
+        if not self.recorded:
+            return None
+        if self.recorded > self.capacity:
+            return float(self.times[self.recorded % self.capacity])
+        return float(self.times[0])
+
+    def _since(self, start):
+        # Ring slots of the events at or after start, oldest first. The
+        # ring is time-sorted once rotated, so this is a searchsorted or two.
+        if self.recorded <= self.capacity:
+            count = self.recorded
+            return np.arange(np.searchsorted(self.times[:count], start), count)
+        head = self.recorded % self.capacity
+        # Older part in [head, capacity), newer part in [0, head)
+        first = head + np.searchsorted(self.times[head:], start)
+        if first < self.capacity:
+            return np.concatenate([np.arange(first, self.capacity), np.arange(head)])
+        return np.arange(np.searchsorted(self.times[:head], start), head)
+
+    def series(self, row, resources, seconds, now=None):
+        # Step series of one hospital over the last seconds: (times, counts)
+        # where counts[i] (five columns) holds from times[i] until the next
+        # time. Starts at the window start, or at the oldest retained event
+        # once older history has been overwritten, and ends at now.
+        now = time.time() if now is None else now
+        start = now - seconds
+        if self.recorded > self.capacity:
+            start = max(start, self.oldest())
+        slots = self._since(start)
+        slots = slots[self.rows[slots] == row]
+        current = np.asarray(resources)[row]
+        times = np.concatenate([[start], self.times[slots], [now]])
+        counts = np.concatenate([self.before[slots], [current, current]])
+        return times, counts
+
+    def hours(self, row, resources, hours, now=None):
+        return self.series(row, resources, hours * HOUR_S, now)
+
+    def first_known(self):
+        # Earliest time the counts of every hospital can be reconstructed
+        if self.recorded > self.capacity:
+            return self.oldest()
+        return self.started
+
+    def samples(self, resources, times):
+        # Counts of every hospital at each of times (seconds, newest first),
+        # yielded as (time, (n, 5) array) by undoing events newest first.
+        # The yielded array is reused, copy it to keep it.
+        state = np.array(resources, dtype=hospital_data.RESOURCE_DTYPE)
+        if not len(times):
+            return
+        slots = self._since(min(times))
+        event_times = self.times[slots]
+        end = len(slots)
+        for when in times:
+            first = np.searchsorted(event_times, when, side="right")
+            # Newest first, so the oldest event of a row is assigned last
+            undo = slots[first:end][::-1]
+            state[self.rows[undo]] = self.before[undo]
+            end = first
+            yield when, state
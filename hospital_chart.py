@@ -0,0 +1,215 @@
+from PyQt5.QtChart import (QChart, QBarSeries, QBarSet, QBarCategoryAxis, QValueAxis,
+                           QLineSeries, QDateTimeAxis)
+from PyQt5.QtCore import Qt, QTimer, QPointF, QDateTime
+import numpy as np
+
+import analytics
+import hospital_data
+
+# Redraw requests arriving within one frame (~60 fps) are coalesced
+FRAME_MS = 16
+
+# Chart modes. Per-hospital bars stop being readable (and cheap) after a
+# few dozen, so the automatic mode switches to a histogram beyond that.
+AUTO_MODE = "auto"
+HOSPITAL_MODE = "hospital"
+HISTOGRAM_MODE = "histogram"
+TOP_MODE = "top"
+HISTORY_MODE = "history"
+# Offered once hospitals were loaded from regional shards
+REGION_MODE = "region"
+REGION_MODE_TEXT = "Staff % by region"
+CHART_MODES = [(AUTO_MODE, "Automatic"), (HOSPITAL_MODE, "Per hospital"),
+               (HISTOGRAM_MODE, "Staff % histogram"), (TOP_MODE, "Top 20 + others"),
+               (HISTORY_MODE, "Selected hospital history")]
+MAX_HOSPITAL_BARS = 50
+# (bar set label, chart title) of the bar modes
+MODE_TITLES = {HISTOGRAM_MODE: ("Hospitals %", "Hospitals by Staff Percentage"),
+               REGION_MODE: ("Staff %", "Staff Percentage by Region")}
+DEFAULT_TITLES = ("Staff %", "Resource Percentage in Hospitals")
+HISTOGRAM_BINS = 10
+TOP_N = 20
+
+# Time spans offered for the history chart, in hours
+HISTORY_SPANS = [(1, "Last hour"), (6, "Last 6 hours"), (24, "Last 24 hours"),
+                 (168, "Last 7 days")]
+
+# Past this many changed bars one bulk rewrite of the set is cheaper than
+# replacing values one at a time
+MAX_SINGLE_EDITS = 64
+
+
+def resolve_mode(mode, count):
+    # The bar mode automatic mode picks for count shown hospitals
+    if mode != AUTO_MODE:
+        return mode
+    return HOSPITAL_MODE if count <= MAX_HOSPITAL_BARS else HISTOGRAM_MODE
+
+
+def bar_values(mode, rows, resources, regions=None, region_names=()):
+    # The bars of a resolved chart mode for the shown rows (store rows),
+    # their resources and region ids: (mode, keys, values). Headless, so it
+    # can run on a worker thread; StaffChart.set_bars shows the result.
+    if mode == REGION_MODE:
+        count = len(region_names)
+        percent = analytics.region_staff_percent(resources, regions, count)
+        shown = np.flatnonzero(np.bincount(regions[regions >= 0], minlength=count))
+        return mode, [region_names[region] for region in shown], percent[shown]
+    if mode == HISTOGRAM_MODE:
+        labels, shares = analytics.percent_histogram(analytics.staff_percent(resources),
+                                                     HISTOGRAM_BINS)
+        return mode, labels, shares
+    if mode == TOP_MODE:
+        top, percent, others, other_count = analytics.top_n(resources, TOP_N)
+        return _top_bars(rows[top], percent, others, other_count)
+    return mode, rows, analytics.staff_percent(resources)
+
+
+def stored_top_bars(rows, percent, rest, rest_count):
+    # bar_values of the top mode from an SQLite store's top-N query: the
+    # best rows and their staff percentages, then the (5,) resource totals
+    # and the number of everyone else
+    others = float(analytics.staff_percent(rest[None])[0]) if rest_count else 0.0
+    return _top_bars(rows, percent, others, rest_count)
+
+
+def _top_bars(rows, percent, others, other_count):
+    # One bar per row, best first, and an "Others" bar keyed None
+    keys = rows.tolist()
+    values = percent.tolist()
+    if other_count:
+        keys.append(None)
+        values.append(others)
+    return TOP_MODE, keys, values
+
+
+class StaffChart(QChart):
+    # The "Resource Percentage in Hospitals" chart, built once and patched
+    # in place. All bars live in one QBarSet with a category per bar; Qt
+    # Charts relayouts (and tears down legend markers) per QBarSet, so a
+    # set per hospital does not survive more than a few hundred rows.
+    # Bars are keyed (by store row, or by bucket): when the keys are
+    # unchanged only the values that differ are replaced, otherwise the
+    # set and the categories are rewritten in one call each.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.setTitle("Resource Percentage in Hospitals")
+        self.bar_series = QBarSeries()
+        self.bar_set = QBarSet("Staff %")
+        self.bar_series.append(self.bar_set)
+        self.addSeries(self.bar_series)
+
+        self.category_axis = QBarCategoryAxis()
+        self.addAxis(self.category_axis, Qt.AlignBottom)
+        self.bar_series.attachAxis(self.category_axis)
+
+        self.value_axis = QValueAxis()
+        self.value_axis.setRange(0, 100)
+        self.addAxis(self.value_axis, Qt.AlignLeft)
+        self.bar_series.attachAxis(self.value_axis)
+
+        self._keys = []
+        self._values = np.zeros(0)
+
+    def set_mode(self, label, title):
+        # Switching modes invalidates the bar keys, so start over
+        self.bar_set.setLabel(label)
+        self.setTitle(title)
+        self._replace_all([], np.zeros(0), str)
+
+    def set_bars(self, keys, values, label):
+        # Make the chart show one bar per key, in the given order. label(key)
+        # names a bar and is only called when the bars change.
+        keys = keys.tolist() if hasattr(keys, "tolist") else list(keys)
+        values = np.asarray(values, dtype=float)
+        if keys != self._keys:
+            self._replace_all(keys, values, label)
+            return
+        changed = np.flatnonzero(values != self._values)
+        if len(changed) > MAX_SINGLE_EDITS:
+            self.bar_set.remove(0, self.bar_set.count())
+            self.bar_set.append(values.tolist())
+        else:
+            for i in changed.tolist():
+                self.bar_set.replace(i, float(values[i]))
+        self._values = values
+
+    def _replace_all(self, keys, values, label):
+        self.bar_set.remove(0, self.bar_set.count())
+        self.bar_set.append(values.tolist())
+        self.category_axis.clear()
+        self.category_axis.append(unique_labels(label(key) for key in keys))
+        self._keys = keys
+        self._values = values
+
+
+class HistoryChart(QChart):
+    # Counts of the five resources of one hospital over time, one step
+    # line per resource, from a history.ResourceHistory series
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.time_axis = QDateTimeAxis()
+        self.time_axis.setFormat("dd MMM HH:mm")
+        self.addAxis(self.time_axis, Qt.AlignBottom)
+        self.value_axis = QValueAxis()
+        self.value_axis.setLabelFormat("%d")
+        self.addAxis(self.value_axis, Qt.AlignLeft)
+        self.lines = []
+        for header in hospital_data.HEADERS[hospital_data.STAFF_COL:]:
+            line = QLineSeries()
+            line.setName(header.replace("Number of ", ""))
+            self.addSeries(line)
+            line.attachAxis(self.time_axis)
+            line.attachAxis(self.value_axis)
+            self.lines.append(line)
+
+    def set_series(self, title, times, counts):
+        # times in seconds since the epoch; counts[i] holds until times[i + 1]
+        self.setTitle(title)
+        times = np.asarray(times, dtype=float)
+        if len(times) < 2:
+            for line in self.lines:
+                line.clear()
+            return
+        counts = np.asarray(counts)
+        x = np.repeat(times * 1000, 2)[1:-1]
+        steps = np.repeat(counts[:-1], 2, axis=0)
+        for line, column in zip(self.lines, steps.T):
+            line.replace([QPointF(px, py) for px, py in zip(x.tolist(), column.tolist())])
+        self.time_axis.setRange(_datetime(times[0]), _datetime(times[-1]))
+        self.value_axis.setRange(min(0, int(steps.min())), max(1, int(steps.max())) * 1.1)
+
+
+def _datetime(seconds):
+    return QDateTime.fromMSecsSinceEpoch(int(seconds * 1000))
+
+
+def unique_labels(labels):
+    # Bar categories must be distinct, number repeated hospital names
+    seen = {}
+    result = []
+    for text in labels:
+        count = seen.get(text, 0) + 1
+        seen[text] = count
+        result.append(text if count == 1 else "{} ({})".format(text, count))
+    return result
+
+
+class ChartUpdater:
+    # Coalesces chart refresh requests so the chart is patched at most once
+    # per frame however many timer ticks, keystrokes or transfers ask for it
+
+    def __init__(self, callback, parent=None):
+        self._timer = QTimer(parent)
+        self._timer.setSingleShot(True)
+        self._timer.setInterval(FRAME_MS)
+        self._timer.timeout.connect(callback)
+
+    def request(self):
+        if not self._timer.isActive():
+            self._timer.start()
+
+    def pending(self):
+        return self._timer.isActive()
@@ -0,0 +1,288 @@
+import csv
+import itertools
+import os
+from collections.abc import Sequence
+
+import numpy as np
+
+# Column layout shared with the table (column 0 is the hospital name)
+NAME_COL = 0
+STAFF_COL = 1
+DOCTORS_COL = 2
+BEDS_COL = 3
+CT_SCANNERS_COL = 4
+MRI_MACHINES_COL = 5
+RESOURCE_COLS = (STAFF_COL, DOCTORS_COL, BEDS_COL,
+                 CT_SCANNERS_COL, MRI_MACHINES_COL)
+# Optional location columns after the resources, in degrees
+LATITUDE_COL = 6
+LONGITUDE_COL = 7
+COORDINATE_HEADERS = ["Latitude", "Longitude"]
+
+# Short names of the resource columns, for config files and databases
+RESOURCE_KEYS = ("staff", "doctors", "beds", "ct_scanners", "mri_machines")
+
+HEADERS = ["Hospital Name", "Number of Staff", "Number of Doctors",
+           "Number of Beds", "Number of CT Scanners", "Number of MRI Machines"]
+
+# Table column after the resources naming the region (shard) a hospital
+# was loaded from; not part of the CSV layout
+REGION_COL = len(HEADERS)
+REGION_HEADER = "Region"
+
+RESOURCE_DTYPE = np.int64
+
+# Rows parsed per batch by the streaming reader
+CHUNK_ROWS = 5000
+
+
+def parse_row(row):
+    # Turn one CSV row into (name, [staff, doctors, beds, ct, mri]).
+    # Rows that are too short or hold non-numeric counts are skipped.
+    if len(row) <= MRI_MACHINES_COL:
+        return None
+    try:
+        counts = [int(row[col]) for col in RESOURCE_COLS]
+    except ValueError:
+        return None
+    return row[NAME_COL], counts
+
+
+def parse_rows(rows):
+    # Parse a batch of CSV rows into (names, (n, 5) array), see parse_counts
+    names, counts, _ = parse_records(rows, coordinates=False)
+    return names, counts
+
+
+def parse_records(rows, coordinates=True):
+    # parse_rows plus an (n, 2) latitude/longitude array of the kept rows,
+    # NaN where a row has no valid location (None unless coordinates)
+    kept, counts = parse_counts(rows)
+    if len(kept) != len(rows):
+        rows = [rows[index] for index in kept]
+    names = [row[NAME_COL] for row in rows]
+    return names, counts, parse_coordinates(rows) if coordinates else None
+
+
+def parse_counts(rows):
+    # (positions of the rows that hold a hospital, their (n, 5) counts).
+    # The common case converts the whole batch in one NumPy call;
+    # malformed batches fall back to checking row by row.
+    try:
+        counts = np.array([row[STAFF_COL:MRI_MACHINES_COL + 1] for row in rows],
+                          dtype=str).astype(RESOURCE_DTYPE)
+        if counts.shape == (len(rows), len(RESOURCE_COLS)):
+            return range(len(rows)), counts
+    except ValueError:
+        pass
+    kept = []
+    parsed_counts = []
+    for index, row in enumerate(rows):
+        parsed = parse_row(row)
+        if parsed is None:
+            continue
+        kept.append(index)
+        parsed_counts.append(parsed[1])
+    return kept, np.array(parsed_counts, dtype=RESOURCE_DTYPE).reshape(-1, len(RESOURCE_COLS))
+
+
+def parse_coordinates(rows):
+    # (n, 2) latitude/longitude of CSV rows, NaN where missing or invalid
+    try:
+        coordinates = np.array([row[LATITUDE_COL:LONGITUDE_COL + 1] for row in rows],
+                               dtype=str).astype(float)
+        if coordinates.shape == (len(rows), 2):
+            return coordinates
+    except ValueError:
+        pass
+    coordinates = np.full((len(rows), 2), np.nan)
+    for i, row in enumerate(rows):
+        try:
+            coordinates[i] = float(row[LATITUDE_COL]), float(row[LONGITUDE_COL])
+        except (IndexError, ValueError):
+            pass
+    return coordinates
+
+
+def iter_csv_chunks(path, chunk_rows=CHUNK_ROWS):
+    # Stream a hospital CSV in batches of parsed rows.
+    # Yields (names, resources, bytes_read, total_bytes).
+    for names, counts, _, done, total in iter_csv_records(path, chunk_rows, coordinates=False):
+        yield names, counts, done, total
+
+
+def iter_csv_records(path, chunk_rows=CHUNK_ROWS, coordinates=True):
+    # iter_csv_chunks with the coordinates of every batch.
+    # Yields (names, resources, coordinates, bytes_read, total_bytes).
+    with open(path, "r", newline="") as file:
+        total_bytes = os.fstat(file.fileno()).st_size
+        reader = csv.reader(file)
+        next(reader, None)  # Skip the first row (header)
+        while True:
+            rows = list(itertools.islice(reader, chunk_rows))
+            if not rows:
+                break
+            names, counts, located = parse_records(rows, coordinates)
+            yield names, counts, located, file.buffer.tell(), total_bytes
+
+
+def write_counts(path, resources, chunk_rows=CHUNK_ROWS):
+    # Write a copy of the CSV at path with resources, one row per hospital
+    # the readers take from it, in order, in place of its counts. All else
+    # is kept: the header and line endings, names, locations and any other
+    # columns, and the rows the readers skip. The copy is path + ".tmp",
+    # synced to disk; os.replace() it over path to finish. Raises
+    # ValueError, writing nothing, when the file holds another number of
+    # hospitals.
+    resources = np.asarray(resources).tolist()
+    temporary = path + ".tmp"
+    written = 0
+    try:
+        with open(path, "r", newline="") as source, \
+                open(temporary, "w", newline="") as target:
+            header = source.readline()
+            target.write(header)
+            reader = csv.reader(source)
+            writer = csv.writer(target, lineterminator="\r\n" if header.endswith("\r\n") else "\n")
+            while True:
+                rows = list(itertools.islice(reader, chunk_rows))
+                if not rows:
+                    break
+                kept, _ = parse_counts(rows)
+                if written + len(kept) > len(resources):
+                    raise ValueError("{} holds more than {} hospitals".format(path, len(resources)))
+                for index in kept:
+                    rows[index][STAFF_COL:MRI_MACHINES_COL + 1] = resources[written]
+                    written += 1
+                writer.writerows(rows)
+            if written != len(resources):
+                raise ValueError("{} holds {} hospitals, not {}".format(
+                    path, written, len(resources)))
+            target.flush()
+            os.fsync(target.fileno())
+    except BaseException:
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        raise
+    return temporary
+
+
+class HospitalData:
+    # Columnar store for the hospital network: one name list plus an
+    # (n, 5) integer array, so column reads are array slices instead of
+    # per-cell string parsing. Hospitals loaded from regional shards carry
+    # a region id per row indexing region_names, -1 elsewhere.
+
+    def __init__(self, names=None, resources=None, coordinates=None):
+        # names may be any sequence (e.g. a memory-mapped string table); it
+        # is only copied into a list once it has to change
+        if names is None:
+            names = []
+        elif not isinstance(names, Sequence):
+            names = list(names)
+        self.names = names
+        if resources is None:
+            resources = np.zeros((len(self.names), len(RESOURCE_COLS)),
+                                 dtype=RESOURCE_DTYPE)
+        # resources is a view over the first len(self) rows of _buffer,
+        # which grows geometrically so streaming appends stay amortized O(1).
+        # Arrays of the right type are adopted as they are, not copied.
+        self._buffer = np.asarray(resources, dtype=RESOURCE_DTYPE).reshape(
+            -1, len(RESOURCE_COLS))
+        self.resources = self._buffer
+        if len(self.names) != len(self.resources):
+            raise ValueError("names and resources must have the same length")
+        # (n, 2) latitude/longitude in degrees, NaN where unknown, grown
+        # alongside resources
+        self._coordinate_buffer = _coordinates(coordinates, len(self.names))
+        self.coordinates = self._coordinate_buffer
+        self._region_buffer = np.full(len(self.names), -1, dtype=np.int32)
+        self.regions = self._region_buffer
+        self.region_names = []
+
+    @classmethod
+    def from_csv(cls, path):
+        data = cls()
+        for names, counts, located, _, _ in iter_csv_records(path):
+            data.append(names, counts, located)
+        return data
+
+    def __len__(self):
+        return len(self.names)
+
+    def column(self, col):
+        # Writable view of one resource column, keyed by the table column
+        return self.resources[:, col - STAFF_COL]
+
+    def value(self, row, col):
+        if col == NAME_COL:
+            return self.names[row]
+        if col == REGION_COL:
+            return self.region(row)
+        return int(self.resources[row, col - STAFF_COL])
+
+    def region(self, row):
+        region = self.regions[row]
+        return self.region_names[region] if region >= 0 else ""
+
+    def region_id(self, region):
+        # Id of a region name, registering new names; None gives -1
+        if region is None:
+            return -1
+        if region not in self.region_names:
+            self.region_names.append(region)
+        return self.region_names.index(region)
+
+    def append(self, names, resources, coordinates=None, region=None):
+        # Add hospitals, all of the given region (name) if any
+        resources = np.asarray(
+            resources, dtype=RESOURCE_DTYPE).reshape(-1, len(RESOURCE_COLS))
+        if len(names) != len(resources):
+            raise ValueError("names and resources must have the same length")
+        region = self.region_id(region)
+        if len(self.names) == 0:
+            # First batch: adopt it as is, which keeps memory-mapped
+            # snapshots mapped instead of copying them
+            region_names = self.region_names
+            self.__init__(names, resources, coordinates)
+            self.region_names = region_names
+            self.regions[:] = region
+            return
+        count = len(self.names)
+        needed = count + len(resources)
+        if needed > len(self._buffer):
+            size = max(needed, 2 * len(self._buffer))
+            buffer = np.zeros((size, len(RESOURCE_COLS)), dtype=RESOURCE_DTYPE)
+            buffer[:count] = self.resources
+            self._buffer = buffer
+            located = np.full((size, 2), np.nan)
+            located[:count] = self.coordinates
+            self._coordinate_buffer = located
+            regions = np.full(size, -1, dtype=np.int32)
+            regions[:count] = self.regions
+            self._region_buffer = regions
+        self._buffer[count:needed] = resources
+        self.resources = self._buffer[:needed]
+        self._coordinate_buffer[count:needed] = _coordinates(coordinates, len(resources))
+        self.coordinates = self._coordinate_buffer[:needed]
+        self._region_buffer[count:needed] = region
+        self.regions = self._region_buffer[:needed]
+        self._mutable_names().extend(names)
+
+    def has_coordinates(self):
+        # True when any hospital has a location
+        return bool(np.isfinite(self.coordinates).all(axis=1).any())
+
+    def _mutable_names(self):
+        if not isinstance(self.names, list):
+            self.names = list(self.names)
+        return self.names
+
+
+def _coordinates(coordinates, count):
+    if coordinates is None:
+        return np.full((count, 2), np.nan)
+    coordinates = np.asarray(coordinates, dtype=float).reshape(-1, 2)
+    if len(coordinates) != count:
+        raise ValueError("coordinates and resources must have the same length")
+    return coordinates
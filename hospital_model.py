@@ -0,0 +1,237 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QAbstractProxyModel, QModelIndex
+from PyQt5.QtGui import QBrush, QColor
+import numpy as np
+
+import hospital_data
+
+# Background of resource cells below their threshold
+SHORTAGE_BRUSH = QBrush(QColor(255, 205, 210))
+# ...and of cells forecast to drop below it
+AT_RISK_BRUSH = QBrush(QColor(255, 236, 179))
+
+
+class HospitalTableModel(QAbstractTableModel):
+    # Read-only Qt model over a HospitalData store. Nothing is copied into
+    # the model: the view asks for the cells it paints and we format them
+    # on demand, so only visible rows are ever materialized.
+
+    def __init__(self, data, parent=None):
+        super().__init__(parent)
+        self.hospitals = data
+        # Boolean (n, 5) matrix source for highlighting, e.g. an
+        # analytics.ShortageTracker; None highlights nothing
+        self.shortages = None
+        # Boolean (n, 5) array of cells forecast to run short, or None
+        self.at_risk = None
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.hospitals)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(hospital_data.HEADERS) + 1
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        if role == Qt.DisplayRole:
+            return str(self.hospitals.value(index.row(), index.column()))
+        if role == Qt.BackgroundRole and self.shortages is not None:
+            short = self.shortages.short
+            col = index.column() - hospital_data.STAFF_COL
+            if col >= len(hospital_data.RESOURCE_COLS):
+                return None  # Region
+            if col >= 0 and index.row() < len(short) and short[index.row(), col]:
+                return SHORTAGE_BRUSH
+            at_risk = self.at_risk
+            if (col >= 0 and at_risk is not None and index.row() < len(at_risk)
+                    and at_risk[index.row(), col]):
+                return AT_RISK_BRUSH
+        return None
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            if section == hospital_data.REGION_COL:
+                return hospital_data.REGION_HEADER
+            return hospital_data.HEADERS[section]
+        return super().headerData(section, orientation, role)
+
+    def append(self, names, resources, coordinates=None, region=None):
+        # Add a batch of hospitals to the end of the store
+        if len(names) == 0:
+            return
+        first = len(self.hospitals)
+        self.beginInsertRows(QModelIndex(), first, first + len(names) - 1)
+        self.hospitals.append(names, resources, coordinates, region)
+        self.endInsertRows()
+
+    def refresh(self, rows=None):
+        # Tell the views that the store changed under the given rows
+        if len(self.hospitals) == 0:
+            return
+        if rows is None or len(rows) == 0:
+            first, last = 0, len(self.hospitals) - 1
+        else:
+            first, last = int(np.min(rows)), int(np.max(rows))
+        self.dataChanged.emit(self.index(first, hospital_data.STAFF_COL),
+                              self.index(last, hospital_data.MRI_MACHINES_COL))
+
+
+class HospitalProxyModel(QAbstractProxyModel):
+    # Sorting and filtering proxy backed by an index array. Sorting is a
+    # single np.argsort over the store column and filtering takes a boolean
+    # row mask, so neither calls back into Python once per row like
+    # QSortFilterProxyModel would.
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._order = np.zeros(0, dtype=np.intp)
+        self._source_to_proxy = np.zeros(0, dtype=np.intp)
+        self._mask = None
+        self._sort_column = -1
+        self._sort_order = Qt.AscendingOrder
+        self.layout_version = 0  # Bumped whenever the shown rows change
+
+    def setSourceModel(self, model):
+        old = self.sourceModel()
+        if old is not None:
+            old.dataChanged.disconnect(self._source_data_changed)
+            old.modelReset.disconnect(self._source_reset)
+            old.rowsInserted.disconnect(self._source_rows_inserted)
+        self.beginResetModel()
+        super().setSourceModel(model)
+        model.dataChanged.connect(self._source_data_changed)
+        model.modelReset.connect(self._source_reset)
+        model.rowsInserted.connect(self._source_rows_inserted)
+        self._mask = None
+        self._set_order(self._compute_order())
+        self.endResetModel()
+
+    # QAbstractProxyModel interface
+
+    def index(self, row, column, parent=QModelIndex()):
+        if parent.isValid() or not (0 <= row < len(self._order)):
+            return QModelIndex()
+        return self.createIndex(row, column)
+
+    def parent(self, index=QModelIndex()):
+        return QModelIndex()
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._order)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid() or self.sourceModel() is None:
+            return 0
+        return self.sourceModel().columnCount()
+
+    def mapToSource(self, proxy_index):
+        if not proxy_index.isValid() or proxy_index.row() >= len(self._order):
+            return QModelIndex()
+        return self.sourceModel().index(int(self._order[proxy_index.row()]),
+                                        proxy_index.column())
+
+    def mapFromSource(self, source_index):
+        if not source_index.isValid() or source_index.row() >= len(self._source_to_proxy):
+            return QModelIndex()
+        row = self._source_to_proxy[source_index.row()]
+        if row < 0:
+            return QModelIndex()
+        return self.index(int(row), source_index.column())
+
+    def sort(self, column, order=Qt.AscendingOrder):
+        self._sort_column = column
+        self._sort_order = order
+        self._relayout(self._compute_order())
+
+    # Filtering and lookups used by the window
+
+    def set_filter_mask(self, mask):
+        # mask is a boolean array over the source rows, None shows all.
+        # Returns False and leaves the view alone when no row changes state.
+        mask = None if mask is None else np.asarray(mask, dtype=bool)
+        if self._same_filter(mask):
+            return False
+        self._mask = mask
+        self._relayout(self._compute_order())
+        return True
+
+    def source_rows(self):
+        # Store rows currently shown, in display order
+        return self._order
+
+    def source_row(self, proxy_row):
+        return int(self._order[proxy_row])
+
+    # Internals
+
+    def _hospitals(self):
+        return self.sourceModel().hospitals
+
+    def _compute_order(self):
+        data = self._hospitals()
+        count = len(data)
+        if self._mask is None:
+            rows = np.arange(count, dtype=np.intp)
+        else:
+            mask = self._mask[:count]
+            if len(mask) < count:
+                # Rows added after the mask was set stay visible until the
+                # next filter pass
+                mask = np.concatenate([mask, np.ones(count - len(mask), dtype=bool)])
+            rows = np.flatnonzero(mask)
+        if self._sort_column < 0 or len(rows) == 0:
+            return rows
+        if self._sort_column == hospital_data.NAME_COL:
+            keys = np.array(data.names, dtype=str)[rows]
+        elif self._sort_column == hospital_data.REGION_COL:
+            keys = np.array(data.region_names + [""], dtype=str)[data.regions[rows]]
+        else:
+            keys = data.column(self._sort_column)[rows]
+        rows = rows[np.argsort(keys, kind="stable")]
+        if self._sort_order == Qt.DescendingOrder:
+            rows = rows[::-1]
+        return rows
+
+    def _same_filter(self, mask):
+        count = len(self._hospitals())
+        if mask is None or self._mask is None:
+            return mask is None and self._mask is None
+        return len(mask) == len(self._mask) == count and np.array_equal(mask, self._mask)
+
+    def _set_order(self, order):
+        self.layout_version += 1
+        self._order = np.asarray(order, dtype=np.intp)
+        self._source_to_proxy = np.full(len(self._hospitals()), -1, dtype=np.intp)
+        self._source_to_proxy[self._order] = np.arange(len(self._order))
+
+    def _relayout(self, order):
+        # Swap in a new row order while keeping selections and the current
+        # index pointing at the same hospitals
+        self.layoutAboutToBeChanged.emit()
+        old = self.persistentIndexList()
+        sources = [self.mapToSource(index) for index in old]
+        self._set_order(order)
+        self.changePersistentIndexList(
+            old, [self.mapFromSource(index) for index in sources])
+        self.layoutChanged.emit()
+
+    def _source_data_changed(self, top_left, bottom_right, roles=[]):
+        if len(self._order) == 0:
+            return
+        if top_left.column() <= self._sort_column <= bottom_right.column():
+            # Values of the sort column changed, rows may have to move
+            order = self._compute_order()
+            if not np.array_equal(order, self._order):
+                self._relayout(order)
+        self.dataChanged.emit(self.index(0, top_left.column()),
+                              self.index(len(self._order) - 1, bottom_right.column()),
+                              roles)
+
+    def _source_reset(self):
+        self.beginResetModel()
+        self._mask = None
+        self._set_order(self._compute_order())
+        self.endResetModel()
+
+    def _source_rows_inserted(self, parent, first, last):
+        self._relayout(self._compute_order())
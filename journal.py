@@ -0,0 +1,365 @@
+# Append-only journal of every change to the resource counts, so
+# transfers survive restarts, can be audited, and can be undone and redone.
+# A change is a group of fixed-size binary records, one per hospital
+# touched (time, group, kind, row, the five deltas); the last record of a
+# group is flagged, so a group torn by a crash is dropped on replay.
+# Records go through a write buffer and are made durable together by
+# commit(), so a burst of automated transfers costs one fsync (group
+# commit).
+#
+# The journal lives next to the base data (the CSV, or the directory of
+# regional shards) and is replayed on top of it at startup. Its header
+# holds a fingerprint of the base files, so it is never replayed onto data
+# changed behind its back. compact_base() folds the counts into the base
+# files, after which rebase() keeps only the records written since; a
+# crash in between is recovered by finish_compaction() at the next start.
+# Needs NumPy only.
+
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+
+import analytics
+import hospital_data
+import shards
+import snapshot
+
+MAGIC = b"CCJRNL02"
+FINGERPRINT_BYTES = 20
+HEADER_BYTES = len(MAGIC) + FINGERPRINT_BYTES
+# Journal name inside a directory of shards
+SHARDS_JOURNAL = "transfers.journal"
+# Suffix of the journal's record of a compaction in progress
+COMPACTING = ".compacting"
+
+# Kinds of change. Manual transfers are the ones undo and redo walk;
+# automatic rebalancing would redo itself and feed deltas are facts.
+MANUAL = 1
+REBALANCE = 2
+FEED = 3
+UNDO = 4
+REDO = 5
+KIND_NAMES = {MANUAL: "transfer", REBALANCE: "rebalance", FEED: "feed", UNDO: "undo",
+              REDO: "redo"}
+# Flag on the kind of the last record of a group
+END = 0x80
+KIND_MASK = END - 1
+
+# Deltas are as wide as the counts they change
+RECORD = np.dtype([("time", "<f8"), ("group", "<u4"), ("ref", "<u4"), ("kind", "u1"),
+                   ("row", "<i4"), ("delta", "<i8", (len(hospital_data.RESOURCE_COLS),))])
+# Journals of earlier versions, read and rewritten as RECORD on open
+OLD_RECORDS = {
+    b"CCJRNL01": np.dtype([("time", "<f8"), ("group", "<u4"), ("ref", "<u4"), ("kind", "u1"),
+                           ("row", "<i4"), ("delta", "<i4", (len(hospital_data.RESOURCE_COLS),))]),
+}
+
+
+def base_files(path):
+    # The files holding the base data of path: the CSV, or its shards
+    paths = shards.shard_paths(path)
+    return [path] if paths is None else paths
+
+
+def journal_path(path):
+    if shards.shard_paths(path) is None:
+        return path + ".journal"
+    directory = path if os.path.isdir(path) else os.path.dirname(path)
+    return os.path.join(directory or ".", SHARDS_JOURNAL)
+
+
+def fingerprint(paths, copies=None):
+    # Identity of the base files as they are now (names, sizes, mtimes).
+    # copies maps some of paths to files about to be moved over them,
+    # which keep their size and mtime: the identity of the base after.
+    copies = copies or {}
+    stats = []
+    for path in paths:
+        stat = os.stat(copies.get(path, path))
+        stats.append([os.path.basename(path), stat.st_size, stat.st_mtime_ns])
+    return hashlib.sha1(json.dumps(stats).encode("utf-8")).digest()
+
+
+def read(path):
+    # (fingerprint, records) of a journal file, records cut after the last
+    # complete group; (None, None) when there is no readable journal
+    try:
+        with open(path, "rb") as file:
+            header = file.read(HEADER_BYTES)
+            body = file.read()
+    except OSError:
+        return None, None
+    magic = header[:len(MAGIC)]
+    if len(header) < HEADER_BYTES or (magic != MAGIC and magic not in OLD_RECORDS):
+        return None, None
+    dtype = OLD_RECORDS.get(magic, RECORD)
+    records = np.frombuffer(body, dtype=dtype, count=len(body) // dtype.itemsize)
+    ends = np.flatnonzero(records["kind"] & END)
+    complete = ends[-1] + 1 if len(ends) else 0
+    return header[len(MAGIC):], records[:complete].astype(RECORD, copy=False)
+
+
+def groups(records):
+    # (start, stop) record slices of the groups in records
+    stops = np.flatnonzero(records["kind"] & END) + 1
+    starts = np.concatenate([[0], stops[:-1]]).astype(np.intp)[:len(stops)]
+    return starts, stops
+
+
+def net_changes(path):
+    # Net change per row journaled for the base data at path, as (sorted
+    # rows, (k, 5) deltas), for readers that do not keep a TransferJournal
+    # open; None without a journal for the base files as they are now
+    base, records = read(journal_path(path))
+    if base is None or not len(records) or base != fingerprint(base_files(path)):
+        return None
+    rows, slots = np.unique(records["row"], return_inverse=True)
+    deltas = np.zeros((len(rows), len(hospital_data.RESOURCE_COLS)),
+                      dtype=hospital_data.RESOURCE_DTYPE)
+    np.add.at(deltas, slots, records["delta"])
+    return rows, deltas
+
+
+def compact_base(path, names, resources, coordinates, regions=None, region_names=(), start=0):
+    # Write the given counts, which include the first start records of the
+    # journal, into the base files of path, refreshing their snapshots,
+    # and return the base's new fingerprint. Only the counts change
+    # (hospital_data.write_counts); shards get back the hospitals of their
+    # region. Every file is written before any is replaced, so a file that
+    # no longer matches the network fails the whole compaction. Before the
+    # first is replaced the compaction is recorded next to the journal:
+    # should it be cut short, finish_compaction() completes it.
+    marker = journal_path(path) + COMPACTING
+    if os.path.exists(marker):
+        raise ValueError("an earlier compaction of {} is unfinished, it completes at the "
+                         "next start".format(path))
+    paths = shards.shard_paths(path)
+    if paths is None:
+        parts = [(path, hospital_data.HospitalData(names, resources, coordinates))]
+    else:
+        by_region = shards.by_region(paths)
+        parts = []
+        for region, name in enumerate(region_names):
+            if name not in by_region:
+                raise ValueError("no shard of region {!r} in {}".format(name, path))
+            rows = np.flatnonzero(regions == region)
+            parts.append((by_region[name], hospital_data.HospitalData(
+                [names[row] for row in rows], resources[rows], coordinates[rows])))
+    written = []
+    try:
+        for part_path, part in parts:
+            written.append(hospital_data.write_counts(part_path, part.resources))
+    except BaseException:
+        for temporary in written:
+            os.remove(temporary)
+        raise
+    copies = {part_path: temporary for (part_path, _), temporary in zip(parts, written)}
+    base = base_files(path)
+    new = fingerprint(base, copies)
+    _write_file(marker, json.dumps(dict(
+        old=fingerprint(base).hex(), new=new.hex(), start=start,
+        files=[[temporary, part_path] for part_path, temporary in copies.items()])).encode())
+    for (part_path, part), temporary in zip(parts, written):
+        os.replace(temporary, part_path)
+        try:
+            snapshot.save(part_path, part)
+        except OSError:
+            pass  # Read-only location, parse again next time
+    return new
+
+
+def finish_compaction(path):
+    # Complete a compaction of the base files of path that a crash cut
+    # short between replacing them and rebasing the journal: move in the
+    # files still waiting and keep only the journal records written after
+    # the compacted ones. Call before the base files are read.
+    marker = journal_path(path) + COMPACTING
+    try:
+        with open(marker) as file:
+            state = json.load(file)
+    except FileNotFoundError:
+        return
+    for temporary, part_path in state["files"]:
+        if os.path.exists(temporary):
+            os.replace(temporary, part_path)
+    found, records = read(journal_path(path))
+    if found == bytes.fromhex(state["old"]):
+        _write_file(journal_path(path),
+                    MAGIC + bytes.fromhex(state["new"]) + records[state["start"]:].tobytes())
+    os.remove(marker)
+
+
+def _write_file(path, data):
+    # Replace the file at path with data in one step, synced to disk
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+        file.flush()
+        os.fsync(file.fileno())
+    os.replace(temporary, path)
+
+
+def _magic(path):
+    with open(path, "rb") as file:
+        return file.read(len(MAGIC))
+
+
+class TransferJournal:
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+        self.records = 0  # Records in the file, committed or not
+        self.pending = 0  # Records written since the last commit
+        self.last_group = 0
+        self.undo_stack = []
+        self.redo_stack = []
+        self._manual = {}  # group -> (rows, deltas) of manual transfers
+
+    def is_open(self):
+        return self.file is not None
+
+    def open(self, base_fingerprint, resources):
+        # Replay the journal onto resources, which must hold the base data,
+        # and open it for appending. A journal of other base data (or one
+        # naming rows the base does not have, or an unreadable one) is set
+        # aside as "<path>.stale". Returns the rows the replay changed.
+        found, records = read(self.path)
+        if found != base_fingerprint or (len(records) and records["row"].max() >= len(resources)):
+            if os.path.exists(self.path):
+                os.replace(self.path, self.path + ".stale")
+            records = np.zeros(0, dtype=RECORD)
+            self.file = open(self.path, "w+b")
+            self.file.write(MAGIC + base_fingerprint)
+            self.commit(force=True)
+        elif _magic(self.path) != MAGIC:
+            # A journal of an earlier version, rewritten in this one
+            self._replace(base_fingerprint, records.tobytes())
+        else:
+            # Appending after the last complete group drops a torn tail
+            self.file = open(self.path, "r+b")
+            self.file.seek(HEADER_BYTES + len(records) * RECORD.itemsize)
+            self.file.truncate()
+        self.records = len(records)
+        self.last_group = int(records["group"].max()) if len(records) else 0
+        self._walk(records)
+        rows = records["row"].astype(np.intp)
+        np.add.at(resources, rows, records["delta"].astype(resources.dtype))
+        return np.unique(rows)
+
+    def append(self, kind, rows, deltas, ref=0):
+        # Journal one change: deltas[i] (five counts) was added to rows[i].
+        # Returns its group id, None when there was nothing to journal.
+        rows = np.asarray(rows, dtype=np.intp)
+        if len(rows) == 0:
+            return None
+        deltas = np.asarray(deltas).reshape(len(rows), len(hospital_data.RESOURCE_COLS))
+        self.last_group += 1
+        block = np.zeros(len(rows), dtype=RECORD)
+        block["time"] = time.time()
+        block["group"] = self.last_group
+        block["ref"] = ref
+        block["kind"] = kind
+        block["kind"][-1] |= END
+        block["row"] = rows
+        block["delta"] = deltas
+        self.file.write(block.tobytes())
+        self.records += len(block)
+        self.pending += len(block)
+        if kind == MANUAL:
+            self._manual[self.last_group] = rows.copy(), deltas.copy()
+            self.undo_stack.append(self.last_group)
+            self.redo_stack.clear()
+        return self.last_group
+
+    def commit(self, force=False):
+        # Make everything appended so far durable with one fsync
+        if self.pending or force:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+
+    def undo(self, resources):
+        # Take back the latest manual transfer not undone yet. Returns the
+        # rows changed, None when there is nothing to undo; raises
+        # analytics.TransferError when the counts no longer allow it.
+        if not self.undo_stack:
+            return None
+        group = self.undo_stack[-1]
+        rows, deltas = self._manual[group]
+        self._apply(resources, rows, -deltas)
+        self.undo_stack.pop()
+        self.redo_stack.append(group)
+        self.append(UNDO, rows, -deltas, group)
+        return rows
+
+    def redo(self, resources):
+        # Apply again the latest undone manual transfer, as undo()
+        if not self.redo_stack:
+            return None
+        group = self.redo_stack[-1]
+        rows, deltas = self._manual[group]
+        self._apply(resources, rows, deltas)
+        self.redo_stack.pop()
+        self.undo_stack.append(group)
+        self.append(REDO, rows, deltas, group)
+        return rows
+
+    def rebase(self, base_fingerprint, start):
+        # The base files now include the first start records: rewrite the
+        # journal for the new base with only the records after them
+        self.file.flush()
+        self.file.seek(HEADER_BYTES + start * RECORD.itemsize)
+        self._replace(base_fingerprint, self.file.read())
+        self.records -= start
+        self.pending = 0
+        # The compaction is complete (see compact_base)
+        if os.path.exists(self.path + COMPACTING):
+            os.remove(self.path + COMPACTING)
+
+    def close(self):
+        if self.file is not None:
+            self.commit()
+            self.file.close()
+            self.file = None
+
+    def _replace(self, base_fingerprint, body):
+        # Put a journal of base_fingerprint holding body (records) in place
+        # of the file in one step and open it for appending
+        if self.file is not None:
+            self.file.close()
+        _write_file(self.path, MAGIC + base_fingerprint + body)
+        self.file = open(self.path, "r+b")
+        self.file.seek(0, os.SEEK_END)
+
+    def _walk(self, records):
+        # Rebuild the undo and redo stacks from replayed records
+        starts, stops = groups(records)
+        walked = np.isin(records["kind"][starts] & KIND_MASK, (MANUAL, UNDO, REDO))
+        for start, stop in zip(starts[walked], stops[walked]):
+            kind = records["kind"][start] & KIND_MASK
+            group = int(records["group"][start])
+            ref = int(records["ref"][start])
+            if kind == MANUAL:
+                self._manual[group] = (records["row"][start:stop].astype(np.intp),
+                                       records["delta"][start:stop].astype(
+                                           hospital_data.RESOURCE_DTYPE))
+                self.undo_stack.append(group)
+                self.redo_stack.clear()
+            elif kind == UNDO and self.undo_stack and self.undo_stack[-1] == ref:
+                self.redo_stack.append(self.undo_stack.pop())
+            elif kind == REDO and self.redo_stack and self.redo_stack[-1] == ref:
+                self.undo_stack.append(self.redo_stack.pop())
+
+    @staticmethod
+    def _apply(resources, rows, deltas):
+        result = resources[rows] + deltas
+        negative = ((result < 0) & (deltas < 0)).any(axis=1)
+        if negative.any():
+            raise analytics.TransferError(
+                "hospitals would be left with negative resources: {}".format(
+                    rows[negative].tolist()))
+        resources[rows] = result
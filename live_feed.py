@@ -0,0 +1,133 @@
+# Live resource updates for the dashboard. Admissions systems send
+# resource deltas as CSV lines in the layout of the hospital file,
+#
+#   Hospital 12,-1,0,2,0,0
+#
+# either over a local TCP socket (any number of connections) or by
+# appending them to a file that is tailed. An asyncio loop on a worker
+# thread reads them and hands them to the GUI thread in micro-batches,
+# so a flood of updates costs one table and chart refresh per batch.
+
+import asyncio
+import csv
+import os
+
+from PyQt5.QtCore import QThread, pyqtSignal
+
+import hospital_data
+
+DEFAULT_PORT = 8765
+
+# Pending deltas are handed over this often, or sooner once MAX_BATCH
+# lines are waiting
+BATCH_MS = 50
+MAX_BATCH = 50000
+
+READ_SIZE = 1 << 16
+TAIL_POLL_S = 0.05
+
+
+def parse_deltas(lines):
+    # CSV lines to (names, (n, 5) delta array); malformed lines are dropped
+    return hospital_data.parse_rows([row for row in csv.reader(lines) if row])
+
+
+class LiveFeed(QThread):
+    # Listens on host:port, or tails tail_path when given. Port 0 picks a
+    # free port, announced through listening.
+    deltas_received = pyqtSignal(object, object)
+    listening = pyqtSignal(int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, port=DEFAULT_PORT, tail_path=None, host="127.0.0.1", parent=None):
+        super().__init__(parent)
+        self.port = port
+        self.tail_path = tail_path
+        self.host = host
+        self._pending = []
+        self._full = None
+
+    def stop(self):
+        self.requestInterruption()
+        self.wait()
+
+    def run(self):
+        try:
+            asyncio.run(self._serve())
+        except OSError as error:
+            self.failed.emit(str(error))
+
+    async def _serve(self):
+        self._full = asyncio.Event()
+        if self.tail_path:
+            server = None
+            source = asyncio.ensure_future(self._tail())
+        else:
+            server = await asyncio.start_server(self._client, self.host, self.port)
+            self.port = server.sockets[0].getsockname()[1]
+            self.listening.emit(self.port)
+            source = None
+        try:
+            while not self.isInterruptionRequested():
+                try:
+                    await asyncio.wait_for(self._full.wait(), BATCH_MS / 1000)
+                except asyncio.TimeoutError:
+                    pass
+                self._full.clear()
+                self._flush()
+                if source is not None and source.done():
+                    source.result()  # Re-raise a failed tail
+        finally:
+            if server is not None:
+                server.close()
+                await server.wait_closed()
+            if source is not None:
+                source.cancel()
+
+    async def _client(self, reader, writer):
+        rest = b""
+        try:
+            while True:
+                block = await reader.read(READ_SIZE)
+                if not block:
+                    break
+                rest = self._add(rest + block)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+        self._add(rest + b"\n")
+
+    async def _tail(self):
+        # Follow the file from its current end; start over if truncated
+        with open(self.tail_path, "rb") as file:
+            file.seek(0, os.SEEK_END)
+            rest = b""
+            while True:
+                block = file.read(READ_SIZE)
+                if block:
+                    rest = self._add(rest + block)
+                    await asyncio.sleep(0)  # Let batches go out while catching up
+                    continue
+                if os.path.getsize(self.tail_path) < file.tell():
+                    file.seek(0)
+                    rest = b""
+                await asyncio.sleep(TAIL_POLL_S)
+
+    def _add(self, data):
+        # Queue the complete lines of data, return the unfinished tail
+        lines = data.split(b"\n")
+        rest = lines.pop()
+        self._pending.extend(lines)
+        if len(self._pending) >= MAX_BATCH:
+            self._full.set()
+        return rest
+
+    def _flush(self):
+        if not self._pending:
+            return
+        lines = [line.decode("utf-8", "replace").rstrip("\r") for line in self._pending]
+        self._pending = []
+        names, deltas = parse_deltas(lines)
+        if len(names):
+            self.deltas_received.emit(names, deltas)
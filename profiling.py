@@ -0,0 +1,121 @@
+# Hot-path instrumentation for the dashboard. Slots decorated with
+# timed() and blocks wrapped in span() record their wall time into the
+# module's PROFILER while it is enabled; disabled, a timed slot costs one
+# flag check. Per name the latest durations are kept for percentiles, and
+# every span is kept (bounded) as a Chrome trace event, so a slow session
+# can be opened in chrome://tracing or Perfetto. Needs NumPy only.
+
+import collections
+import contextlib
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# Durations kept per name for the percentiles
+SAMPLES = 10000
+# Trace events kept for export, the oldest are dropped first
+MAX_EVENTS = 200000
+
+PERCENTILES = (50, 95, 99)
+
+
+class Profiler:
+
+    def __init__(self, samples=SAMPLES, max_events=MAX_EVENTS):
+        self.enabled = False
+        self.samples = samples
+        self.origin = time.perf_counter()
+        self._durations = {}
+        self._counts = collections.Counter()
+        self._threads = {}
+        self.events = collections.deque(maxlen=max_events)
+
+    def add(self, name, start, end):
+        # Record one call of name from start to end (perf_counter seconds)
+        durations = self._durations.get(name)
+        if durations is None:
+            durations = self._durations.setdefault(
+                name, collections.deque(maxlen=self.samples))
+        durations.append(end - start)
+        self._counts[name] += 1
+        thread = threading.get_ident()
+        if thread not in self._threads:
+            self._threads[thread] = threading.current_thread().name
+        self.events.append((name, start, end, thread))
+
+    def reset(self):
+        self._durations.clear()
+        self._counts.clear()
+        self.events.clear()
+
+    def stats(self):
+        # [(name, calls, p50, p95, p99, max)] in seconds, slowest p99 first.
+        # Percentiles cover the latest samples calls of each name.
+        rows = []
+        for name, durations in list(self._durations.items()):
+            values = np.fromiter(durations, dtype=float)
+            if not len(values):
+                continue
+            rows.append((name, self._counts[name], *np.percentile(values, PERCENTILES),
+                         float(values.max())))
+        rows.sort(key=lambda row: row[4], reverse=True)
+        return rows
+
+    def chrome_trace(self):
+        # The recorded spans in the Chrome trace event format
+        pid = os.getpid()
+        events = [{"name": "thread_name", "ph": "M", "pid": pid, "tid": thread,
+                   "args": {"name": name}} for thread, name in self._threads.items()]
+        events.extend({"name": name, "cat": "careconnect", "ph": "X", "pid": pid,
+                       "tid": thread, "ts": (start - self.origin) * 1e6,
+                       "dur": (end - start) * 1e6}
+                      for name, start, end, thread in list(self.events))
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export(self, path):
+        with open(path, "w") as file:
+            json.dump(self.chrome_trace(), file)
+
+
+PROFILER = Profiler()
+
+
+@contextlib.contextmanager
+def span(name, profiler=PROFILER):
+    # Time the block under name when profiling is enabled
+    if not profiler.enabled:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        profiler.add(name, start, time.perf_counter())
+
+
+def timed(name=None, profiler=PROFILER):
+    # Decorator timing each call under name (the function name by default)
+    # when profiling is enabled
+    def decorate(function):
+        label = name or function.__name__
+        # Like PyQt does for plain slots, drop signal arguments the slot
+        # does not take (clicked passes checked, for one)
+        code = function.__code__
+        takes = None if code.co_flags & inspect.CO_VARARGS else code.co_argcount
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not profiler.enabled:
+                return function(*args[:takes], **kwargs)
+            start = time.perf_counter()
+            try:
+                return function(*args[:takes], **kwargs)
+            finally:
+                profiler.add(label, start, time.perf_counter())
+        return wrapper
+    return decorate
@@ -0,0 +1,73 @@
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import (QDockWidget, QWidget, QPushButton, QTableWidget, QTableWidgetItem,
+                             QAbstractItemView, QFileDialog, QVBoxLayout, QHBoxLayout)
+
+import profiling
+
+# How often the open panel re-reads the profiler
+REFRESH_MS = 500
+
+COLUMNS = ["Slot / job", "Calls", "p50 (ms)", "p95 (ms)", "p99 (ms)", "Max (ms)"]
+
+
+class ProfilingPanel(QDockWidget):
+    # Latency table over a profiling.Profiler. Profiling runs while the
+    # panel is shown, or throughout when keep_recording is set (e.g. to
+    # export a trace of a whole session).
+
+    def __init__(self, profiler=profiling.PROFILER, parent=None):
+        super().__init__("Profiling", parent)
+        self.profiler = profiler
+        self.keep_recording = False
+
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.verticalHeader().hide()
+        reset_button = QPushButton("Reset")
+        reset_button.clicked.connect(self.reset)
+        export_button = QPushButton("Export trace...")
+        export_button.clicked.connect(self.export_trace)
+
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(reset_button)
+        buttons.addWidget(export_button)
+        layout = QVBoxLayout()
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+        contents = QWidget()
+        contents.setLayout(layout)
+        self.setWidget(contents)
+
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setInterval(REFRESH_MS)
+        self.refresh_timer.timeout.connect(self.refresh)
+        self.visibilityChanged.connect(self.set_recording)
+
+    def set_recording(self, visible):
+        self.profiler.enabled = visible or self.keep_recording
+        if visible:
+            self.refresh()
+            self.refresh_timer.start()
+        else:
+            self.refresh_timer.stop()
+
+    def refresh(self):
+        rows = self.profiler.stats()
+        self.table.setRowCount(len(rows))
+        for row, (name, calls, *seconds) in enumerate(rows):
+            values = [name, str(calls)] + ["{:.2f}".format(value * 1000) for value in seconds]
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(value))
+        self.table.resizeColumnsToContents()
+
+    def reset(self):
+        self.profiler.reset()
+        self.refresh()
+
+    def export_trace(self):
+        path, _ = QFileDialog.getSaveFileName(self, "Export Chrome trace", "careconnect-trace.json",
+                                              "Trace files (*.json)")
+        if path:
+            self.profiler.export(path)
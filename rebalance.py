@@ -0,0 +1,337 @@
+import json
+
+import numpy as np
+
+import geo
+import hospital_data
+
+# Minimum level per resource column before a hospital counts as short.
+# Only staff has ever been checked, the other columns never trigger.
+DEFAULT_THRESHOLDS = {
+    hospital_data.STAFF_COL: 10,
+    hospital_data.DOCTORS_COL: 0,
+    hospital_data.BEDS_COL: 0,
+    hospital_data.CT_SCANNERS_COL: 0,
+    hospital_data.MRI_MACHINES_COL: 0,
+}
+
+# Donors a hospital with known coordinates may draw on, nearest first
+NEAREST_DONORS = 8
+
+# Hospitals are classed by their bed count (as loaded, see
+# ThresholdPolicy.freeze)
+CLASS_COL = hospital_data.BEDS_COL
+
+
+class ThresholdPolicy:
+    # Thresholds for all five resources, optionally raised or lowered per
+    # hospital class. A class applies from its min_beds upwards, so every
+    # hospital falls in the class with the largest min_beds it reaches (the
+    # base "default" class below all of them). The thresholds are held as
+    # a (classes, 5) table and a hospital's row is picked by one
+    # searchsorted over the bed counts, so the shortage check of the whole
+    # network is a single gather and comparison.
+    #
+    # Beds are rebalanced like any other resource, so a network's policy
+    # keeps the bed count each hospital was loaded with (freeze()) and
+    # classes by that: a transfer never moves a hospital to another class.
+    #
+    # As JSON, resources are named by hospital_data.RESOURCE_KEYS:
+    #
+    #   {"thresholds": {"staff": 10, "doctors": 2},
+    #    "classes": [{"name": "district", "min_beds": 100,
+    #                 "thresholds": {"staff": 40, "ct_scanners": 1}}]}
+    #
+    # Classes inherit the base thresholds they do not override, and a
+    # resource with no threshold anywhere is 0, i.e. never short.
+
+    def __init__(self, thresholds=None, classes=()):
+        # thresholds maps a table column to a number; classes is a list of
+        # (name, min_beds, {table column: number})
+        base = np.zeros(len(hospital_data.RESOURCE_COLS), dtype=hospital_data.RESOURCE_DTYPE)
+        for col, threshold in (thresholds or {}).items():
+            base[col - hospital_data.STAFF_COL] = threshold
+        classes = sorted(classes, key=lambda spec: spec[1])
+        self.class_names = ["default"] + [name for name, _, _ in classes]
+        self.min_beds = np.array([min_beds for _, min_beds, _ in classes],
+                                 dtype=hospital_data.RESOURCE_DTYPE)
+        self.table = np.tile(base, (len(classes) + 1, 1))
+        for index, (_, _, overrides) in enumerate(classes, 1):
+            for col, threshold in overrides.items():
+                self.table[index, col - hospital_data.STAFF_COL] = threshold
+        # Bed count each hospital is classed by, by network row
+        self.class_beds = np.zeros(0, dtype=hospital_data.RESOURCE_DTYPE)
+
+    @classmethod
+    def from_dict(cls, spec):
+        return cls(_columns(spec.get("thresholds", {})),
+                   [(item["name"], int(item["min_beds"]), _columns(item.get("thresholds", {})))
+                    for item in spec.get("classes", [])])
+
+    @classmethod
+    def from_json(cls, path):
+        with open(path) as file:
+            return cls.from_dict(json.load(file))
+
+    def freeze(self, resources):
+        # Class the network rows of resources that are not classed yet by
+        # their current bed count, for good. Called as hospitals are loaded,
+        # before anything is transferred.
+        known = len(self.class_beds)
+        if len(resources) > known:
+            self.class_beds = np.concatenate(
+                [self.class_beds, resources[known:, CLASS_COL - hospital_data.STAFF_COL]])
+
+    def frozen(self, resources):
+        # A copy classing the rows of resources by their bed count now
+        policy = self.copy()
+        policy.class_beds = np.zeros(0, dtype=hospital_data.RESOURCE_DTYPE)
+        policy.freeze(resources)
+        return policy
+
+    def classify(self, resources, rows=None):
+        # Class index of every hospital in an (n, 5) network array, or of
+        # the hospitals in rows of it. Rows not frozen are classed by
+        # their current beds.
+        resources = np.asarray(resources)
+        col = CLASS_COL - hospital_data.STAFF_COL
+        beds = resources[:, col] if rows is None else resources[rows, col]
+        if len(self.min_beds) and len(self.class_beds):
+            index = np.arange(len(resources)) if rows is None else np.asarray(rows)
+            known = index < len(self.class_beds)
+            beds = np.where(known, self.class_beds[np.where(known, index, 0)], beds)
+        return np.searchsorted(self.min_beds, beds, side="right")
+
+    def matrix(self, resources, rows=None):
+        # (n, 5) thresholds of every hospital, or of those in rows
+        return self.table[self.classify(resources, rows)]
+
+    def thresholds(self, resources):
+        # The per-hospital thresholds as {table column: (n,) array}, the
+        # form plan_rebalance takes
+        matrix = self.matrix(resources)
+        return {col: matrix[:, col - hospital_data.STAFF_COL]
+                for col in hospital_data.RESOURCE_COLS}
+
+    def copy(self):
+        policy = ThresholdPolicy()
+        policy.class_names = list(self.class_names)
+        policy.min_beds = self.min_beds.copy()
+        policy.table = self.table.copy()
+        policy.class_beds = self.class_beds
+        return policy
+
+    def scaled(self, factor):
+        # A copy with every threshold multiplied by factor, rounded up
+        policy = self.copy()
+        policy.table = np.ceil(self.table * factor).astype(self.table.dtype)
+        return policy
+
+    def upper_bounds(self):
+        # {table column: highest threshold of any class}; no hospital below
+        # all of these is short
+        return dict(zip(hospital_data.RESOURCE_COLS, self.table.max(axis=0).tolist()))
+
+
+def _columns(named):
+    # {"staff": 10, ...} to {table column: 10, ...}
+    columns = {}
+    for key, threshold in named.items():
+        if key not in hospital_data.RESOURCE_KEYS:
+            raise ValueError("unknown resource {!r} in threshold policy".format(key))
+        columns[hospital_data.RESOURCE_COLS[hospital_data.RESOURCE_KEYS.index(key)]] = threshold
+    return columns
+
+
+DEFAULT_POLICY = ThresholdPolicy(DEFAULT_THRESHOLDS)
+
+
+def threshold_matrix(resources, thresholds=None, rows=None):
+    # Thresholds of the hospitals in rows (all when None) as an array that
+    # broadcasts against their (n, 5) resources. thresholds is a
+    # ThresholdPolicy or a dict mapping a table column to a scalar or a
+    # per-hospital array; columns missing from a dict are never short.
+    if thresholds is None:
+        thresholds = DEFAULT_POLICY
+    resources = np.asarray(resources)
+    if isinstance(thresholds, ThresholdPolicy):
+        return thresholds.matrix(resources, rows)
+    if rows is not None:
+        resources = resources[rows]
+    limits = np.full(resources.shape, np.iinfo(hospital_data.RESOURCE_DTYPE).min,
+                     dtype=hospital_data.RESOURCE_DTYPE)
+    for col, threshold in thresholds.items():
+        threshold = np.asarray(threshold)
+        if rows is not None and threshold.ndim:
+            threshold = threshold[rows]
+        limits[:, col - hospital_data.STAFF_COL] = threshold
+    return limits
+
+
+class TransferPlan:
+    # A list of single-resource moves held as parallel arrays:
+    # amount[i] of resource column[i] goes from source[i] to destination[i]
+
+    def __init__(self, source=(), destination=(), column=(), amount=()):
+        self.source = np.asarray(source, dtype=np.intp)
+        self.destination = np.asarray(destination, dtype=np.intp)
+        self.column = np.asarray(column, dtype=np.intp)
+        self.amount = np.asarray(amount, dtype=hospital_data.RESOURCE_DTYPE)
+
+    @classmethod
+    def concatenate(cls, plans):
+        plans = list(plans)
+        if not plans:
+            return cls()
+        return cls(np.concatenate([plan.source for plan in plans]),
+                   np.concatenate([plan.destination for plan in plans]),
+                   np.concatenate([plan.column for plan in plans]),
+                   np.concatenate([plan.amount for plan in plans]))
+
+    def __len__(self):
+        return len(self.amount)
+
+    def total_moved(self):
+        return int(self.amount.sum())
+
+    def rows(self):
+        # Every hospital the plan touches
+        return np.union1d(self.source, self.destination)
+
+    def deltas(self):
+        # Net change per hospital: (rows, (k, 5) array)
+        rows = self.rows()
+        delta = np.zeros((len(rows), len(hospital_data.RESOURCE_COLS)),
+                         dtype=hospital_data.RESOURCE_DTYPE)
+        index = self.column - hospital_data.STAFF_COL
+        np.add.at(delta, (np.searchsorted(rows, self.source), index), -self.amount)
+        np.add.at(delta, (np.searchsorted(rows, self.destination), index), self.amount)
+        return rows, delta
+
+    def apply(self, resources):
+        # Apply all moves to an (n, 5) resource array in place
+        index = self.column - hospital_data.STAFF_COL
+        np.add.at(resources, (self.source, index), -self.amount)
+        np.add.at(resources, (self.destination, index), self.amount)
+
+
+def _per_row(value, count):
+    return np.broadcast_to(np.asarray(value, dtype=hospital_data.RESOURCE_DTYPE), (count,))
+
+
+def plan_column(levels, threshold, floor=None, col=hospital_data.STAFF_COL):
+    # Plan moves for one resource column. Hospitals under threshold receive
+    # enough to reach it, the most short first; donors give only what they
+    # hold above their floor (the threshold unless given), the richest
+    # first. When surplus runs out the least short go without.
+    #
+    # Both sides are laid end to end on one number line by cumulative sums,
+    # every overlap of a recipient's interval with a donor's is one move,
+    # so the whole plan is a sort plus a searchsorted: O(n log n).
+    levels = np.asarray(levels, dtype=hospital_data.RESOURCE_DTYPE)
+    count = len(levels)
+    threshold = _per_row(threshold, count)
+    floor = threshold if floor is None else _per_row(floor, count)
+
+    deficit = threshold - levels
+    recipients = np.flatnonzero(deficit > 0)
+    surplus = levels - floor
+    donors = np.flatnonzero((surplus > 0) & (deficit <= 0))
+    if len(recipients) == 0 or len(donors) == 0:
+        return TransferPlan()
+
+    recipients = recipients[np.argsort(-deficit[recipients], kind="stable")]
+    donors = donors[np.argsort(-surplus[donors], kind="stable")]
+    need = np.cumsum(deficit[recipients])
+    have = np.cumsum(surplus[donors])
+    total = min(need[-1], have[-1])
+
+    cuts = np.union1d(need[need < total], have[have < total])
+    cuts = np.append(cuts, total)
+    amounts = np.diff(cuts, prepend=0)
+    return TransferPlan(donors[np.searchsorted(have, cuts)],
+                        recipients[np.searchsorted(need, cuts)],
+                        np.full(len(cuts), col),
+                        amounts)
+
+
+def plan_column_nearby(levels, threshold, floor=None, points=None,
+                       col=hospital_data.STAFF_COL, nearest=NEAREST_DONORS):
+    # plan_column for hospitals with a location: points are (n, 2)
+    # projected coordinates (geo.project), NaN where unknown. Recipients,
+    # the most short first, draw on their nearest donors with surplus left,
+    # at most nearest of them, found through a geo.GridIndex. Hospitals
+    # without a location are planned among themselves by plan_column.
+    levels = np.asarray(levels, dtype=hospital_data.RESOURCE_DTYPE)
+    count = len(levels)
+    threshold = _per_row(threshold, count)
+    floor = threshold if floor is None else _per_row(floor, count)
+    where = geo.located(points)
+
+    plans = []
+    unlocated = np.flatnonzero(~where)
+    if len(unlocated):
+        plan = plan_column(levels[unlocated], threshold[unlocated], floor[unlocated], col)
+        plans.append(TransferPlan(unlocated[plan.source], unlocated[plan.destination],
+                                  plan.column, plan.amount))
+
+    deficit = threshold - levels
+    surplus = levels - floor
+    recipients = np.flatnonzero((deficit > 0) & where)
+    donors = np.flatnonzero((surplus > 0) & (deficit <= 0) & where)
+    if len(recipients) and len(donors):
+        recipients = recipients[np.argsort(-deficit[recipients], kind="stable")]
+        index = geo.GridIndex(points[donors])
+        remaining = surplus[donors].copy()
+        alive = np.ones(len(donors), dtype=bool)
+        left = len(donors)
+        sources, destinations, amounts = [], [], []
+        for recipient in recipients.tolist():
+            found, _ = index.nearest(points[recipient], nearest, alive)
+            give = remaining[found]
+            # Nearest first, each donor gives what is still needed
+            before = np.cumsum(give) - give
+            take = np.clip(deficit[recipient] - before, 0, give)
+            used = take > 0
+            found, take = found[used], take[used]
+            remaining[found] -= take
+            emptied = found[remaining[found] == 0]
+            alive[emptied] = False
+            left -= len(emptied)
+            sources.append(donors[found])
+            destinations.append(np.full(len(found), recipient))
+            amounts.append(take)
+            if left == 0:
+                break
+        plans.append(TransferPlan(np.concatenate(sources), np.concatenate(destinations),
+                                  np.full(sum(len(a) for a in amounts), col),
+                                  np.concatenate(amounts)))
+    return TransferPlan.concatenate(plans)
+
+
+def plan_rebalance(resources, thresholds=None, floors=None, coordinates=None,
+                   nearest=NEAREST_DONORS):
+    # Plan moves for all five resource columns of an (n, 5) array.
+    # thresholds is a ThresholdPolicy or, like floors, maps a table column
+    # to a scalar or a per-hospital array; columns missing from thresholds
+    # are not rebalanced. With (n, 2) latitude/longitude coordinates,
+    # located hospitals draw on their nearest donors (plan_column_nearby).
+    if thresholds is None:
+        thresholds = DEFAULT_THRESHOLDS
+    elif isinstance(thresholds, ThresholdPolicy):
+        thresholds = thresholds.thresholds(resources)
+    floors = floors or {}
+    points = None
+    if coordinates is not None and geo.located(coordinates).any():
+        points = geo.project(coordinates)
+    plans = []
+    for col in hospital_data.RESOURCE_COLS:
+        if col not in thresholds:
+            continue
+        levels = resources[:, col - hospital_data.STAFF_COL]
+        if points is None:
+            plans.append(plan_column(levels, thresholds[col], floors.get(col), col))
+        else:
+            plans.append(plan_column_nearby(levels, thresholds[col], floors.get(col), points,
+                                            col, nearest))
+    return TransferPlan.concatenate(plans)
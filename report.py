@@ -0,0 +1,195 @@
+# Headless summary of a hospital network for nightly batch jobs: the staff
+# percentage the dashboard charts, the shortages its checks flag and
+# totals per region. The CSV (or every regional shard) is streamed a chunk
+# of rows at a time and only running totals are kept, so memory stays flat
+# however many hospitals there are. Changes journaled by the dashboard
+# since the last compaction are added on the way. Needs NumPy only, no Qt.
+#
+#   python MainCareConnect.py.py report hospitals.csv --thresholds policy.json \
+#       --output report.json --shortages short.csv
+
+import argparse
+import csv
+import json
+import sys
+
+import numpy as np
+
+import analytics
+import hospital_data
+import journal
+import rebalance
+import shards
+
+# Hospitals listed by staff percentage, as in the dashboard's top chart
+TOP_N = 20
+HISTOGRAM_BINS = 10
+
+
+class NetworkReport:
+    # Running totals over batches of hospitals, see add()
+
+    def __init__(self, policy=None, top=TOP_N, bins=HISTOGRAM_BINS):
+        self.policy = policy or rebalance.DEFAULT_POLICY
+        self.top = top
+        self.bins = bins
+        self.hospitals = 0
+        self.totals = np.zeros(len(hospital_data.RESOURCE_COLS), dtype=hospital_data.RESOURCE_DTYPE)
+        self.histogram = np.zeros(bins, dtype=np.int64)
+        self.short = np.zeros(len(hospital_data.RESOURCE_COLS), dtype=np.int64)
+        self.short_hospitals = 0
+        self.regions = {}  # name -> [hospitals, short hospitals, (5,) totals]
+        self.top_percent = np.zeros(0)
+        self.top_names = []
+
+    def add(self, region, names, resources, loaded=None):
+        # Account for one batch of hospitals of region. loaded is the
+        # batch as read, before journaled changes, which hospitals are
+        # classed by as in the dashboard. Returns its (n, 5) shortage matrix.
+        percent = analytics.staff_percent(resources)
+        policy = self.policy if loaded is None else self.policy.frozen(loaded)
+        short = analytics.shortages(resources, policy)
+        short_any = short.any(axis=1)
+        self.hospitals += len(resources)
+        self.totals += resources.sum(axis=0)
+        self.histogram += analytics.percent_bins(percent, self.bins)
+        self.short += short.sum(axis=0)
+        self.short_hospitals += int(short_any.sum())
+        totals = self.regions.setdefault(region, [0, 0, np.zeros_like(self.totals)])
+        totals[0] += len(resources)
+        totals[1] += int(short_any.sum())
+        totals[2] += resources.sum(axis=0)
+        self._keep_top(names, percent)
+        return short
+
+    def _keep_top(self, names, percent):
+        # Merge the batch's best into the best so far, earlier rows first
+        # among equals
+        count = min(self.top, len(percent))
+        if count == 0:
+            return
+        best = np.argpartition(-percent, count - 1)[:count]
+        merged = np.concatenate([self.top_percent, percent[best]])
+        merged_names = self.top_names + [names[row] for row in best]
+        order = np.argsort(-merged, kind="stable")[:self.top]
+        self.top_percent = merged[order]
+        self.top_names = [merged_names[index] for index in order]
+
+    def summary(self):
+        # The report as plain data, ready for JSON
+        keys = hospital_data.RESOURCE_KEYS
+        regions = []
+        for name, (hospitals, short_hospitals, totals) in self.regions.items():
+            regions.append(dict(
+                region=name, hospitals=hospitals, short_hospitals=short_hospitals,
+                staff_percent=round(float(analytics.staff_percent(totals[None])[0]), 2),
+                totals=dict(zip(keys, totals.tolist()))))
+        return dict(
+            hospitals=self.hospitals,
+            staff_percent=round(float(analytics.staff_percent(self.totals[None])[0]), 2),
+            totals=dict(zip(keys, self.totals.tolist())),
+            staff_histogram=dict(zip(analytics.histogram_labels(self.bins),
+                                     self.histogram.tolist())),
+            top_staff_percent=[[name, round(float(percent), 2)]
+                               for name, percent in zip(self.top_names, self.top_percent)],
+            short_hospitals=self.short_hospitals,
+            short=dict(zip(keys, self.short.tolist())),
+            regions=regions)
+
+
+def generate(path, policy=None, top=TOP_N, shortages_file=None,
+             chunk_rows=hospital_data.CHUNK_ROWS, use_journal=True):
+    # Stream the hospital CSV or shards at path into a NetworkReport and
+    # return its summary. With shortages_file (an open text file) every
+    # hospital flagged short is written to it as CSV.
+    if use_journal:
+        journal.finish_compaction(path)
+    paths = journal.base_files(path)
+    shards.by_region(paths)
+    changes = journal.net_changes(path) if use_journal else None
+    report = NetworkReport(policy, top)
+    writer = None
+    if shortages_file is not None:
+        writer = csv.writer(shortages_file)
+        writer.writerow([hospital_data.HEADERS[0], hospital_data.REGION_HEADER] +
+                        hospital_data.HEADERS[1:] + ["Short"])
+    offset = 0  # Row of the batch in the network, as the dashboard numbers it
+    for shard in paths:
+        region = shards.region_name(shard)
+        for names, resources, _, _ in hospital_data.iter_csv_chunks(shard, chunk_rows):
+            loaded = None
+            if changes is not None:
+                start, stop = np.searchsorted(changes[0], [offset, offset + len(names)])
+                if start < stop:
+                    loaded = resources.copy()
+                    resources[changes[0][start:stop] - offset] += changes[1][start:stop]
+            offset += len(names)
+            short = report.add(region, names, resources, loaded)
+            if writer is not None:
+                for row in np.flatnonzero(short.any(axis=1)):
+                    writer.writerow([names[row], region] + resources[row].tolist() + [" ".join(
+                        key for key, flag in zip(hospital_data.RESOURCE_KEYS, short[row]) if flag)])
+    return report.summary()
+
+
+def format_text(summary):
+    keys = hospital_data.RESOURCE_KEYS
+    lines = ["Hospitals: {}".format(summary["hospitals"]),
+             "Staff percentage: {:.2f}%".format(summary["staff_percent"]),
+             "Short hospitals: {} ({})".format(summary["short_hospitals"], ", ".join(
+                 "{} {}".format(count, key) for key, count in summary["short"].items())),
+             "", "Staff percentage histogram:"]
+    lines += ["  {:>9}  {}".format(label, count)
+              for label, count in summary["staff_histogram"].items()]
+    lines += ["", "Top staff percentage:"]
+    lines += ["  {:6.2f}%  {}".format(percent, name)
+              for name, percent in summary["top_staff_percent"]]
+    lines += ["", "Regions:", "  {:<20} {:>10} {:>8} {:>7}  {}".format(
+        "Region", "Hospitals", "Short", "Staff%", "  ".join(keys))]
+    for region in summary["regions"]:
+        lines.append("  {:<20} {:>10} {:>8} {:>7.2f}  {}".format(
+            region["region"], region["hospitals"], region["short_hospitals"],
+            region["staff_percent"], "  ".join(str(region["totals"][key]) for key in keys)))
+    return "\n".join(lines) + "\n"
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        prog="MainCareConnect.py.py report",
+        description="Summarize a hospital network without the dashboard")
+    parser.add_argument("csv", help="hospital CSV, or a directory or glob of per-region CSV shards")
+    parser.add_argument("--thresholds", metavar="POLICY",
+                        help="JSON threshold policy per resource and hospital class")
+    parser.add_argument("--output", metavar="PATH",
+                        help="write the report here, as JSON when PATH ends in .json (default: print it)")
+    parser.add_argument("--shortages", metavar="CSV",
+                        help="also list every hospital flagged short in this CSV")
+    parser.add_argument("--top", type=int, default=TOP_N,
+                        help="hospitals listed by staff percentage (default: %(default)s)")
+    parser.add_argument("--no-journal", action="store_true",
+                        help="report the CSV as it is, without the dashboard's journaled transfers")
+    args = parser.parse_args(argv)
+    policy = rebalance.ThresholdPolicy.from_json(args.thresholds) if args.thresholds else None
+
+    shortages_file = open(args.shortages, "w", newline="") if args.shortages else None
+    try:
+        summary = generate(args.csv, policy, args.top, shortages_file,
+                           use_journal=not args.no_journal)
+    except ValueError as error:
+        parser.error(str(error))
+    finally:
+        if shortages_file is not None:
+            shortages_file.close()
+    if args.output and args.output.endswith(".json"):
+        with open(args.output, "w") as file:
+            json.dump(summary, file, indent=2)
+    elif args.output:
+        with open(args.output, "w") as file:
+            file.write(format_text(summary))
+    else:
+        sys.stdout.write(format_text(summary))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,98 @@
+import multiprocessing
+
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtWidgets import (QDialog, QLabel, QPushButton, QTableWidget, QTableWidgetItem,
+                             QAbstractItemView, QVBoxLayout, QHBoxLayout)
+
+import scenarios
+
+# Ranked plans listed in the dialog
+BEST_SHOWN = 10
+
+COLUMNS = ["Scenario", "Hospitals short", "Resources short", "Units moved", "Moves",
+           "Mean distance (km)"]
+
+
+class ScenarioRunner(QThread):
+    # Runs scenarios.run on a copy of the network off the GUI thread
+    results_ready = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, resources, candidates, reference=None, coordinates=None, parent=None):
+        super().__init__(parent)
+        self.resources = resources.copy()
+        self.coordinates = None if coordinates is None else coordinates.copy()
+        self.candidates = candidates
+        self.reference = reference
+
+    def run(self):
+        # Workers are spawned, forking a process with Qt threads is unsafe
+        try:
+            results = scenarios.run(self.resources, self.candidates, self.reference,
+                                    self.coordinates,
+                                    context=multiprocessing.get_context("spawn"))
+        except (OSError, RuntimeError) as error:
+            self.failed.emit(str(error))
+            return
+        self.results_ready.emit(results)
+
+
+class ScenarioDialog(QDialog):
+    # Lists the best what-if plans; Apply re-plans the selected scenario
+    # on the current network through apply_scenario(scenario)
+
+    def __init__(self, candidates, apply_scenario, parent=None):
+        super().__init__(parent)
+        self.setWindowTitle("What-if scenarios")
+        self.candidates = {scenario.name: scenario for scenario in candidates}
+        self.apply_scenario = apply_scenario
+        self.results = []
+
+        self.status = QLabel("Simulating {} scenarios...".format(len(candidates)))
+        self.table = QTableWidget(0, len(COLUMNS))
+        self.table.setHorizontalHeaderLabels(COLUMNS)
+        self.table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.table.setSelectionMode(QAbstractItemView.SingleSelection)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.table.setMinimumWidth(800)
+        self.apply_button = QPushButton("Apply selected plan")
+        self.apply_button.setEnabled(False)
+        self.apply_button.clicked.connect(self.apply_selected)
+        close_button = QPushButton("Close")
+        close_button.clicked.connect(self.close)
+
+        buttons = QHBoxLayout()
+        buttons.addStretch()
+        buttons.addWidget(self.apply_button)
+        buttons.addWidget(close_button)
+        layout = QVBoxLayout()
+        layout.addWidget(self.status)
+        layout.addWidget(self.table)
+        layout.addLayout(buttons)
+        self.setLayout(layout)
+
+    def show_results(self, results):
+        self.results = results[:BEST_SHOWN]
+        self.status.setText("Best {} of {} scenarios, scored against the current thresholds".format(
+            len(self.results), len(self.candidates)))
+        self.table.setRowCount(len(self.results))
+        for row, result in enumerate(self.results):
+            distance = result["mean_km"]
+            values = [result["name"], result["short_hospitals"], result["short_cells"],
+                      result["moved"], result["moves"],
+                      "" if distance is None else "{:.1f}".format(distance)]
+            for col, value in enumerate(values):
+                self.table.setItem(row, col, QTableWidgetItem(str(value)))
+        self.table.resizeColumnsToContents()
+        if self.results:
+            self.table.selectRow(0)
+            self.apply_button.setEnabled(True)
+
+    def show_error(self, message):
+        self.status.setText("Simulation failed: " + message)
+
+    def apply_selected(self):
+        rows = self.table.selectionModel().selectedRows()
+        if not rows:
+            return
+        self.apply_scenario(self.candidates[self.results[rows[0].row()]["name"]])
@@ -0,0 +1,130 @@
+# What-if simulation of resource allocation. A scenario is a candidate
+# rebalancing strategy (thresholds, donor floors, how far donors may be)
+# optionally preceded by a batch of manual transfers; it is applied to a
+# copy of the network and scored against the dashboard's own thresholds.
+# Scenarios run across CPU cores in a process pool that receives the
+# network once per worker. Needs NumPy only.
+
+import multiprocessing
+
+import numpy as np
+
+import analytics
+import geo
+import hospital_data
+import rebalance
+
+# Threshold multipliers, donor floor margins and nearest-donor counts
+# (None for network-wide) combined by generate()
+THRESHOLD_SCALES = (0.8, 0.9, 1.0, 1.1, 1.25, 1.5)
+FLOOR_MARGINS = (0, 1, 2, 5)
+NEAREST_OPTIONS = (4, 8, 16, None)
+
+
+class Scenario:
+    # thresholds as for rebalance.plan_rebalance; donors keep floor_margin
+    # above their own thresholds; nearest is the donors a located hospital
+    # may draw on, None to plan network-wide; transfers is an optional
+    # (sources, destinations, amounts) batch applied first
+
+    def __init__(self, name, thresholds=None, floor_margin=0,
+                 nearest=rebalance.NEAREST_DONORS, transfers=None):
+        self.name = name
+        self.thresholds = thresholds
+        self.floor_margin = floor_margin
+        self.nearest = nearest
+        self.transfers = transfers
+
+    def floors(self, resources):
+        # Donor floors for rebalance.plan_rebalance, None for the thresholds
+        if not self.floor_margin:
+            return None
+        limits = rebalance.threshold_matrix(resources, self.thresholds)
+        return {col: limits[:, col - hospital_data.STAFF_COL] + self.floor_margin
+                for col in hospital_data.RESOURCE_COLS}
+
+    def plan(self, resources, coordinates=None):
+        # The rebalancing plan of this scenario for resources
+        return rebalance.plan_rebalance(
+            resources, self.thresholds, self.floors(resources),
+            coordinates if self.nearest is not None else None,
+            self.nearest or rebalance.NEAREST_DONORS)
+
+
+def generate(policy=None, coordinates=None):
+    # The standard sweep around policy: thresholds scaled up or down,
+    # donors keeping a margin above their thresholds and, with locations,
+    # different donor reach
+    policy = policy or rebalance.DEFAULT_POLICY
+    nearest_options = NEAREST_OPTIONS if coordinates is not None else (None,)
+    scenarios = []
+    for scale in THRESHOLD_SCALES:
+        scaled = policy.scaled(scale)
+        for margin in FLOOR_MARGINS:
+            for nearest in nearest_options:
+                name = "thresholds x{:g}, donors keep +{}, {}".format(
+                    scale, margin, "network-wide" if nearest is None
+                    else "nearest {}".format(nearest))
+                scenarios.append(Scenario(name, scaled, margin, nearest))
+    return scenarios
+
+
+def evaluate(resources, scenario, reference=None, coordinates=None):
+    # Apply scenario to a copy of resources and score it against the
+    # reference thresholds (the default policy unless given)
+    resources = np.array(resources)
+    result = {"name": scenario.name, "valid": True, "moves": 0, "moved": 0,
+              "mean_km": None}
+    if scenario.transfers is not None:
+        try:
+            analytics.apply_transfers(resources, *scenario.transfers)
+        except analytics.TransferError as error:
+            result.update(valid=False, error=str(error))
+            return result
+    plan = scenario.plan(resources, coordinates)
+    plan.apply(resources)
+    short = analytics.shortages(resources, reference)
+    result.update(short_hospitals=int(short.any(axis=1).sum()),
+                  short_cells=int(short.sum()),
+                  moves=len(plan), moved=plan.total_moved())
+    if coordinates is not None and len(plan):
+        points = geo.project(coordinates)
+        distances = np.hypot(*(points[plan.source] - points[plan.destination]).T)
+        distances = distances[np.isfinite(distances)]
+        if len(distances):
+            result["mean_km"] = float(distances.mean())
+    return result
+
+
+def rank(results):
+    # Best first: fewest hospitals short, then fewest short resources,
+    # then least moved, then shortest distances
+    valid = [result for result in results if result["valid"]]
+    return sorted(valid, key=lambda result: (
+        result["short_hospitals"], result["short_cells"], result["moved"],
+        result["mean_km"] if result["mean_km"] is not None else 0.0))
+
+
+_network = None
+
+
+def _init_worker(resources, reference, coordinates):
+    global _network
+    _network = resources, reference, coordinates
+
+
+def _evaluate_in_worker(scenario):
+    resources, reference, coordinates = _network
+    return evaluate(resources, scenario, reference, coordinates)
+
+
+def run(resources, scenarios, reference=None, coordinates=None, processes=None,
+        context=None):
+    # Evaluate scenarios in parallel, one worker process per core by
+    # default (context is an optional multiprocessing context). Returns the
+    # ranked results (see rank).
+    resources = np.ascontiguousarray(resources)
+    with (context or multiprocessing).Pool(processes, _init_worker,
+                                           (resources, reference, coordinates)) as pool:
+        chunksize = max(1, len(scenarios) // (4 * (processes or multiprocessing.cpu_count())))
+        return rank(pool.imap_unordered(_evaluate_in_worker, scenarios, chunksize))
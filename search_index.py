@@ -0,0 +1,106 @@
+from array import array
+
+import numpy as np
+
+NGRAM = 3
+
+# Names indexed per index_more() call, small enough to run between frames
+INDEX_BATCH = 20000
+
+
+def ngrams(text):
+    return {text[i:i + NGRAM] for i in range(len(text) - NGRAM + 1)}
+
+
+class HospitalSearchIndex:
+    # Substring search over the hospital names of a HospitalData store.
+    # Names are lowercased once as they are indexed, and every trigram
+    # keeps a sorted posting list of the rows containing it, so a query
+    # only checks rows that share all of its trigrams. A query that extends
+    # the previous one only re-checks the previous hits.
+    #
+    # Indexing is incremental (index_more) so a freshly loaded network is
+    # searchable at once; rows not indexed yet are scanned directly.
+
+    def __init__(self, data):
+        self.data = data
+        self.lowered = []
+        self.postings = {}
+        self._last_query = None
+        self._last_rows = None
+        self._last_count = 0
+
+    def __len__(self):
+        return len(self.lowered)
+
+    def pending(self):
+        return len(self.data) - len(self.lowered)
+
+    def index_more(self, limit=INDEX_BATCH):
+        names = self.data.names
+        start = len(self.lowered)
+        stop = min(len(names), start + limit)
+        for row in range(start, stop):
+            lowered = names[row].lower()
+            self.lowered.append(lowered)
+            for gram in ngrams(lowered):
+                postings = self.postings.get(gram)
+                if postings is None:
+                    postings = self.postings[gram] = array("i")
+                postings.append(row)
+        return stop - start
+
+    def search(self, query, names=None, count=None):
+        # Rows whose name contains query (case-insensitive), in row order.
+        # On a worker thread, names and count are the data's names and row
+        # count as taken on the GUI thread; rows added since are left out.
+        if names is None:
+            names, count = self.data.names, len(self.data)
+        query = query.strip().lower()
+        if not query:
+            return np.arange(count, dtype=np.intp)
+        indexed = min(len(self.lowered), count)
+        if (self._last_query is not None and self._last_count == count
+                and self._last_query in query):
+            candidates = self._last_rows
+        elif len(query) >= NGRAM:
+            candidates = np.concatenate([self._candidates(query),
+                                         np.arange(indexed, count, dtype=np.intp)])
+        else:
+            candidates = range(count)
+        lowered = self.lowered
+        rows = np.fromiter((row for row in candidates
+                            if query in (lowered[row] if row < indexed else names[row].lower())),
+                           dtype=np.intp)
+        # Cached hits stay valid until rows are added
+        self._last_query = query
+        self._last_rows = rows
+        self._last_count = count
+        return rows
+
+    def mask(self, query, names=None, count=None):
+        # Boolean visibility over all rows (count of them, see search),
+        # None when nothing is filtered
+        if not query.strip():
+            return None
+        if names is None:
+            names, count = self.data.names, len(self.data)
+        mask = np.zeros(count, dtype=bool)
+        mask[self.search(query, names, count)] = True
+        return mask
+
+    def _candidates(self, query):
+        lists = []
+        for gram in ngrams(query):
+            postings = self.postings.get(gram)
+            if postings is None:
+                return np.zeros(0, dtype=np.intp)
+            lists.append(postings)
+        lists.sort(key=len)
+        rows = np.frombuffer(lists[0], dtype=np.int32)
+        for postings in lists[1:]:
+            if len(rows) == 0:
+                break
+            rows = np.intersect1d(rows, np.frombuffer(postings, dtype=np.int32),
+                                  assume_unique=True)
+        return rows.astype(np.intp)
@@ -0,0 +1,80 @@
+# Hospital networks split into per-region CSV shards, given as a
+# directory of CSVs or a glob. Every shard is parsed in its own worker
+# process (or memory-mapped from its snapshot when unchanged) and the
+# blocks come back in path order to be appended to one HospitalData, each
+# tagged with its region: the shard's file name without extension.
+# Needs NumPy only.
+
+import functools
+import glob
+import multiprocessing
+import os
+
+import numpy as np
+
+import hospital_data
+import snapshot
+
+
+def shard_paths(path):
+    # The CSV shards named by a directory or a glob pattern, sorted, or
+    # None when path names a single file
+    if os.path.isdir(path):
+        paths = glob.glob(os.path.join(path, "*.csv"))
+    elif any(char in path for char in "*?["):
+        paths = glob.glob(path)
+    else:
+        return None
+    return sorted(path for path in paths if os.path.isfile(path))
+
+
+def region_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+
+def by_region(paths):
+    # {region: shard path}. Shards are told apart by region name alone, so
+    # two of the same name (say north.csv in two directories of a glob)
+    # raise ValueError.
+    regions = {}
+    for path in paths:
+        other = regions.setdefault(region_name(path), path)
+        if other != path:
+            raise ValueError("shards {} and {} are both region {!r}".format(
+                other, path, region_name(path)))
+    return regions
+
+
+def load_shard(path, use_snapshot=True):
+    # One shard as (names, resources, coordinates), plain enough to send
+    # back from a worker. A fresh snapshot is written for the next start.
+    data = snapshot.load(path) if use_snapshot else None
+    if data is None:
+        data = hospital_data.HospitalData.from_csv(path)
+        if use_snapshot:
+            try:
+                snapshot.save(path, data)
+            except OSError:
+                pass  # Read-only location, parse again next time
+    return list(data.names), np.asarray(data.resources), np.asarray(data.coordinates)
+
+
+def iter_shards(paths, processes=None, use_snapshot=True, context=None):
+    # Load shards in a process pool (one process per core, at most one per
+    # shard). Yields (region, names, resources, coordinates) in path order,
+    # each as soon as it and the shards before it are done.
+    by_region(paths)
+    processes = min(processes or multiprocessing.cpu_count(), max(len(paths), 1))
+    load = functools.partial(load_shard, use_snapshot=use_snapshot)
+    with (context or multiprocessing).Pool(processes) as pool:
+        for path, (names, resources, coordinates) in zip(paths, pool.imap(load, paths)):
+            yield region_name(path), names, resources, coordinates
+
+
+def load(path, processes=None, use_snapshot=True):
+    # Every shard named by path merged into one HospitalData
+    data = hospital_data.HospitalData()
+    for region, names, resources, coordinates in iter_shards(
+            shard_paths(path), processes, use_snapshot):
+        data.append(names, resources, coordinates, region)
+    return data
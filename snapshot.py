@@ -0,0 +1,141 @@
+# Binary snapshots of a hospital CSV. The resource counts and coordinates
+# are stored as fixed-width .npy arrays and the names as one UTF-8 blob
+# plus an offset array, all memory-mapped on load, so opening a snapshot
+# costs the same whatever the network size. A snapshot lives in
+# "<csv>.snapshot/" and is only used while the CSV is unchanged (same
+# size and mtime, or failing that the same content hash).
+
+import hashlib
+import json
+import os
+from collections.abc import Sequence
+
+import numpy as np
+
+import hospital_data
+
+FORMAT_VERSION = 2
+META_FILE = "meta.json"
+RESOURCES_FILE = "resources.npy"
+COORDINATES_FILE = "coordinates.npy"
+OFFSETS_FILE = "name_offsets.npy"
+NAMES_FILE = "names.bin"
+
+
+class StringTable(Sequence):
+    # Read-only sequence of strings decoded on access from a UTF-8 blob;
+    # offsets[i]:offsets[i + 1] are the bytes of string i
+
+    def __init__(self, blob, offsets):
+        self.blob = blob
+        self.offsets = offsets
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(*index.indices(len(self)))]
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("string table index out of range")
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return bytes(self.blob[start:stop]).decode("utf-8")
+
+    def __iter__(self):
+        blob = bytes(self.blob)
+        offsets = self.offsets.tolist()
+        for start, stop in zip(offsets, offsets[1:]):
+            yield blob[start:stop].decode("utf-8")
+
+
+def snapshot_dir(csv_path):
+    return csv_path + ".snapshot"
+
+
+def file_hash(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _source_stat(csv_path):
+    stat = os.stat(csv_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def save(csv_path, data):
+    # Write the snapshot for csv_path from data, which must hold exactly
+    # the CSV contents. Files are written under temporary names and the
+    # metadata last, so a half-written snapshot is never picked up.
+    directory = snapshot_dir(csv_path)
+    os.makedirs(directory, exist_ok=True)
+    meta_path = os.path.join(directory, META_FILE)
+    if os.path.exists(meta_path):
+        os.remove(meta_path)
+
+    encoded = [name.encode("utf-8") for name in data.names]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(name) for name in encoded], out=offsets[1:])
+    _write(os.path.join(directory, RESOURCES_FILE),
+           lambda file: np.save(file, np.ascontiguousarray(data.resources)))
+    _write(os.path.join(directory, COORDINATES_FILE),
+           lambda file: np.save(file, np.ascontiguousarray(data.coordinates)))
+    _write(os.path.join(directory, OFFSETS_FILE), lambda file: np.save(file, offsets))
+    _write(os.path.join(directory, NAMES_FILE), lambda file: file.write(b"".join(encoded)))
+
+    meta = dict(_source_stat(csv_path), version=FORMAT_VERSION, rows=len(data),
+                sha1=file_hash(csv_path))
+    _write(meta_path, lambda file: file.write(json.dumps(meta).encode("utf-8")))
+
+
+def _write(path, writer):
+    temporary = path + ".tmp"
+    with open(temporary, "wb") as file:
+        writer(file)
+    os.replace(temporary, path)
+
+
+def load(csv_path):
+    # Memory-map the snapshot of csv_path into a HospitalData, or return
+    # None when there is no snapshot or the CSV changed since it was taken.
+    # Resources are mapped copy-on-write: edits stay in memory.
+    directory = snapshot_dir(csv_path)
+    try:
+        with open(os.path.join(directory, META_FILE), "rb") as file:
+            meta = json.loads(file.read().decode("utf-8"))
+        stat = _source_stat(csv_path)
+    except (OSError, ValueError):
+        return None
+    if meta.get("version") != FORMAT_VERSION or meta.get("size") != stat["size"]:
+        return None
+    if meta.get("mtime_ns") != stat["mtime_ns"]:
+        # Touched but maybe not changed; the hash is still far cheaper
+        # than parsing the CSV again
+        if meta.get("sha1") != file_hash(csv_path):
+            return None
+        meta.update(stat)
+        try:
+            _write(os.path.join(directory, META_FILE),
+                   lambda file: file.write(json.dumps(meta).encode("utf-8")))
+        except OSError:
+            pass
+
+    try:
+        resources = np.load(os.path.join(directory, RESOURCES_FILE), mmap_mode="c")
+        coordinates = np.load(os.path.join(directory, COORDINATES_FILE), mmap_mode="c")
+        offsets = np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode="r")
+        names_path = os.path.join(directory, NAMES_FILE)
+        if os.path.getsize(names_path):
+            blob = np.memmap(names_path, dtype=np.uint8, mode="r")
+        else:
+            blob = np.zeros(0, dtype=np.uint8)
+    except (OSError, ValueError):
+        return None
+    if (resources.shape != (meta["rows"], len(hospital_data.RESOURCE_COLS))
+            or coordinates.shape != (meta["rows"], 2) or len(offsets) != meta["rows"] + 1):
+        return None
+    return hospital_data.HospitalData(StringTable(blob, offsets), resources, coordinates)
@@ -0,0 +1,221 @@
+# Optional SQLite storage for the hospital network. Hospitals keep their
+# store row as the primary key, names get an FTS5 trigram index so
+# substring search is an index lookup, and each resource column plus the
+# staff percentage expression has a B-tree index for threshold scans and
+# top-N queries. Transfers run as transactions. The CSV stays the import
+# source.
+
+import os
+import sqlite3
+
+import numpy as np
+
+import analytics
+import hospital_data
+
+RESOURCE_FIELDS = dict(zip(hospital_data.RESOURCE_COLS, hospital_data.RESOURCE_KEYS))
+FIELDS = [RESOURCE_FIELDS[col] for col in hospital_data.RESOURCE_COLS]
+STAFF_PERCENT = ("(staff * 100.0 / NULLIF(staff + doctors + beds + ct_scanners"
+                 " + mri_machines, 0))")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS hospitals (
+    id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    staff INTEGER NOT NULL,
+    doctors INTEGER NOT NULL,
+    beds INTEGER NOT NULL,
+    ct_scanners INTEGER NOT NULL,
+    mri_machines INTEGER NOT NULL,
+    latitude REAL,
+    longitude REAL
+);
+CREATE INDEX IF NOT EXISTS hospitals_name ON hospitals (name COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS hospitals_staff ON hospitals (staff);
+CREATE INDEX IF NOT EXISTS hospitals_doctors ON hospitals (doctors);
+CREATE INDEX IF NOT EXISTS hospitals_beds ON hospitals (beds);
+CREATE INDEX IF NOT EXISTS hospitals_ct_scanners ON hospitals (ct_scanners);
+CREATE INDEX IF NOT EXISTS hospitals_mri_machines ON hospitals (mri_machines);
+CREATE INDEX IF NOT EXISTS hospitals_staff_percent ON hospitals """ + STAFF_PERCENT + """;
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+"""
+
+NAME_INDEX = ("CREATE VIRTUAL TABLE IF NOT EXISTS hospital_names USING fts5("
+              "name, content='hospitals', content_rowid='id', tokenize='trigram')")
+
+
+class SqliteHospitalStore:
+
+    def __init__(self, path):
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        # WAL lets the dashboard read while a loader thread imports
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(SCHEMA)
+        columns = [row[1] for row in self.connection.execute("PRAGMA table_info(hospitals)")]
+        if "latitude" not in columns:
+            # Databases from before coordinates: add the columns and force
+            # a fresh import to fill them
+            self.connection.execute("ALTER TABLE hospitals ADD COLUMN latitude REAL")
+            self.connection.execute("ALTER TABLE hospitals ADD COLUMN longitude REAL")
+            self.connection.execute("DELETE FROM meta WHERE key = 'source'")
+        try:
+            self.connection.execute(NAME_INDEX)
+            self.has_name_index = True
+        except sqlite3.OperationalError:
+            # SQLite built without FTS5 or older than 3.34
+            self.has_name_index = False
+        self.connection.commit()
+
+    def close(self):
+        self.connection.close()
+
+    def __len__(self):
+        return self.connection.execute("SELECT COUNT(*) FROM hospitals").fetchone()[0]
+
+    # Import and load
+
+    def needs_import(self, csv_path):
+        # True when csv_path was never imported or changed since
+        row = self.connection.execute(
+            "SELECT value FROM meta WHERE key = 'source'").fetchone()
+        return row is None or row[0] != _source(csv_path)
+
+    def import_csv(self, csv_path):
+        # Replace the table with the contents of csv_path in one transaction
+        source = _source(csv_path)
+        with self.connection:
+            self.connection.execute("DELETE FROM hospitals")
+            row = 0
+            for names, counts, located, _, _ in hospital_data.iter_csv_records(csv_path):
+                # NaN (no location) is stored as NULL
+                located = np.where(np.isfinite(located), located, None).tolist()
+                self.connection.executemany(
+                    "INSERT INTO hospitals (id, name, {}, latitude, longitude) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)".format(", ".join(FIELDS)),
+                    ((row + i, name, *values, *place)
+                     for i, (name, values, place) in enumerate(
+                         zip(names, counts.tolist(), located))))
+                row += len(names)
+            if self.has_name_index:
+                self.connection.execute(
+                    "INSERT INTO hospital_names (hospital_names) VALUES ('rebuild')")
+            self.connection.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('source', ?)", (source,))
+
+    def load(self):
+        # The whole table as a HospitalData; store row i is hospital id i
+        cursor = self.connection.execute(
+            "SELECT name, {}, latitude, longitude FROM hospitals ORDER BY id".format(
+                ", ".join(FIELDS)))
+        names = []
+        counts = []
+        located = []
+        for row in cursor:
+            names.append(row[0])
+            counts.append(row[1:6])
+            located.append(row[6:])
+        return hospital_data.HospitalData(names, counts,
+                                          np.array(located, dtype=float).reshape(-1, 2))
+
+    # Indexed queries
+
+    def search(self, query):
+        # Rows whose name contains query, case-insensitively
+        query = query.strip()
+        if not query:
+            return self._rows("SELECT id FROM hospitals ORDER BY id")
+        return self._rows(*self._search_sql(query))
+
+    def below_threshold(self, col, threshold):
+        # Unordered: sorting by id would make SQLite scan the table
+        # instead of the column's index
+        return self._rows("SELECT id FROM hospitals WHERE {} < ?".format(
+            RESOURCE_FIELDS[col]), (threshold,))
+
+    def shortage_rows(self, thresholds):
+        # Rows short of any scalar threshold, one index range scan per column
+        rows = [self.below_threshold(col, threshold)
+                for col, threshold in thresholds.items() if np.ndim(threshold) == 0]
+        if not rows:
+            return np.zeros(0, dtype=np.intp)
+        return np.unique(np.concatenate(rows))
+
+    def top_staff_percent(self, count):
+        # (rows, staff percentages) of the best staffed hospitals, earlier
+        # rows first among equals; hospitals with no resources are left out
+        result = self.connection.execute(
+            "SELECT id, {0} FROM hospitals WHERE {0} IS NOT NULL ORDER BY {0} DESC, id "
+            "LIMIT ?".format(STAFF_PERCENT), (count,)).fetchall()
+        return (np.array([row[0] for row in result], dtype=np.intp),
+                np.array([row[1] for row in result], dtype=float))
+
+    # Updates
+
+    def write_rows(self, rows, resources):
+        # Store the resource counts of rows from an (n, 5) array
+        rows = np.asarray(rows, dtype=np.intp)
+        with self.connection:
+            self._update(rows, np.asarray(resources)[rows])
+
+    def apply_transfers(self, sources, destinations, amounts):
+        # analytics.apply_transfers as one transaction: the legs are
+        # validated against the stored counts and either all commit or,
+        # on TransferError, none do. Returns the touched rows.
+        sources = np.asarray(sources, dtype=np.intp)
+        destinations = np.asarray(destinations, dtype=np.intp)
+        rows, slots = np.unique(np.concatenate([sources, destinations]), return_inverse=True)
+        with self.connection:
+            self.connection.execute("BEGIN IMMEDIATE")
+            current = self._resources(rows)
+            if len(current) != len(rows):
+                raise analytics.TransferError("transfers name hospitals that are not stored")
+            try:
+                analytics.apply_transfers(current, slots[:len(sources)], slots[len(sources):],
+                                          amounts)
+            except analytics.TransferError as error:
+                raise analytics.TransferError("{} (positions in hospitals {})".format(
+                    error, rows.tolist())) from None
+            self._update(rows, current)
+        return rows
+
+    def _resources(self, rows):
+        result = []
+        for start in range(0, len(rows), 500):
+            chunk = rows[start:start + 500].tolist()
+            result.extend(self.connection.execute(
+                "SELECT {} FROM hospitals WHERE id IN ({}) ORDER BY id".format(
+                    ", ".join(FIELDS), ", ".join("?" * len(chunk))), chunk))
+        return np.array(result, dtype=hospital_data.RESOURCE_DTYPE).reshape(
+            -1, len(hospital_data.RESOURCE_COLS))
+
+    def _update(self, rows, resources):
+        self.connection.executemany(
+            "UPDATE hospitals SET {} WHERE id = ?".format(
+                ", ".join("{} = ?".format(field) for field in FIELDS)),
+            ((*values, row) for row, values in zip(rows.tolist(), resources.tolist())))
+
+    def _search_sql(self, query):
+        # LIKE with an ESCAPE clause is not handed to the trigram index, so
+        # the clause is only added when query holds a LIKE wildcard
+        if any(char in query for char in "%_\\"):
+            pattern = "%{}%".format(
+                query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_"))
+            like = "LIKE ? ESCAPE '\\'"
+        else:
+            pattern = "%{}%".format(query)
+            like = "LIKE ?"
+        if self.has_name_index and len(query) >= 3:
+            return ("SELECT rowid FROM hospital_names WHERE name {} ORDER BY rowid".format(like),
+                    (pattern,))
+        return "SELECT id FROM hospitals WHERE name {} ORDER BY id".format(like), (pattern,)
+
+    def _rows(self, sql, parameters=()):
+        return np.array([row[0] for row in self.connection.execute(sql, parameters)],
+                        dtype=np.intp)
+
+
+def _source(csv_path):
+    # Identity of the CSV as imported: path, size and modification time
+    stat = os.stat(csv_path)
+    return "{}:{}:{}".format(os.path.abspath(csv_path), stat.st_size, stat.st_mtime_ns)
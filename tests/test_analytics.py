@@ -0,0 +1,56 @@
+import numpy as np
+import pytest
+
+import analytics
+import hospital_data
+import report
+from test_smoke import write_demo_csv
+
+
+def test_summarize_matches_the_report(tmp_path):
+    path = tmp_path / "hospitals.csv"
+    write_demo_csv(path, 300)
+    summary = analytics.summarize(hospital_data.HospitalData.from_csv(str(path)))
+    full = report.generate(str(path), use_journal=False)
+    assert summary == {key: full[key] for key in summary}
+
+
+def network():
+    return np.array([[10, 5, 50, 2, 1], [0, 0, 0, 0, 0], [3, 3, 3, 3, 3]],
+                    dtype=hospital_data.RESOURCE_DTYPE)
+
+
+def test_apply_transfers_nets_every_leg():
+    resources = network()
+    # Row 1 gives on what it receives; taken one leg at a time it would
+    # drop below zero first
+    legs = [(1, 2, [4, 2, 0, 0, 0]), (0, 1, [4, 2, 0, 0, 0]), (2, 0, [0, 0, 1, 1, 1])]
+    rows = analytics.apply_transfers(resources, *analytics.transfer_arrays(legs))
+    assert rows.tolist() == [0, 1, 2]
+    assert resources.tolist() == [[6, 3, 51, 3, 2], [0, 0, 0, 0, 0], [7, 5, 2, 2, 2]]
+
+
+@pytest.mark.parametrize("legs", [
+    [(0, 1, [1, 0, 0, 0, 0]), (0, 0, [1, 0, 0, 0, 0])],  # to itself
+    [(0, 1, [1, 0, 0, 0, 0]), (0, 3, [1, 0, 0, 0, 0])],  # no such hospital
+    [(0, 1, [1, 0, 0, 0, 0]), (-1, 1, [1, 0, 0, 0, 0])],
+    [(0, 1, [1, 0, 0, 0, 0]), (2, 1, [-1, 0, 0, 0, 0])],  # negative amount
+    [(0, 1, [1, 0, 0, 0, 0]), (2, 1, [4, 0, 0, 0, 0])],  # more than row 2 has
+    [(0, 1, [6, 0, 0, 0, 0]), (0, 2, [6, 0, 0, 0, 0])],  # more than row 0 has, in total
+])
+def test_rejected_transfers_change_nothing(legs):
+    resources = network()
+    with pytest.raises(analytics.TransferError):
+        analytics.apply_transfers(resources, *analytics.transfer_arrays(legs))
+    assert resources.tolist() == network().tolist()
+
+
+@pytest.mark.parametrize("legs", [
+    [(0, 1, [1, 0, 0])],
+    [(0, 1, ["one", 0, 0, 0, 0])],
+    [(0, 1, [10 ** 30, 0, 0, 0, 0])],
+    [(0,)],
+])
+def test_malformed_legs_are_transfer_errors(legs):
+    with pytest.raises(analytics.TransferError):
+        analytics.transfer_arrays(legs)
@@ -0,0 +1,49 @@
+import os
+
+import numpy as np
+
+import hospital_data
+import snapshot
+from csv_loader import CsvLoader
+from test_smoke import write_demo_csv
+
+# More than two chunks, so appends after the first batch are exercised
+ROWS = 2 * hospital_data.CHUNK_ROWS + 2000
+
+
+def load(path):
+    # Run the loader on this thread and append what it hands over, as the
+    # window does (afterwards: an exception in a slot would abort)
+    loader = CsvLoader(str(path))
+    batches = []
+    loader.batch_loaded.connect(lambda names, resources, *rest: batches.append((names, resources)))
+    loader.run()
+    data = hospital_data.HospitalData()
+    for names, resources in batches:
+        data.append(names, resources)
+    return data
+
+
+def test_loads_every_chunk_and_writes_a_snapshot(tmp_path):
+    path = tmp_path / "hospitals.csv"
+    write_demo_csv(path, ROWS)
+    expected = hospital_data.HospitalData.from_csv(str(path))
+
+    data = load(path)
+    assert len(data) == ROWS
+    assert list(data.names) == list(expected.names)
+    assert np.array_equal(data.resources, expected.resources)
+
+    saved = snapshot.load(str(path))
+    assert saved is not None
+    assert np.array_equal(saved.resources, expected.resources)
+
+
+def test_second_start_reads_the_snapshot(tmp_path):
+    path = tmp_path / "hospitals.csv"
+    write_demo_csv(path, ROWS)
+    first = load(path)
+    assert os.path.isdir(str(path) + ".snapshot")
+    second = load(path)
+    assert list(second.names) == list(first.names)
+    assert np.array_equal(second.resources, first.resources)
@@ -0,0 +1,15 @@
+import numpy as np
+
+import hospital_data
+from history import ResourceHistory
+
+
+def test_series_keeps_counts_past_32_bits():
+    big = 3 * 10 ** 9
+    resources = np.array([[big, 1, 2, 3, 4]], dtype=hospital_data.RESOURCE_DTYPE)
+    history = ResourceHistory(capacity=4)
+    history.track(resources)
+    resources[0, 0] += 5
+    history.record([0], resources)
+    times, counts = history.series(0, resources, 60)
+    assert counts[:, 0].tolist() == [big, big + 5, big + 5]
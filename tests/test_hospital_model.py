@@ -0,0 +1,30 @@
+import os
+
+import numpy as np
+from PyQt5.QtWidgets import QApplication
+
+import hospital_data
+from hospital_model import HospitalProxyModel, HospitalTableModel
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+# Models need an application, not an event loop
+APP = QApplication.instance() or QApplication([])
+
+
+def test_sorted_rows_follow_changed_counts():
+    resources = np.array([[5, 1, 1, 1, 1], [1, 1, 1, 1, 1], [3, 1, 1, 1, 1]],
+                         dtype=hospital_data.RESOURCE_DTYPE)
+    model = HospitalTableModel(hospital_data.HospitalData(["A", "B", "C"], resources))
+    proxy = HospitalProxyModel()
+    proxy.setSourceModel(model)
+    proxy.sort(hospital_data.STAFF_COL)
+    assert proxy.source_rows().tolist() == [1, 2, 0]
+
+    model.hospitals.resources[[0, 1], 0] = [0, 6]
+    model.refresh([0, 1])
+    assert proxy.source_rows().tolist() == [0, 2, 1]
+    # Changes to columns the table is not sorted by leave the order alone
+    version = proxy.layout_version
+    model.hospitals.resources[2, 1] = 9
+    model.refresh([2])
+    assert proxy.layout_version == version
@@ -0,0 +1,303 @@
+import os
+
+import numpy as np
+import pytest
+
+import analytics
+import hospital_data
+import journal
+import shards
+from test_smoke import write_demo_csv
+
+BASE = b"b" * journal.FINGERPRINT_BYTES
+
+
+def counts(rows=4):
+    return np.full((rows, 5), 10, dtype=hospital_data.RESOURCE_DTYPE)
+
+
+def move(source, destination, amount):
+    return [source, destination], [[-amount] * 5, [amount] * 5]
+
+
+def reopen(path, base=BASE, rows=4):
+    resources = counts(rows)
+    log = journal.TransferJournal(path)
+    changed = log.open(base, resources)
+    return log, resources, changed
+
+
+def test_replay_applies_committed_groups(tmp_path):
+    path = str(tmp_path / "hospitals.csv.journal")
+    log, resources, changed = reopen(path)
+    assert len(changed) == 0
+    log.append(journal.MANUAL, *move(0, 1, 3))
+    log.append(journal.FEED, [2], [[1, 0, 0, 0, 0]])
+    log.close()
+
+    log, resources, changed = reopen(path)
+    assert changed.tolist() == [0, 1, 2]
+    assert resources[:, 0].tolist() == [7, 13, 11, 10]
+    assert log.undo_stack == [1]
+    log.close()
+
+
+def test_undo_and_redo_are_journaled(tmp_path):
+    path = str(tmp_path / "hospitals.csv.journal")
+    log, resources, _ = reopen(path)
+    rows, deltas = move(0, 1, 3)
+    resources[rows] += deltas
+    log.append(journal.MANUAL, rows, deltas)
+    assert log.undo(resources).tolist() == [0, 1]
+    assert resources[:, 0].tolist() == [10, 10, 10, 10]
+    assert log.undo(resources) is None
+    log.redo(resources)
+    log.undo(resources)
+    log.close()
+
+    # The replay lands on the undone state and can redo it
+    log, resources, _ = reopen(path)
+    assert resources[:, 0].tolist() == [10, 10, 10, 10]
+    assert log.undo_stack == [] and log.redo_stack == [1]
+    log.redo(resources)
+    assert resources[:, 0].tolist() == [7, 13, 10, 10]
+    log.close()
+
+
+def test_undo_that_would_go_negative_is_refused(tmp_path):
+    log, resources, _ = reopen(str(tmp_path / "hospitals.csv.journal"))
+    rows, deltas = move(0, 1, 3)
+    resources[rows] += deltas
+    log.append(journal.MANUAL, rows, deltas)
+    resources[1] = 0  # Spent since
+    with pytest.raises(analytics.TransferError):
+        log.undo(resources)
+    assert resources[:, 0].tolist() == [7, 0, 10, 10]
+    assert log.undo_stack == [1]
+    log.close()
+
+
+def test_torn_tail_is_dropped(tmp_path):
+    path = str(tmp_path / "hospitals.csv.journal")
+    log, _, _ = reopen(path)
+    log.append(journal.MANUAL, *move(0, 1, 3))
+    log.append(journal.MANUAL, *move(2, 3, 5))
+    log.close()
+    # A crash part way through the second group's last record
+    size = os.path.getsize(path)
+    with open(path, "r+b") as file:
+        file.truncate(size - 7)
+    log, resources, _ = reopen(path)
+    assert resources[:, 0].tolist() == [7, 13, 10, 10]
+    # The torn bytes are cut, so appends land after the last whole group
+    log.append(journal.MANUAL, *move(3, 2, 1))
+    log.close()
+    assert os.path.getsize(path) == journal.HEADER_BYTES + 4 * journal.RECORD.itemsize
+    _, resources, _ = reopen(path)
+    assert resources[:, 0].tolist() == [7, 13, 11, 9]
+
+
+def test_journal_of_other_base_data_is_set_aside(tmp_path):
+    path = str(tmp_path / "hospitals.csv.journal")
+    log, _, _ = reopen(path)
+    log.append(journal.MANUAL, *move(0, 1, 3))
+    log.close()
+
+    log, resources, changed = reopen(path, b"c" * journal.FINGERPRINT_BYTES)
+    assert len(changed) == 0 and resources.tolist() == counts().tolist()
+    assert os.path.exists(path + ".stale")
+    log.close()
+    # As is one naming hospitals the base does not have
+    log, _, _ = reopen(path)
+    log.append(journal.MANUAL, *move(0, 3, 3))
+    log.close()
+    _, resources, changed = reopen(path, rows=3)
+    assert len(changed) == 0
+
+
+def test_net_changes_follow_the_base_files(tmp_path):
+    csv_path = str(tmp_path / "hospitals.csv")
+    write_demo_csv(csv_path, 10)
+    log = journal.TransferJournal(journal.journal_path(csv_path))
+    log.open(journal.fingerprint(journal.base_files(csv_path)), counts(10))
+    log.append(journal.MANUAL, *move(4, 2, 1))
+    log.append(journal.MANUAL, *move(2, 5, 1))
+    log.close()
+    rows, deltas = journal.net_changes(csv_path)
+    assert rows.tolist() == [2, 4, 5]
+    assert deltas[:, 0].tolist() == [0, -1, 1]
+
+    with open(csv_path, "a") as file:
+        file.write("Late Hospital,1,1,1,1,1\n")
+    assert journal.net_changes(csv_path) is None
+
+
+def test_compaction_changes_only_the_counts(tmp_path):
+    path = str(tmp_path / "hospitals.csv")
+    lines = ["Name,Staff,Doctors,Beds,CT,MRI,Latitude,Longitude,Notes\n",
+             "North,10,2,30,1,0,28.6,77.2,main campus\n",
+             "Broken,n/a,2,30\n",
+             "South,4,1,12,0,0,,,\n",
+             "\"East, annex\",7,1,9,0,1,19.1,72.9,\n"]
+    with open(path, "w", newline="") as file:
+        file.writelines(lines)
+    data = hospital_data.HospitalData.from_csv(path)
+    assert data.names == ["North", "South", "East, annex"]
+    data.resources[:, 0] += [-3, 3, 0]
+
+    base = journal.compact_base(path, data.names, data.resources, data.coordinates)
+    assert base == journal.fingerprint([path])
+    with open(path, newline="") as file:
+        assert file.readlines() == [lines[0], "North,7,2,30,1,0,28.6,77.2,main campus\n",
+                                    lines[2], "South,7,1,12,0,0,,,\n", lines[4]]
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_compaction_of_a_changed_file_writes_nothing(tmp_path):
+    path = str(tmp_path / "hospitals.csv")
+    write_demo_csv(path, 10)
+    data = hospital_data.HospitalData.from_csv(path)
+    with open(path, "a") as file:
+        file.write("Late Hospital,1,1,1,1,1\n")
+    with open(path, "rb") as file:
+        before = file.read()
+    with pytest.raises(ValueError):
+        journal.compact_base(path, data.names, data.resources, data.coordinates)
+    with open(path, "rb") as file:
+        assert file.read() == before
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_compaction_gives_shards_their_regions(tmp_path):
+    for region in ("north", "south"):
+        write_demo_csv(tmp_path / (region + ".csv"), 5)
+    data = shards.load(str(tmp_path), processes=1, use_snapshot=False)
+    south = data.regions == data.region_names.index("south")
+    data.resources[south, 1] = 99
+    journal.compact_base(str(tmp_path), data.names, data.resources, data.coordinates,
+                         data.regions, data.region_names)
+    again = shards.load(str(tmp_path), processes=1, use_snapshot=False)
+    assert again.resources.tolist() == data.resources.tolist()
+
+
+def test_shards_of_one_region_are_refused(tmp_path):
+    for directory in ("a", "b"):
+        os.mkdir(tmp_path / directory)
+        write_demo_csv(tmp_path / directory / "north.csv", 5)
+    pattern = str(tmp_path / "*" / "north.csv")
+    with pytest.raises(ValueError):
+        shards.load(pattern, processes=1, use_snapshot=False)
+    with pytest.raises(ValueError):
+        journal.compact_base(pattern, [], np.zeros((0, 5)), np.zeros((0, 2)),
+                             np.zeros(0), ["north"])
+
+
+def test_replay_keeps_deltas_past_32_bits(tmp_path):
+    path = str(tmp_path / "hospitals.csv.journal")
+    log, resources, _ = reopen(path)
+    big = 3 * 10 ** 9
+    rows, deltas = move(0, 1, big)
+    log.append(journal.MANUAL, rows, deltas)
+    log.close()
+    log = journal.TransferJournal(path)
+    resources = counts()
+    resources[0] = 4 * 10 ** 9
+    log.open(BASE, resources)
+    assert resources[:2, 0].tolist() == [10 ** 9, big + 10]
+    log.close()
+
+
+def test_journal_of_the_previous_version_is_upgraded(tmp_path):
+    path = str(tmp_path / "hospitals.csv.journal")
+    old = journal.OLD_RECORDS[b"CCJRNL01"]
+    records = np.zeros(2, dtype=old)
+    records["group"] = 1
+    records["kind"] = [journal.MANUAL, journal.MANUAL | journal.END]
+    records["row"] = [0, 1]
+    records["delta"] = [[-3] * 5, [3] * 5]
+    with open(path, "wb") as file:
+        file.write(b"CCJRNL01" + BASE + records.tobytes())
+
+    log, resources, _ = reopen(path)
+    assert resources[:, 0].tolist() == [7, 13, 10, 10]
+    log.append(journal.MANUAL, *move(2, 3, 1))
+    log.close()
+    assert os.path.getsize(path) == journal.HEADER_BYTES + 4 * journal.RECORD.itemsize
+    log, resources, _ = reopen(path)
+    assert resources[:, 0].tolist() == [7, 13, 9, 11]
+    assert log.undo_stack == [1, 2]
+    log.close()
+
+
+def journaled_network(path, rows):
+    # The base data at path with a journal of two transfers, open
+    base = journal.fingerprint(journal.base_files(path))
+    data = (shards.load(path, processes=1, use_snapshot=False) if os.path.isdir(path)
+            else hospital_data.HospitalData.from_csv(path))
+    log = journal.TransferJournal(journal.journal_path(path))
+    log.open(base, data.resources)
+    for source, destination in rows:
+        change = move(source, destination, 1)
+        data.resources[change[0]] += change[1]
+        log.append(journal.MANUAL, *change)
+    log.commit()
+    return data, log
+
+
+def loaded(path):
+    # The counts the dashboard would start from after a crash
+    journal.finish_compaction(path)
+    data = (shards.load(path, processes=1, use_snapshot=False) if os.path.isdir(path)
+            else hospital_data.HospitalData.from_csv(path))
+    log = journal.TransferJournal(journal.journal_path(path))
+    log.open(journal.fingerprint(journal.base_files(path)), data.resources)
+    log.close()
+    return data.resources
+
+
+def test_compaction_cut_short_before_the_rebase_keeps_the_tail(tmp_path):
+    path = str(tmp_path / "hospitals.csv")
+    write_demo_csv(path, 10)
+    data, log = journaled_network(path, [(4, 2), (5, 6)])
+    start = log.records
+    snapshot = data.resources.copy()
+    # Written while the compaction ran, then a crash before rebase()
+    change = move(7, 8, 1)
+    data.resources[change[0]] += change[1]
+    log.append(journal.MANUAL, *change)
+    log.commit()
+    journal.compact_base(path, data.names, snapshot, data.coordinates, start=start)
+    log.file.close()
+
+    assert loaded(path).tolist() == data.resources.tolist()
+    assert not os.path.exists(journal.journal_path(path) + journal.COMPACTING)
+    base, records = journal.read(journal.journal_path(path))
+    assert base == journal.fingerprint([path]) and records["row"].tolist() == [7, 8]
+
+
+def test_compaction_cut_short_between_shards_is_completed(tmp_path, monkeypatch):
+    for region in ("north", "south"):
+        write_demo_csv(tmp_path / (region + ".csv"), 5)
+    path = str(tmp_path)
+    data, log = journaled_network(path, [(1, 6), (7, 2)])
+    replace = os.replace
+    calls = []
+
+    def crash_on_the_second_shard(source, target):
+        calls.append(target)
+        if target.endswith("south.csv"):
+            raise OSError("crash")
+        replace(source, target)
+
+    monkeypatch.setattr(os, "replace", crash_on_the_second_shard)
+    with pytest.raises(OSError):
+        journal.compact_base(path, data.names, data.resources, data.coordinates,
+                             data.regions, data.region_names, start=log.records)
+    monkeypatch.setattr(os, "replace", replace)
+    log.file.close()
+    # north.csv was replaced, south.csv not yet
+    assert [target for target in calls if target.endswith(".csv")] == [
+        str(tmp_path / "north.csv"), str(tmp_path / "south.csv")]
+
+    assert loaded(path).tolist() == data.resources.tolist()
+    assert journal.read(journal.journal_path(path))[1].size == 0
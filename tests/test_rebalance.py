@@ -0,0 +1,84 @@
+import numpy as np
+
+import analytics
+import hospital_data
+import rebalance
+
+
+def class_policy():
+    # Hospitals of 100 beds and more need 40 staff, smaller ones 10
+    return rebalance.ThresholdPolicy.from_dict(
+        {"thresholds": {"staff": 10}, "classes": [
+            {"name": "district", "min_beds": 100, "thresholds": {"staff": 40}}]})
+
+
+def test_frozen_class_survives_moving_beds():
+    resources = np.array([[30, 2, 120, 0, 0], [30, 2, 50, 0, 0]],
+                         dtype=hospital_data.RESOURCE_DTYPE)
+    policy = class_policy()
+    policy.freeze(resources)
+    assert analytics.shortages(resources, policy)[:, 0].tolist() == [True, False]
+
+    # Beds moved from the district hospital to the small one keep both classes
+    resources[:, 2] = [50, 120]
+    assert policy.classify(resources).tolist() == [1, 0]
+    assert analytics.shortages(resources, policy)[:, 0].tolist() == [True, False]
+    assert analytics.shortages(resources, policy, np.array([1]))[:, 0].tolist() == [False]
+    # Unfrozen, the same counts swap the classes
+    assert class_policy().classify(resources).tolist() == [0, 1]
+
+
+def test_rows_added_after_freezing_are_classed_when_frozen():
+    policy = class_policy()
+    resources = np.array([[30, 2, 120, 0, 0]], dtype=hospital_data.RESOURCE_DTYPE)
+    policy.freeze(resources)
+    grown = np.vstack([resources, [[30, 2, 150, 0, 0]]])
+    assert policy.classify(grown).tolist() == [1, 1]
+    policy.freeze(grown)
+    grown[1, 2] = 10
+    assert policy.classify(grown).tolist() == [1, 1]
+    assert policy.scaled(2).classify(grown).tolist() == [1, 1]
+
+
+def test_plan_column_fills_the_most_short_from_the_richest():
+    plan = rebalance.plan_column([0, 4, 25, 14], 10)
+    levels = np.array([0, 4, 25, 14])
+    np.add.at(levels, plan.source, -plan.amount)
+    np.add.at(levels, plan.destination, plan.amount)
+    # 16 needed, 19 to spare: both recipients reach the threshold, the
+    # richest donor gives first and no donor drops under it
+    assert levels.tolist() == [10, 10, 10, 13]
+    assert plan.total_moved() == 16
+
+
+def test_plan_column_leaves_the_least_short_without_when_surplus_runs_out():
+    plan = rebalance.plan_column([0, 8, 13], 10)
+    levels = np.array([0, 8, 13])
+    np.add.at(levels, plan.source, -plan.amount)
+    np.add.at(levels, plan.destination, plan.amount)
+    assert levels.tolist() == [3, 8, 10]
+
+
+def test_plan_rebalance_keeps_totals_and_respects_floors():
+    rng = np.random.default_rng(0)
+    resources = rng.integers(0, 40, (500, 5)).astype(hospital_data.RESOURCE_DTYPE)
+    thresholds = {col: 15 for col in hospital_data.RESOURCE_COLS}
+    floors = {hospital_data.STAFF_COL: 20}
+    plan = rebalance.plan_rebalance(resources, thresholds, floors)
+    after = resources.copy()
+    plan.apply(after)
+    assert after.sum(axis=0).tolist() == resources.sum(axis=0).tolist()
+    # Donors give only what they hold above their floor
+    donors = np.unique(plan.source[plan.column == hospital_data.STAFF_COL])
+    assert (after[donors, 0] >= 20).all()
+    # Every column had surplus enough, so no hospital is left short
+    assert not analytics.shortages(after, thresholds).any()
+
+
+def test_plan_rebalance_with_a_policy_uses_the_class_thresholds():
+    resources = np.array([[30, 2, 120, 0, 0], [60, 2, 50, 0, 0]],
+                         dtype=hospital_data.RESOURCE_DTYPE)
+    plan = rebalance.plan_rebalance(resources, class_policy())
+    after = resources.copy()
+    plan.apply(after)
+    assert after[:, 0].tolist() == [40, 50]
@@ -0,0 +1,37 @@
+import numpy as np
+
+import hospital_data
+from search_index import HospitalSearchIndex
+
+
+def hospitals(names):
+    return np.zeros((len(names), 5), dtype=hospital_data.RESOURCE_DTYPE)
+
+
+def test_search_matches_indexed_and_pending_rows():
+    names = ["City Hospital {}".format(row) for row in range(50)] + ["Rural Clinic"]
+    data = hospital_data.HospitalData(names, hospitals(names))
+    index = HospitalSearchIndex(data)
+    index.index_more(30)
+    for query in ["hospital 4", "HOSPITAL 4", "clinic", "al 1", "zz", "  "]:
+        expected = [row for row, name in enumerate(names) if query.strip().lower() in name.lower()]
+        assert index.search(query).tolist() == expected
+        mask = index.mask(query)
+        if query.strip():
+            assert np.flatnonzero(mask).tolist() == expected
+        else:
+            assert mask is None
+
+
+def test_search_is_sized_by_the_captured_rows():
+    names = ["Hospital {}".format(row) for row in range(10)]
+    data = hospital_data.HospitalData(names, hospitals(names))
+    index = HospitalSearchIndex(data)
+    index.index_more()
+    captured, count = data.names, len(data)
+    # A batch loaded after the snapshot was taken
+    data.append(["Hospital 10", "Hospital 11"], hospitals(range(2)))
+    mask = index.mask("hospital 1", captured, count)
+    assert len(mask) == 10
+    assert np.flatnonzero(mask).tolist() == [1]
+    assert index.search("hospital 1").tolist() == [1, 10, 11]
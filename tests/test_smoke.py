@@ -0,0 +1,45 @@
+# Runs the dashboard script as a user would (offscreen, for a couple of
+# seconds) and fails on any exception raised while it starts and draws.
+
+import csv
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPT = os.path.join(ROOT, "MainCareConnect.py.py")
+
+# Quits the event loop shortly after it starts; PyQt aborts the process on
+# an exception escaping a slot, so a clean exit means nothing raised
+RUNNER = """
+import runpy, sys
+from PyQt5.QtCore import QTimer
+from PyQt5.QtWidgets import QApplication
+exec_ = QApplication.exec_
+def run_briefly(*args):
+    QTimer.singleShot(2000, QApplication.quit)
+    return exec_()
+QApplication.exec_ = run_briefly
+sys.argv = [sys.argv[1]]
+runpy.run_path(sys.argv[0], run_name="__main__")
+"""
+
+
+def write_demo_csv(path, rows=200):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(["Hospital Name", "Number of Staff", "Number of Doctors",
+                         "Number of Beds", "Number of CT Scanners", "Number of MRI Machines"])
+        for row in range(rows):
+            writer.writerow(["Hospital {}".format(row), row % 60, 1 + row % 19,
+                             10 + row % 140, row % 5, row % 3])
+
+
+def test_script_starts_and_draws(tmp_path):
+    write_demo_csv(tmp_path / "demo_data.csv")
+    env = dict(os.environ, QT_QPA_PLATFORM="offscreen",
+               PYTHONPATH=os.pathsep.join([ROOT, os.environ.get("PYTHONPATH", "")]))
+    result = subprocess.run([sys.executable, "-c", RUNNER, SCRIPT], cwd=tmp_path, env=env,
+                            capture_output=True, text=True, timeout=120)
+    assert "Traceback" not in result.stderr, result.stderr
+    assert result.returncode == 0, result.stderr
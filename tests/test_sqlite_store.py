@@ -0,0 +1,70 @@
+import csv
+
+import numpy as np
+
+import hospital_chart
+import hospital_data
+from sqlite_store import SqliteHospitalStore
+
+
+def write_csv(path, resources):
+    with open(path, "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(hospital_data.HEADERS)
+        for row, counts in enumerate(resources.tolist()):
+            writer.writerow(["Hospital {}".format(row)] + counts)
+
+
+def test_stored_top_bars_match_the_computed_ones(tmp_path):
+    rng = np.random.default_rng(0)
+    resources = rng.integers(0, 100000, (500, 5))
+    resources[7] = 0  # No resources at all, so no staff percentage
+    write_csv(tmp_path / "hospitals.csv", resources)
+    store = SqliteHospitalStore(str(tmp_path / "hospitals.db"))
+    assert store.needs_import(str(tmp_path / "hospitals.csv"))
+    store.import_csv(str(tmp_path / "hospitals.csv"))
+    assert not store.needs_import(str(tmp_path / "hospitals.csv"))
+
+    rows, percent = store.top_staff_percent(hospital_chart.TOP_N)
+    rest = resources.sum(axis=0) - resources[rows].sum(axis=0)
+    stored = hospital_chart.stored_top_bars(rows, percent, rest, len(resources) - len(rows))
+    computed = hospital_chart.bar_values(hospital_chart.TOP_MODE, np.arange(len(resources)),
+                                         resources)
+    assert stored[1] == computed[1]
+    np.testing.assert_allclose(stored[2], computed[2])
+    store.close()
+
+
+def plan(store, call, *args):
+    # Query plan of the statement call(*args) runs on the store
+    statements = []
+    store.connection.set_trace_callback(statements.append)
+    call(*args)
+    store.connection.set_trace_callback(None)
+    # (FTS5 traces statements of its own after the query)
+    query = next(sql for sql in statements if sql.startswith("SELECT"))
+    return " ".join(row[-1] for row in store.connection.execute("EXPLAIN QUERY PLAN " + query))
+
+
+def test_searches_and_threshold_scans_use_the_indexes(tmp_path):
+    names = ["Hospital {}".format(row) for row in range(200)] + ["50%_off\\clinic"]
+    resources = np.arange(len(names) * 5).reshape(-1, 5)
+    with open(tmp_path / "hospitals.csv", "w", newline="") as file:
+        writer = csv.writer(file)
+        writer.writerow(hospital_data.HEADERS)
+        writer.writerows([name] + counts for name, counts in zip(names, resources.tolist()))
+    store = SqliteHospitalStore(str(tmp_path / "hospitals.db"))
+    store.import_csv(str(tmp_path / "hospitals.csv"))
+
+    assert store.search("hospital 12").tolist() == [12] + list(range(120, 130))
+    assert store.search("%_OFF\\").tolist() == [200]
+    assert store.search("l_o").tolist() == []
+    assert store.search("1").tolist() == [row for row, name in enumerate(names) if "1" in name]
+    if store.has_name_index:
+        # The trigram index takes the LIKE constraint ("L") unless an
+        # ESCAPE clause is needed
+        assert plan(store, store.search, "hospital 12").endswith("L0")
+    assert "USING COVERING INDEX hospitals_staff" in plan(
+        store, store.below_threshold, hospital_data.STAFF_COL, 12)
+    assert store.below_threshold(hospital_data.STAFF_COL, 12).tolist() == [0, 1, 2]
+    store.close()
@@ -0,0 +1,92 @@
+# Heavy dashboard computations off the GUI thread. A job takes a snapshot
+# (copies of whatever it reads) on the GUI thread, computes in a
+# QThreadPool thread and hands its result back through a queued signal, so
+# the event loop keeps painting and taking input meanwhile.
+#
+# Jobs come in kinds ("rebalance", "search", ...). One job of a kind runs
+# at a time and only the newest request waits behind it, so a burst of
+# requests costs at most two computations. A result is dropped when the
+# request waiting behind it asks a different question (its key differs,
+# e.g. new search text); one that is merely behind on data is still
+# delivered, the waiting job brings it up to date right after.
+
+from PyQt5.QtCore import QCoreApplication, QObject, QRunnable, QThreadPool, pyqtSignal, pyqtSlot
+
+import profiling
+
+
+class _Job(QRunnable):
+
+    def __init__(self, done, kind, compute, args):
+        super().__init__()
+        self.done = done
+        self.kind = kind
+        self.compute = compute
+        self.args = args
+
+    def run(self):
+        try:
+            with profiling.span(self.kind + " job"):
+                result, error = self.compute(*self.args), None
+        except Exception as exception:  # Reported on the GUI thread
+            result, error = None, exception
+        self.done.emit(self.kind, result, error)
+
+
+class BackgroundWorkers(QObject):
+    failed = pyqtSignal(str, str)  # kind, message
+    _done = pyqtSignal(str, object, object)
+
+    def __init__(self, parent=None, threads=None):
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        if threads:
+            self.pool.setMaxThreadCount(threads)
+        self.discarded = 0  # Results dropped as stale
+        self._running = {}  # kind -> (key, deliver)
+        self._waiting = {}  # kind -> (key, snapshot, compute, deliver)
+        # Emitted from pool threads, so delivered through the event loop
+        self._done.connect(self._finish)
+
+    def submit(self, kind, snapshot, compute, deliver, key=None):
+        # Run compute(*snapshot()) in the pool and call deliver(result) on
+        # the GUI thread. snapshot runs on the GUI thread when the job
+        # starts and must copy anything the GUI thread may change.
+        if kind in self._running:
+            self._waiting[kind] = (key, snapshot, compute, deliver)
+            return
+        self._start(kind, key, snapshot, compute, deliver)
+
+    def busy(self, kind=None):
+        # Whether a job (of kind) is running or waiting
+        return bool(self._running) if kind is None else kind in self._running
+
+    def wait(self):
+        # Block until running jobs are done and deliver their results (a
+        # job may have written files its result accounts for); waiting jobs
+        # are dropped
+        self._waiting.clear()
+        self.pool.waitForDone()
+        QCoreApplication.sendPostedEvents(self)
+        self._running.clear()
+
+    def _start(self, kind, key, snapshot, compute, deliver):
+        self._running[kind] = (key, deliver)
+        self.pool.start(_Job(self._done, kind, compute, snapshot()))
+
+    # A real slot, so wait() can deliver finished jobs to this object
+    @pyqtSlot(str, object, object)
+    def _finish(self, kind, result, error):
+        if kind not in self._running:
+            return
+        key, deliver = self._running.pop(kind)
+        waiting = self._waiting.pop(kind, None)
+        if error is not None:
+            self.failed.emit(kind, str(error))
+        elif waiting is not None and waiting[0] != key:
+            self.discarded += 1
+        else:
+            deliver(result)
+        # Started after delivery so its snapshot includes what was delivered
+        if waiting is not None:
+            self._start(kind, *waiting)